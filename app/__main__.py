@@ -0,0 +1,93 @@
+"""
+Serves the app with preforked workers:
+
+    python -m app --workers 16 --max-requests 10000 --max-requests-jitter 1000
+"""
+import argparse
+import asyncio
+import os
+
+import uvicorn
+
+from app import create_app
+from app.config import (
+    DB_CONNECTION_BUDGET,
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+    SERVER_HOST,
+    SERVER_MAX_REQUESTS,
+    SERVER_MAX_REQUESTS_JITTER,
+    SERVER_PORT,
+    SERVER_WORKERS
+)
+from app.configuration.serving import (
+    WorkerSupervisor,
+    check_workers_settings,
+    configure_workers,
+    get_pool_size,
+    get_workers_count,
+    prepare_database
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Serves the app with preforked workers")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=SERVER_WORKERS,
+        help="count of worker processes, a worker per CPU core by default")
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=SERVER_MAX_REQUESTS,
+        help="requests served by a worker before it's replaced, 0 - never")
+    parser.add_argument(
+        "--max-requests-jitter",
+        type=int,
+        default=SERVER_MAX_REQUESTS_JITTER,
+        help="random addition to max requests of each worker")
+    parser.add_argument(
+        "--connection-budget",
+        type=int,
+        default=DB_CONNECTION_BUDGET,
+        help="DB connections of all workers, split evenly between them")
+
+    return parser.parse_args()
+
+
+def main(args: argparse.Namespace):
+    workers = get_workers_count(args.workers)
+    # Loaded once here, so workers share its memory after fork
+    app = create_app()
+    if not hasattr(os, "fork"):
+        uvicorn.run(
+            app,
+            host=args.host,
+            port=args.port,
+            timeout_graceful_shutdown=SERVER_GRACEFUL_SHUTDOWN_SECONDS)
+        return 0
+
+    try:
+        check_workers_settings(workers)
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+
+    configure_workers(workers)
+    asyncio.run(prepare_database())
+
+    return WorkerSupervisor(
+        app,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        pool_size=get_pool_size(args.connection_budget, workers),
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter
+    ).run()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(parse_args()))
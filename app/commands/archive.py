@@ -0,0 +1,49 @@
+"""
+Moves whole months of invoices older than the threshold
+(`INVOICE_ARCHIVE_AFTER_DAYS` by default) into compressed archive
+of each user on every shard:
+
+    python -m app.commands.archive --after-days 90
+
+Workers do the same every `INVOICE_ARCHIVE_INTERVAL_SECONDS`,
+if `INVOICE_ARCHIVE_AFTER_DAYS` is set
+"""
+import argparse
+import asyncio
+
+from app.config import INVOICE_ARCHIVE_AFTER_DAYS
+from app.configuration.db_helper import db_helper
+from app.configuration.server import create_tables
+from app.internal.crud.invoice_archive import archive_old_invoices
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Archives old invoices per user and month")
+    # Archiving is off by default, then the threshold is required
+    parser.add_argument(
+        "--after-days",
+        type=int,
+        default=INVOICE_ARCHIVE_AFTER_DAYS or None,
+        required=not INVOICE_ARCHIVE_AFTER_DAYS)
+
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    if args.after_days <= 0:
+        raise SystemExit("Days before invoices are archived must be positive")
+
+    await create_tables()
+    try:
+        for shard, database in enumerate(db_helper.shards):
+            async with database.session_factory() as session:
+                archived = await archive_old_invoices(
+                    session, args.after_days)
+            print(f"Shard {shard}, archived invoices: {archived}")
+    finally:
+        await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
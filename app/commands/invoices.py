@@ -0,0 +1,91 @@
+"""
+Imports historical invoices of a user (e.g. of a merchant migrating
+from another system) from NDJSON, an invoice per line like
+`{"created_at": ..., "payment": {...}, "products": [...]}`,
+or CSV with header
+`invoice,created_at,payment_type,payment_amount,name,price,quantity`
+and a row per invoice line:
+
+    python -m app.commands.invoices import --login albert history.ndjson
+
+Creation time of invoices is kept. Progress is saved with each batch
+of `INVOICE_IMPORT_BATCH_SIZE` invoices, so running the same command
+again resumes an interrupted import. Rejected invoices are printed
+by their lines
+"""
+import argparse
+import asyncio
+from pathlib import Path
+
+from sqlalchemy import select
+
+from app.config import (
+    INVOICE_IMPORT_BATCH_SIZE, INVOICE_IMPORT_PRODUCTS_CACHE_SIZE
+)
+from app.configuration.db_helper import db_helper
+from app.configuration.server import create_tables
+from app.internal.crud.invoice_import import import_invoices
+from app.internal.crud.sharding import get_user_shard
+from app.internal.models import User
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Imports historical invoices")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_command = commands.add_parser(
+        "import", help="import invoices of the file")
+    import_command.add_argument("path", type=Path, help=".ndjson or .csv file")
+    import_command.add_argument("--login", required=True)
+    import_command.add_argument(
+        "--batch-size", type=int, default=INVOICE_IMPORT_BATCH_SIZE)
+    import_command.add_argument(
+        "--products-cache-size",
+        type=int,
+        default=INVOICE_IMPORT_PRODUCTS_CACHE_SIZE)
+    import_command.add_argument(
+        "--restart",
+        action="store_true",
+        help="import the file from the beginning, ignoring saved progress")
+
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    await create_tables()
+    try:
+        async with db_helper.session_factory() as session:
+            user = await session.scalar(
+                select(User).where(User.login == args.login))
+            if user is None:
+                raise SystemExit(f"User with login «{args.login}» not found")
+
+            shard = await get_user_shard(session, db_helper, user.id)
+
+        shard_factory = db_helper.shards[shard].session_factory
+        with args.path.open("rb") as file:
+            async with shard_factory() as session:
+                async for invoice_import, rejected, rate in import_invoices(
+                        session,
+                        user.id,
+                        file,
+                        args.path.name,
+                        args.path.suffix == ".csv",
+                        args.batch_size,
+                        args.products_cache_size,
+                        args.restart):
+                    for line, detail in rejected:
+                        print(f"Line {line}: {detail}")
+
+                    print(
+                        f"Line {invoice_import.lines}, "
+                        f"imported invoices: {invoice_import.invoices_count}, "
+                        f"rejected: {invoice_import.rejected_count} "
+                        f"({rate:.0f} invoices/s)")
+    finally:
+        await db_helper.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
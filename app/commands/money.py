@@ -0,0 +1,24 @@
+"""
+Converts money columns of existing database from floats
+into integer minor units (cents):
+
+    python -m app.commands.money
+"""
+import asyncio
+
+from app.configuration.db_helper import db_helper
+from app.internal.crud.money import convert_money_to_minor_units
+
+
+async def main():
+    async with db_helper.session_factory() as session:
+        table_names = await convert_money_to_minor_units(session)
+
+    await db_helper.engine.dispose()
+    print(
+        f"Converted tables: {', '.join(table_names)}" if table_names
+        else "Money columns are already stored in minor units")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Maintains monthly partitions of invoice tables on PostgreSQL:
+
+    python -m app.commands.partitions create --since 2024-01
+    python -m app.commands.partitions detach --before 2024-01 \
+        --archive-schema archive
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from app.config import INVOICE_PARTITIONING, PG_PARTITION_MONTHS_AHEAD
+from app.configuration.db_helper import db_helper
+from app.internal.crud.partitions import (
+    create_invoice_partitions, detach_invoice_partitions
+)
+
+
+def parse_month(value: str):
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Maintains monthly partitions of invoice tables")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    create = commands.add_parser(
+        "create", help="create missing partitions")
+    create.add_argument(
+        "--since",
+        type=parse_month,
+        help="first month (YYYY-MM) to create, current one by default")
+    create.add_argument(
+        "--months-ahead", type=int, default=PG_PARTITION_MONTHS_AHEAD)
+
+    detach = commands.add_parser(
+        "detach", help="detach partitions older than the month")
+    detach.add_argument(
+        "--before", type=parse_month, required=True,
+        help="month (YYYY-MM), partitions before which are detached")
+    detach.add_argument(
+        "--archive-schema",
+        help="schema to move detached tables into, otherwise they're dropped")
+
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    async with db_helper.session_factory() as session:
+        if args.command == "create":
+            await create_invoice_partitions(
+                session, args.since, args.months_ahead)
+        else:
+            await detach_invoice_partitions(
+                session, args.before, args.archive_schema)
+
+    await db_helper.engine.dispose()
+
+
+if __name__ == "__main__":
+    if not INVOICE_PARTITIONING:
+        raise SystemExit(
+            "Partitioning is enabled only for PostgreSQL "
+            "with PG_PARTITION_INVOICES = True")
+
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,49 @@
+"""
+Moves invoices of a user between shards (`DB_SHARD_URLS`),
+the main database is shard 0:
+
+    python -m app.commands.shards move --login albert --to 2
+
+Moved invoices get ids of the target shard. The user should be idle,
+as invoices created during the move are left on the source shard
+"""
+import argparse
+import asyncio
+
+from app.configuration.db_helper import db_helper
+from app.configuration.server import create_tables
+from app.internal.crud.sharding import move_user_to_shard
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Rebalances invoices of users between shards")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    move = commands.add_parser(
+        "move", help="move invoices of the user to another shard")
+    move.add_argument("--login", required=True)
+    move.add_argument(
+        "--to", type=int, required=True, dest="shard",
+        help=f"target shard from 0 to {len(db_helper.shards) - 1}")
+
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    await create_tables()
+    try:
+        id_mapping = await move_user_to_shard(
+            db_helper, args.login, args.shard)
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    finally:
+        await db_helper.dispose()
+
+    print(f"Moved invoices: {len(id_mapping)}")
+    for old_id, new_id in id_mapping.items():
+        print(f"{old_id} -> {new_id}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,64 @@
+"""
+Registers users in bulk from CSV (header `name,login,password`)
+or JSON array of objects with the same fields:
+
+    python -m app.commands.users provision cashiers.csv
+
+Passwords are hashed by all CPU cores (`USER_PROVISIONING_PROCESSES`).
+Rows, which aren't registered, are printed with the reason
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+from fastapi import HTTPException
+
+from app.config import USER_PROVISIONING_BATCH_SIZE
+from app.configuration.db_helper import db_helper
+from app.configuration.server import create_tables
+from app.internal.crud.user_provisioning import (
+    password_hashing_pool, provision_users, read_users_rows
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Registers users in bulk")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    provision = commands.add_parser(
+        "provision", help="register users of the file")
+    provision.add_argument("path", type=Path, help=".csv or .json file")
+    provision.add_argument(
+        "--batch-size", type=int, default=USER_PROVISIONING_BATCH_SIZE)
+
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    await create_tables()
+    started_at = time.monotonic()
+    try:
+        rows = read_users_rows(
+            args.path.read_bytes(), is_csv=args.path.suffix == ".csv")
+        async with db_helper.session_factory() as session:
+            provisioned = await provision_users(
+                session, db_helper, rows, args.batch_size)
+    except HTTPException as exc:
+        raise SystemExit(exc.detail)
+    finally:
+        password_hashing_pool.shutdown()
+        await db_helper.dispose()
+
+    duration = time.monotonic() - started_at
+    print(
+        f"Registered users: {len(provisioned.created)} "
+        f"in {duration:.1f} s")
+    for rejected_user in provisioned.rejected:
+        print(
+            f"Row {rejected_user.row} ({rejected_user.login}): "
+            f"{rejected_user.detail}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
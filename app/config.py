@@ -14,7 +14,135 @@ DB_URL = (
     Path(f"{BASE_DIR}/app/db").mkdir(parents=True, exist_ok=True) or
     f"sqlite+aiosqlite:///{BASE_DIR}/app/db/{BASE_DIR.stem}.sqlite3"
 )
+# Databases holding invoices of users besides the main one
+DB_SHARD_URLS = ENV.list("DB_SHARD_URLS", [])
+# Invoices copied and deleted at once when a user is moved between shards
+SHARD_MOVE_BATCH_SIZE = ENV.int("SHARD_MOVE_BATCH_SIZE", 1000)
+# Total connections of all workers to a database, split into their pools
+DB_CONNECTION_BUDGET = ENV.int("DB_CONNECTION_BUDGET", 90)
+with ENV.prefixed("SERVER_"):
+    SERVER_HOST = ENV.str("HOST", "0.0.0.0")
+    SERVER_PORT = ENV.int("PORT", 8000)
+    # 0 means the number of CPU cores available to the process
+    SERVER_WORKERS = ENV.int("WORKERS", 0)
+    # 0 means workers are never recycled
+    SERVER_MAX_REQUESTS = ENV.int("MAX_REQUESTS", 0)
+    SERVER_MAX_REQUESTS_JITTER = ENV.int("MAX_REQUESTS_JITTER", 0)
+    # Streams of events never end, so they're closed after the timeout
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS = ENV.int(
+        "GRACEFUL_SHUTDOWN_SECONDS", 30)
+with ENV.prefixed("ADMISSION_"):
+    ADMISSION_ENABLED = ENV.bool("ENABLED", True)
+    # Requests executed concurrently by a worker in total
+    ADMISSION_MAX_CONCURRENCY = ENV.int("MAX_CONCURRENCY", 64)
+    # Invoice creation
+    with ENV.prefixed("CRITICAL_"):
+        ADMISSION_CRITICAL_CONCURRENCY = ENV.int("CONCURRENCY", 64)
+        ADMISSION_CRITICAL_QUEUE_SIZE = ENV.int("QUEUE_SIZE", 512)
+        ADMISSION_CRITICAL_QUEUE_TIMEOUT_MS = ENV.int(
+            "QUEUE_TIMEOUT_MS", 2000)
+    # Login and registration, hashing passwords
+    with ENV.prefixed("AUTH_"):
+        ADMISSION_AUTH_CONCURRENCY = ENV.int("CONCURRENCY", 8)
+        ADMISSION_AUTH_QUEUE_SIZE = ENV.int("QUEUE_SIZE", 64)
+        ADMISSION_AUTH_QUEUE_TIMEOUT_MS = ENV.int("QUEUE_TIMEOUT_MS", 1000)
+    # Other API routes
+    with ENV.prefixed("DEFAULT_"):
+        ADMISSION_DEFAULT_CONCURRENCY = ENV.int("CONCURRENCY", 32)
+        ADMISSION_DEFAULT_QUEUE_SIZE = ENV.int("QUEUE_SIZE", 128)
+        ADMISSION_DEFAULT_QUEUE_TIMEOUT_MS = ENV.int(
+            "QUEUE_TIMEOUT_MS", 1000)
+    # Listings, exports and reports
+    with ENV.prefixed("BULK_"):
+        ADMISSION_BULK_CONCURRENCY = ENV.int("CONCURRENCY", 4)
+        ADMISSION_BULK_QUEUE_SIZE = ENV.int("QUEUE_SIZE", 16)
+        ADMISSION_BULK_QUEUE_TIMEOUT_MS = ENV.int("QUEUE_TIMEOUT_MS", 500)
+with ENV.prefixed("QUERY_DEADLINE_"):
+    QUERY_DEADLINE_ENABLED = ENV.bool("ENABLED", True)
+    # Time for queries of a request, then they're cancelled, 0 - unlimited.
+    # Listings of invoices
+    QUERY_DEADLINE_LISTING_MS = ENV.int("LISTING_MS", 10000)
+    # Other API routes, except exports and other streams
+    QUERY_DEADLINE_DEFAULT_MS = ENV.int("DEFAULT_MS", 5000)
+with ENV.prefixed("PG_PARTITION_"):
+    PG_PARTITION_INVOICES = ENV.bool("INVOICES", False)
+    PG_PARTITION_MONTHS_AHEAD = ENV.int("MONTHS_AHEAD", 3)
+    PG_PARTITION_MAINTENANCE_INTERVAL_SECONDS = ENV.int(
+        "MAINTENANCE_INTERVAL_SECONDS", 86400)
+INVOICE_PARTITIONING = (
+    DB_URL.startswith("postgresql") and PG_PARTITION_INVOICES)
 INVOICE_TICKET_MAX_WIDTH = ENV.int("INVOICE_TICKET_MAX_WIDTH")
+INVOICE_TICKET_CACHE_SIZE = ENV.int("INVOICE_TICKET_CACHE_SIZE", 1024)
+INVOICE_EXPORT_CHUNK_SIZE = ENV.int("INVOICE_EXPORT_CHUNK_SIZE", 500)
+# Lines of large invoice validated and inserted at once
+INVOICE_INGEST_BATCH_SIZE = ENV.int("INVOICE_INGEST_BATCH_SIZE", 1000)
+with ENV.prefixed("USER_PROVISIONING_"):
+    # Users of bulk registration inserted at once
+    USER_PROVISIONING_BATCH_SIZE = ENV.int("BATCH_SIZE", 1000)
+    # Processes hashing passwords, 0 - one per CPU core
+    USER_PROVISIONING_PROCESSES = ENV.int("PROCESSES", 0)
+with ENV.prefixed("BACKGROUND_JOBS_"):
+    BACKGROUND_JOBS_CONCURRENCY = ENV.int("CONCURRENCY", 2)
+    # `memory` - jobs of each worker, `sqlite` - shared by host workers,
+    # empty - `memory` with a single worker, otherwise `sqlite`
+    BACKGROUND_JOBS_STORE = ENV.str("STORE", "")
+    BACKGROUND_JOBS_DIR = ENV.path("DIR", BASE_DIR / "app" / "jobs")
+    # Finished jobs and their results are deleted after it, 0 - never
+    BACKGROUND_JOBS_TTL_HOURS = ENV.int("TTL_HOURS", 24)
+    BACKGROUND_JOBS_PURGE_INTERVAL_SECONDS = ENV.int(
+        "PURGE_INTERVAL_SECONDS", 3600)
+# Logins of users allowed to use administrative endpoints
+ADMIN_LOGINS = ENV.list("ADMIN_LOGINS", [])
+with ENV.prefixed("PROFILING_"):
+    # Requests are profiled only if enabled, capture is always available
+    PROFILING_ENABLED = ENV.bool("ENABLED", False)
+    PROFILING_SAMPLE_RATE = ENV.float("SAMPLE_RATE", 0.0)
+    # Value of `X-Profile-Token` header to profile a request
+    PROFILING_TOKEN = ENV.str("TOKEN", "")
+    PROFILING_DIR = ENV.path("DIR", BASE_DIR / "app" / "profiles")
+    PROFILING_MAX_CAPTURE_SECONDS = ENV.int("MAX_CAPTURE_SECONDS", 60)
+    PROFILING_INTERVAL_MS = ENV.int("INTERVAL_MS", 5)
+    # Profiles are deleted after it, 0 - never
+    PROFILING_TTL_HOURS = ENV.int("TTL_HOURS", 168)
+    PROFILING_PURGE_INTERVAL_SECONDS = ENV.int(
+        "PURGE_INTERVAL_SECONDS", 3600)
+with ENV.prefixed("RESPONSE_CACHE_"):
+    # Empty - disabled, `memory` - cache of each worker, `redis` - shared
+    RESPONSE_CACHE_BACKEND = ENV.str("BACKEND", "")
+    RESPONSE_CACHE_REDIS_URL = ENV.str("REDIS_URL", "redis://localhost:6379")
+    RESPONSE_CACHE_MAX_SIZE = ENV.int("MAX_SIZE", 4096)
+    RESPONSE_CACHE_TTL_SECONDS = ENV.int("TTL_SECONDS", 60)
+with ENV.prefixed("EVENTS_"):
+    # `memory` - events of each worker, `redis` - shared by all workers
+    EVENTS_BROKER = ENV.str("BROKER", "memory")
+    EVENTS_REDIS_URL = ENV.str("REDIS_URL", "redis://localhost:6379")
+    # Events kept for a slow subscriber, the oldest ones are dropped
+    EVENTS_QUEUE_SIZE = ENV.int("QUEUE_SIZE", 100)
+    EVENTS_KEEPALIVE_SECONDS = ENV.int("KEEPALIVE_SECONDS", 15)
+with ENV.prefixed("INVOICE_BATCHING_"):
+    INVOICE_BATCHING_ENABLED = ENV.bool("ENABLED", False)
+    INVOICE_BATCHING_WINDOW_MS = ENV.int("WINDOW_MS", 5)
+    INVOICE_BATCHING_MAX_SIZE = ENV.int("MAX_SIZE", 64)
+with ENV.prefixed("INVOICE_ARCHIVE_"):
+    # Months of invoices older than this are archived, 0 - never.
+    # Exports, jobs, the change feed and product search skip archives
+    INVOICE_ARCHIVE_AFTER_DAYS = ENV.int("AFTER_DAYS", 0)
+    INVOICE_ARCHIVE_INTERVAL_SECONDS = ENV.int("INTERVAL_SECONDS", 86400)
+    INVOICE_ARCHIVE_COMPRESS_LEVEL = ENV.int("COMPRESS_LEVEL", 9)
+with ENV.prefixed("INVOICE_IMPORT_"):
+    # Invoices loaded in a transaction, after which progress is saved
+    INVOICE_IMPORT_BATCH_SIZE = ENV.int("BATCH_SIZE", 10000)
+    # Ids of products kept in memory by name and price
+    INVOICE_IMPORT_PRODUCTS_CACHE_SIZE = ENV.int(
+        "PRODUCTS_CACHE_SIZE", 100000)
+with ENV.prefixed("IDEMPOTENCY_KEY_"):
+    IDEMPOTENCY_KEY_TTL_HOURS = ENV.int("TTL_HOURS", 24)
+    IDEMPOTENCY_KEY_PURGE_INTERVAL_SECONDS = ENV.int(
+        "PURGE_INTERVAL_SECONDS", 600)
+    IDEMPOTENCY_KEY_PURGE_BATCH_SIZE = ENV.int("PURGE_BATCH_SIZE", 1000)
+with ENV.prefixed("GZIP_"):
+    GZIP_MINIMUM_SIZE = ENV.int("MINIMUM_SIZE", 1024)
+    GZIP_COMPRESS_LEVEL = ENV.int("COMPRESS_LEVEL", 6)
 with ENV.prefixed("AUTH_JWT_"):
     AUTH_JWT_ALGORITHM = ENV.str("ALGORITHM")
     AUTH_JWT_PRIVATE_KEY = ENV.path("PRIVATE_KEY_PATH").read_text()
@@ -1,36 +1,133 @@
-from asyncio import current_task
+from sqlalchemy import Connection
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from sqlalchemy.util.concurrency import in_greenlet
 
-from sqlalchemy.ext.asyncio import (
-    async_scoped_session, async_sessionmaker, create_async_engine
-)
-from sqlalchemy.pool import NullPool
+from app.config import DB_SHARD_URLS, DB_URL, DEBUG_MODE
+from app.configuration.query_deadlines import enforce_query_deadlines
+from app.configuration.statement_metrics import track_statement_caches
+from app.utils.sharding import HashRing
 
-from app.config import DB_URL, DEBUG_MODE
+
+class RequestSession(Session):
+    """
+    Keeps the connection checked out for the first statement until
+    the session is closed, so commits in the middle of a request
+    don't return it to the pool only to check out another one
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__connection: Connection | None = None
+
+    def get_bind(self, *args, **kwargs):
+        if self.__connection is not None:
+            return self.__connection
+
+        bind = super().get_bind(*args, **kwargs)
+        # Called outside of statements only to inspect the dialect
+        if not in_greenlet():
+            return bind
+
+        self.__connection = bind.connect()
+        return self.__connection
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if self.__connection is not None:
+                self.__connection.close()
+                self.__connection = None
 
 
 class DatabaseHelper:
 
-    def __init__(self, db_url: str, echo_mode: bool = False):
-        self.engine = create_async_engine(
-            url=db_url, echo=echo_mode, poolclass=NullPool
-        )
+    def __init__(
+            self,
+            db_url: str,
+            echo_mode: bool = False,
+            pool_size: int | None = None,
+            shard_urls: tuple[str, ...] = ()
+        ):
+        self.db_url = db_url
+        self.echo_mode = echo_mode
+        self.engine = self.create_engine(pool_size)
         self.session_factory = async_sessionmaker(
             bind=self.engine,
             autoflush=False,
             autocommit=False,
             expire_on_commit=False)
+        self.request_session_factory = async_sessionmaker(
+            bind=self.engine,
+            autoflush=False,
+            autocommit=False,
+            expire_on_commit=False,
+            sync_session_class=RequestSession)
+        # The database itself is the first shard. Besides invoices
+        # it keeps all users and the directory of their shards
+        self.shards = (self, *(
+            DatabaseHelper(shard_url, echo_mode, pool_size)
+            for shard_url in shard_urls))
+        self.shard_ring = HashRing(len(self.shards))
+
+    def create_engine(self, pool_size: int | None):
+        """
+        Without pool size each session opens its own connection,
+        otherwise no more than `pool_size` connections are kept open
+        """
+        pool_options = (
+            dict(poolclass=NullPool) if pool_size is None
+            else dict(
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=pool_size,
+                max_overflow=0))
+        engine = create_async_engine(
+            url=self.db_url, echo=self.echo_mode, **pool_options)
+        track_statement_caches(engine)
+        enforce_query_deadlines(engine)
+
+        return engine
+
+    def resize_pool(self, pool_size: int):
+        """
+        Replaces the engine with a pooled one, e.g. in a forked worker.
+        Connections inherited from the parent are left to it
+        """
+        self.engine.sync_engine.dispose(close=False)
+        self.engine = self.create_engine(pool_size)
+        self.session_factory.configure(bind=self.engine)
+        self.request_session_factory.configure(bind=self.engine)
+        for shard in self.shards[1:]:
+            shard.resize_pool(pool_size)
+
+    async def dispose(self):
+        """Closes connections of all shards"""
+        for shard in self.shards:
+            await shard.engine.dispose()
+
+    async def session_dependency(self):
+        """
+        Session of the request. FastAPI caches it for the request,
+        so all dependencies share it and its single connection, which
+        is checked out lazily and returned when the request is handled,
+        on errors as well
+        """
+        async with self.request_session_factory() as session:
+            yield session
 
-    def get_scoped_session(self):
-        session = async_scoped_session(
-            session_factory=self.session_factory,
-            scopefunc=current_task
-        )
-        return session
+    def session_factory_dependency(self):
+        """
+        Provides the factory itself for responses, which open sessions
+        on their own, e.g. while streaming after dependencies are closed
+        """
+        return self.session_factory
 
-    async def scoped_session_dependency(self):
-        session = self.get_scoped_session()
-        yield session
-        await session.close()
+    def router_dependency(self):
+        """Provides the helper itself to route requests between shards"""
+        return self
 
 
-db_helper = DatabaseHelper(db_url=DB_URL, echo_mode=DEBUG_MODE)
+db_helper = DatabaseHelper(
+    db_url=DB_URL, echo_mode=DEBUG_MODE, shard_urls=tuple(DB_SHARD_URLS))
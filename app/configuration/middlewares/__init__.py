@@ -0,0 +1,123 @@
+from app.config import (
+    ADMISSION_AUTH_CONCURRENCY,
+    ADMISSION_AUTH_QUEUE_SIZE,
+    ADMISSION_AUTH_QUEUE_TIMEOUT_MS,
+    ADMISSION_BULK_CONCURRENCY,
+    ADMISSION_BULK_QUEUE_SIZE,
+    ADMISSION_BULK_QUEUE_TIMEOUT_MS,
+    ADMISSION_CRITICAL_CONCURRENCY,
+    ADMISSION_CRITICAL_QUEUE_SIZE,
+    ADMISSION_CRITICAL_QUEUE_TIMEOUT_MS,
+    ADMISSION_DEFAULT_CONCURRENCY,
+    ADMISSION_DEFAULT_QUEUE_SIZE,
+    ADMISSION_DEFAULT_QUEUE_TIMEOUT_MS,
+    ADMISSION_ENABLED,
+    ADMISSION_MAX_CONCURRENCY,
+    API_PREFIX,
+    GZIP_COMPRESS_LEVEL,
+    GZIP_MINIMUM_SIZE,
+    PROFILING_DIR,
+    PROFILING_ENABLED,
+    PROFILING_SAMPLE_RATE,
+    PROFILING_TOKEN,
+    QUERY_DEADLINE_DEFAULT_MS,
+    QUERY_DEADLINE_ENABLED,
+    QUERY_DEADLINE_LISTING_MS
+)
+from app.configuration.middlewares.admission import AdmissionMiddleware
+from app.configuration.middlewares.compression import CompressionMiddleware
+from app.configuration.middlewares.middlewares import Middlewares
+from app.configuration.middlewares.profiling import ProfilingMiddleware
+from app.configuration.middlewares.query_deadline import (
+    QueryDeadlineMiddleware
+)
+from app.utils.admission import AdmissionClass
+
+__middlewares__ = Middlewares(
+    middlewares=(
+        (
+            AdmissionMiddleware,
+            dict(
+                enabled=ADMISSION_ENABLED,
+                max_concurrency=ADMISSION_MAX_CONCURRENCY,
+                classes=(
+                    AdmissionClass(
+                        "critical",
+                        priority=0,
+                        concurrency=ADMISSION_CRITICAL_CONCURRENCY,
+                        queue_size=ADMISSION_CRITICAL_QUEUE_SIZE,
+                        queue_timeout=(
+                            ADMISSION_CRITICAL_QUEUE_TIMEOUT_MS / 1000)),
+                    AdmissionClass(
+                        "auth",
+                        priority=1,
+                        concurrency=ADMISSION_AUTH_CONCURRENCY,
+                        queue_size=ADMISSION_AUTH_QUEUE_SIZE,
+                        queue_timeout=ADMISSION_AUTH_QUEUE_TIMEOUT_MS / 1000),
+                    AdmissionClass(
+                        "default",
+                        priority=1,
+                        concurrency=ADMISSION_DEFAULT_CONCURRENCY,
+                        queue_size=ADMISSION_DEFAULT_QUEUE_SIZE,
+                        queue_timeout=(
+                            ADMISSION_DEFAULT_QUEUE_TIMEOUT_MS / 1000)),
+                    AdmissionClass(
+                        "bulk",
+                        priority=2,
+                        concurrency=ADMISSION_BULK_CONCURRENCY,
+                        queue_size=ADMISSION_BULK_QUEUE_SIZE,
+                        queue_timeout=ADMISSION_BULK_QUEUE_TIMEOUT_MS / 1000)
+                ),
+                routes=(
+                    # Subscribers wait for events without doing anything
+                    ("GET", API_PREFIX + "/invoice/events", None),
+                    ("POST", API_PREFIX + "/invoice/create", "critical"),
+                    ("POST", API_PREFIX + "/auth/", "auth"),
+                    ("POST", API_PREFIX + "/user/register", "auth"),
+                    ("POST", API_PREFIX + "/user/provision", "bulk"),
+                    ("GET", API_PREFIX + "/invoice/retrieve", "bulk"),
+                    ("GET", API_PREFIX + "/invoice/export", "bulk"),
+                    ("POST", API_PREFIX + "/invoice/ingest", "bulk"),
+                    ("*", API_PREFIX + "/", "default")
+                ))
+        ),
+        (
+            # Inside admission control, so time in queue isn't counted
+            QueryDeadlineMiddleware,
+            dict(
+                enabled=QUERY_DEADLINE_ENABLED,
+                export_path=API_PREFIX + "/invoice/export",
+                routes=(
+                    # Streams and background jobs run as long as needed
+                    ("GET", API_PREFIX + "/invoice/events", None),
+                    ("GET", API_PREFIX + "/invoice/export", None),
+                    ("POST", API_PREFIX + "/invoice/ingest", None),
+                    ("POST", API_PREFIX + "/user/provision", None),
+                    ("*", API_PREFIX + "/job/", None),
+                    ("*", API_PREFIX + "/profiling/", None),
+                    (
+                        "GET",
+                        API_PREFIX + "/invoice/retrieve",
+                        QUERY_DEADLINE_LISTING_MS),
+                    ("*", API_PREFIX + "/", QUERY_DEADLINE_DEFAULT_MS)
+                ))
+        ),
+        (
+            CompressionMiddleware,
+            dict(
+                minimum_size=GZIP_MINIMUM_SIZE,
+                compresslevel=GZIP_COMPRESS_LEVEL)
+        ),
+        # Not added at all unless enabled
+        *(
+            (
+                (
+                    ProfilingMiddleware,
+                    dict(
+                        results_dir=PROFILING_DIR,
+                        sample_rate=PROFILING_SAMPLE_RATE,
+                        token=PROFILING_TOKEN)
+                ),
+            ) if PROFILING_ENABLED else ()
+        )
+    ))
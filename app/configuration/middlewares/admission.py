@@ -0,0 +1,61 @@
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.utils.admission import (
+    AdmissionClass, AdmissionController, Overloaded
+)
+
+
+class AdmissionMiddleware:
+    """
+    Admits requests through the controller of this worker by class of
+    their route: the first of `routes` (method or `*`, path prefix,
+    class name) matching the request. Unmatched ones and ones of
+    routes without class aren't limited.
+    The slot is held until the response (even streamed) is sent
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            max_concurrency: int,
+            classes: tuple[AdmissionClass, ...],
+            routes: tuple[tuple[str, str, str | None], ...],
+            enabled: bool = True
+        ):
+        self.app = app
+        self.controller = AdmissionController(max_concurrency, classes)
+        self.routes = routes
+        self.enabled = enabled
+
+    def get_class_name(self, method: str, path: str):
+        for route_method, path_prefix, class_name in self.routes:
+            if (
+                    route_method in ("*", method) and
+                    path.startswith(path_prefix)):
+                return class_name
+
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        class_name = (
+            self.get_class_name(scope["method"], scope["path"])
+            if self.enabled and scope["type"] == "http" else None)
+        if class_name is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            started_at = await self.controller.acquire(class_name)
+        except Overloaded as exc:
+            response = JSONResponse(
+                {"detail": "Server is overloaded, please retry later"},
+                status_code=503,
+                headers={"Retry-After": str(exc.retry_after)})
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(class_name, started_at)
@@ -0,0 +1,58 @@
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZip middleware, which leaves untouched responses that are
+    already encoded, partial (`206`) or must not be buffered (e.g. SSE)
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            minimum_size: int = 500,
+            compresslevel: int = 9,
+            excluded_media_types: tuple[str, ...] = ("text/event-stream",)
+        ):
+        super().__init__(app, minimum_size, compresslevel)
+        self.excluded_media_types = excluded_media_types
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http":
+            headers = Headers(scope=scope)
+            if "gzip" in headers.get("Accept-Encoding", ""):
+                responder = CompressionResponder(
+                    self.app,
+                    self.minimum_size,
+                    self.compresslevel,
+                    self.excluded_media_types)
+                await responder(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
+
+
+class CompressionResponder(GZipResponder):
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            minimum_size: int,
+            compresslevel: int,
+            excluded_media_types: tuple[str, ...]
+        ):
+        super().__init__(app, minimum_size, compresslevel)
+        self.excluded_media_types = excluded_media_types
+
+    async def send_with_gzip(self, message: Message):
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            media_type = headers.get("Content-Type", "").split(";")[0]
+            if (
+                    media_type in self.excluded_media_types or
+                    "content-range" in headers):
+                # Passes body through the same way as for encoded ones
+                self.content_encoding_set = True
@@ -0,0 +1,16 @@
+from dataclasses import dataclass
+
+from fastapi import FastAPI
+
+
+@dataclass(frozen=True)
+class Middlewares:
+    """
+    Pairs of middleware class and its options.
+    The first one in the tuple becomes the outermost one
+    """
+    middlewares: tuple
+
+    def register_middlewares(self, app: FastAPI):
+        for middleware, options in reversed(self.middlewares):
+            app.add_middleware(middleware, **options)
@@ -0,0 +1,80 @@
+import random
+import secrets
+from pathlib import Path
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.profiling import RequestProfiler
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests with `X-Profile-Token` header equal to `token`
+    and a random `sample_rate` share of others. File name of the
+    profile is returned in `X-Profile` header of the response.
+    It's added only if profiling is enabled, so costs nothing otherwise
+    """
+
+    header = "x-profile-token"
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            results_dir: Path,
+            sample_rate: float = 0.0,
+            token: str = ""
+        ):
+        self.app = app
+        self.profiler = RequestProfiler(results_dir)
+        self.sample_rate = sample_rate
+        self.token = token
+
+    def is_requested(self, scope: Scope):
+        for name, value in scope["headers"]:
+            if name.decode("latin-1") == self.header:
+                return bool(self.token) and secrets.compare_digest(
+                    value.decode("latin-1"), self.token)
+
+        return False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not (
+                self.is_requested(scope) or
+                random.random() < self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        profiler = self.profiler.start()
+        if profiler is None:
+            await self.app(scope, receive, send)
+            return
+
+        label = f"{scope['method']} {scope['path']}"
+        start_message: Message | None = None
+
+        async def send_profiled(message: Message):
+            nonlocal profiler, start_message
+            if message["type"] == "http.response.start":
+                # Headers are sent with the body, once profile is saved
+                start_message = message
+                return
+
+            if profiler is not None and not message.get("more_body"):
+                file_name = self.profiler.stop(profiler, label)
+                profiler = None
+                if start_message is not None:
+                    MutableHeaders(scope=start_message)["X-Profile"] = (
+                        file_name)
+
+            if start_message is not None:
+                await send(start_message)
+                start_message = None
+
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_profiled)
+        finally:
+            if profiler is not None:
+                self.profiler.stop(profiler, label)
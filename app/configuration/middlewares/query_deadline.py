@@ -0,0 +1,81 @@
+import time
+
+from sqlalchemy.exc import DBAPIError
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.query_deadlines import (
+    exceeded_query_deadlines, is_query_deadline_error, query_deadline
+)
+
+
+class QueryDeadlineMiddleware:
+    """
+    Sets deadline for queries of the request by its route: the first
+    of `routes` (method or `*`, path prefix, milliseconds) matching
+    the request. Unmatched ones and ones of routes without time
+    aren't limited. Queries running at the deadline are cancelled
+    and the client is told to request less data at once
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            routes: tuple[tuple[str, str, int | None], ...],
+            export_path: str,
+            enabled: bool = True
+        ):
+        self.app = app
+        self.routes = routes
+        self.export_path = export_path
+        self.enabled = enabled
+
+    def get_route(self, method: str, path: str):
+        for route in self.routes:
+            route_method, path_prefix, _ = route
+            if (
+                    route_method in ("*", method) and
+                    path.startswith(path_prefix)):
+                return route
+
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        route = (
+            self.get_route(scope["method"], scope["path"])
+            if self.enabled and scope["type"] == "http" else None)
+        if route is None or not route[2]:
+            await self.app(scope, receive, send)
+            return
+
+        _, path_prefix, deadline_ms = route
+        is_response_started = False
+
+        async def send_wrapper(message: Message):
+            nonlocal is_response_started
+            if message["type"] == "http.response.start":
+                is_response_started = True
+
+            await send(message)
+
+        token = query_deadline.set(time.monotonic() + deadline_ms / 1000)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except DBAPIError as exc:
+            if is_response_started or not is_query_deadline_error(exc):
+                raise
+
+            exceeded_query_deadlines.inc(path_prefix)
+            response = JSONResponse(
+                {
+                    "detail": (
+                        "Request took longer than "
+                        f"{deadline_ms / 1000:g} s and was cancelled. "
+                        "Narrow the filters, request a page at a time "
+                        "(`limit` and `page`) or download everything from "
+                        f"`GET {self.export_path}`")
+                },
+                status_code=504)
+            await response(scope, receive, send)
+        finally:
+            query_deadline.reset(token)
@@ -0,0 +1,70 @@
+import time
+
+from sqlalchemy import Connection, event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session, SessionTransaction
+from sqlalchemy.pool import ConnectionPoolEntry
+from sqlalchemy.util import await_only
+
+from app.utils.query_deadlines import query_deadline
+
+# SQLite virtual machine instructions between checks of the deadline
+SQLITE_PROGRESS_INSTRUCTIONS = 1000
+
+
+class SQLiteDeadline:
+    """
+    Progress handler of SQLite connection. Interrupts the statement
+    being executed after the deadline in the thread running it,
+    so the connection is returned to the pool only when it's idle
+    """
+
+    def __init__(self):
+        self.deadline: float | None = None
+
+    def __call__(self):
+        return self.deadline is not None and time.monotonic() > self.deadline
+
+
+def install_sqlite_deadline(
+        dbapi_connection, connection_record: ConnectionPoolEntry
+    ):
+    handler = SQLiteDeadline()
+    await_only(dbapi_connection.driver_connection.set_progress_handler(
+        handler, SQLITE_PROGRESS_INSTRUCTIONS))
+    connection_record.info["query_deadline"] = handler
+
+
+def reset_sqlite_deadline(
+        dbapi_connection, connection_record: ConnectionPoolEntry
+    ):
+    """Deadline of a request doesn't outlive its checkout"""
+    if connection_record is not None:
+        connection_record.info["query_deadline"].deadline = None
+
+
+@event.listens_for(Session, "after_begin")
+def apply_query_deadline(
+        session: Session,
+        transaction: SessionTransaction,
+        connection: Connection
+    ):
+    """
+    Limits statements of the transaction by the deadline of the request:
+    by `statement_timeout` on PostgreSQL or SQLite progress handler
+    """
+    deadline = query_deadline.get()
+    sqlite_deadline = connection.info.get("query_deadline")
+    if sqlite_deadline is not None:
+        sqlite_deadline.deadline = deadline
+    elif deadline is not None and connection.dialect.name == "postgresql":
+        timeout_ms = max(1, int((deadline - time.monotonic()) * 1000))
+        connection.exec_driver_sql(
+            f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+def enforce_query_deadlines(engine: AsyncEngine):
+    """Installs deadline handler into each SQLite connection"""
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", install_sqlite_deadline)
+        event.listen(engine.sync_engine, "checkin", reset_sqlite_deadline)
@@ -1,5 +1,16 @@
 from app.configuration.routes.routes import Routes
-from app.internal.routes import auth, base, invoice, user
+from app.internal.routes import (
+    auth, base, health, invoice, job, metrics, product, profiling, user
+)
 
 __routes__ = Routes(
-    routers=(auth.router, base.router, invoice.router, user.router))
+    routers=(
+        auth.router,
+        base.router,
+        health.router,
+        invoice.router,
+        job.router,
+        metrics.router,
+        product.router,
+        profiling.router,
+        user.router))
@@ -1,10 +1,37 @@
+import asyncio
 from contextlib import asynccontextmanager
+from datetime import timedelta
 
 from fastapi import FastAPI
+from sqlalchemy import Connection, inspect, text, update
 
+from app.config import (
+    BACKGROUND_JOBS_PURGE_INTERVAL_SECONDS,
+    BACKGROUND_JOBS_TTL_HOURS,
+    IDEMPOTENCY_KEY_PURGE_INTERVAL_SECONDS,
+    INVOICE_ARCHIVE_AFTER_DAYS,
+    INVOICE_ARCHIVE_INTERVAL_SECONDS,
+    INVOICE_PARTITIONING,
+    PG_PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+    PROFILING_DIR,
+    PROFILING_PURGE_INTERVAL_SECONDS,
+    PROFILING_TTL_HOURS
+)
 from app.configuration.db_helper import db_helper
+from app.configuration.middlewares import __middlewares__
 from app.configuration.routes import __routes__
-from app.internal.models import Base
+from app.configuration.warmup import warm_up
+from app.internal.crud.idempotency import purge_expired_idempotency_keys
+from app.internal.crud.invoice import invoice_events
+from app.internal.crud.invoice_archive import archive_old_invoices
+from app.internal.crud.invoice_jobs import job_runner, purge_expired_jobs
+from app.internal.crud.partitions import create_invoice_partitions
+from app.internal.crud.sharding import reserve_shard_invoice_ids
+from app.internal.crud.user_provisioning import password_hashing_pool
+from app.internal.models import Base, Invoice
+from app.utils.periodic_jobs import (
+    delete_files_older_than, run_periodically
+)
 
 
 class Server:
@@ -12,6 +39,7 @@ class Server:
     def __init__(self, app: FastAPI):
         self.__app = app
         self.__register_routes(app)
+        self.__register_middlewares(app)
 
     def get_app(self):
         return self.__app
@@ -20,10 +48,87 @@ class Server:
     def __register_routes(app: FastAPI):
         __routes__.register_routers(app)
 
+    @staticmethod
+    def __register_middlewares(app: FastAPI):
+        __middlewares__.register_middlewares(app)
+
+
+def add_invoice_change_seq(conn: Connection):
+    """
+    Adds change number to invoice table created before it. Invoices
+    saved before are numbered by their ids, so cursors of the change
+    feed given out as ids stay valid
+    """
+    columns = inspect(conn).get_columns(Invoice.__tablename__)
+    if any(column["name"] == "change_seq" for column in columns):
+        return
+
+    conn.execute(text("ALTER TABLE invoice ADD COLUMN change_seq BIGINT"))
+    conn.execute(update(Invoice).values(change_seq=Invoice.id))
+
+
+def create_missing_indexes(conn: Connection):
+    """Indexes added to existing tables aren't created with them"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+async def create_tables():
+    for shard, database in enumerate(db_helper.shards):
+        async with database.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(add_invoice_change_seq)
+            await conn.run_sync(create_missing_indexes)
+
+        if shard != 0:
+            async with database.session_factory() as session:
+                await reserve_shard_invoice_ids(session, shard)
+
+
+async def purge_expired_profiles():
+    await asyncio.to_thread(
+        delete_files_older_than,
+        PROFILING_DIR,
+        timedelta(hours=PROFILING_TTL_HOURS))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with db_helper.engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await create_tables()
+    periodic_jobs = list()
+    if BACKGROUND_JOBS_TTL_HOURS:
+        periodic_jobs.append(asyncio.create_task(run_periodically(
+            BACKGROUND_JOBS_PURGE_INTERVAL_SECONDS, purge_expired_jobs)))
+    if PROFILING_TTL_HOURS:
+        periodic_jobs.append(asyncio.create_task(run_periodically(
+            PROFILING_PURGE_INTERVAL_SECONDS, purge_expired_profiles)))
+    for database in db_helper.shards:
+        periodic_jobs.append(asyncio.create_task(run_periodically(
+            IDEMPOTENCY_KEY_PURGE_INTERVAL_SECONDS,
+            purge_expired_idempotency_keys,
+            database.session_factory)))
+        if INVOICE_ARCHIVE_AFTER_DAYS:
+            periodic_jobs.append(asyncio.create_task(run_periodically(
+                INVOICE_ARCHIVE_INTERVAL_SECONDS,
+                archive_old_invoices,
+                database.session_factory)))
+        if INVOICE_PARTITIONING:
+            async with database.session_factory() as session:
+                await create_invoice_partitions(session)
+
+            periodic_jobs.append(asyncio.create_task(run_periodically(
+                PG_PARTITION_MAINTENANCE_INTERVAL_SECONDS,
+                create_invoice_partitions,
+                database.session_factory)))
+    await warm_up(db_helper)
+    app.state.is_ready = True
     yield
-    await db_helper.engine.dispose()
+    app.state.is_ready = False
+    for periodic_job in periodic_jobs:
+        periodic_job.cancel()
+    await asyncio.gather(*periodic_jobs, return_exceptions=True)
+    await job_runner.shutdown()
+    password_hashing_pool.shutdown()
+    await invoice_events.close()
+    await db_helper.dispose()
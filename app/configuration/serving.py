@@ -0,0 +1,167 @@
+import os
+import random
+import signal
+import socket
+
+import uvicorn
+from fastapi import FastAPI
+from loguru import logger
+
+from app.config import (
+    BACKGROUND_JOBS_STORE,
+    RESPONSE_CACHE_BACKEND,
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS
+)
+from app.configuration.db_helper import db_helper
+from app.configuration.server import create_tables
+from app.internal.crud.invoice_jobs import create_job_store, job_runner
+
+# Exit code of a worker, which failed to start serving
+WORKER_BOOT_ERROR = 3
+
+
+def get_workers_count(workers: int):
+    """Returns configured count or one worker per available CPU core"""
+    if workers > 0:
+        return workers
+
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+
+def get_pool_size(connection_budget: int, workers: int):
+    """Splits connections evenly between workers, at least one for each"""
+    return max(1, connection_budget // workers)
+
+
+def check_workers_settings(workers: int):
+    """Rejects state kept by each worker, which must be shared by all"""
+    if workers > 1 and RESPONSE_CACHE_BACKEND == "memory":
+        raise ValueError(
+            "Response cache of a worker isn't invalidated by writes "
+            f"of others, use Redis response cache with {workers} workers")
+    if workers > 1 and BACKGROUND_JOBS_STORE == "memory":
+        raise ValueError(
+            "Jobs of a worker aren't found by others, use SQLite "
+            f"job store with {workers} workers")
+
+
+def configure_workers(workers: int):
+    """Shares state of workers, which depends on their count"""
+    job_runner.store = create_job_store(workers)
+
+
+async def prepare_database():
+    """Creates tables once, before workers are started concurrently"""
+    await create_tables()
+    await db_helper.dispose()
+
+
+class WorkerSupervisor:
+    """
+    Prefork server: the app is loaded once in the parent process,
+    then `workers` processes are forked to serve the shared socket.
+    A worker exits after serving `max_requests` requests
+    (plus random jitter, so workers aren't recycled all at once)
+    and is replaced with a new fork of the parent
+    """
+
+    def __init__(
+            self,
+            app: FastAPI,
+            host: str,
+            port: int,
+            workers: int,
+            pool_size: int,
+            max_requests: int = 0,
+            max_requests_jitter: int = 0
+        ):
+        self.config = uvicorn.Config(
+            app,
+            host=host,
+            port=port,
+            timeout_graceful_shutdown=SERVER_GRACEFUL_SHUTDOWN_SECONDS)
+        self.workers = workers
+        self.pool_size = pool_size
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.exit_code = 0
+        self.__worker_pids: set[int] = set()
+        self.__should_exit = False
+
+    def run(self):
+        sock = self.config.bind_socket()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.__handle_exit)
+
+        logger.info(
+            f"Starting {self.workers} workers with {self.pool_size} "
+            "DB connections each")
+        try:
+            for _ in range(self.workers):
+                self.__spawn_worker(sock)
+            self.__supervise(sock)
+        finally:
+            sock.close()
+
+        return self.exit_code
+
+    def __spawn_worker(self, sock: socket.socket):
+        limit_max_requests = (
+            self.max_requests + random.randint(0, self.max_requests_jitter)
+            if self.max_requests else None)
+        pid = os.fork()
+        if pid == 0:
+            exit_code = WORKER_BOOT_ERROR
+            try:
+                exit_code = self.__serve(sock, limit_max_requests)
+            except BaseException:
+                logger.exception(f"Worker {os.getpid()} crashed")
+            finally:
+                os._exit(exit_code)
+
+        self.__worker_pids.add(pid)
+
+    def __serve(self, sock: socket.socket, limit_max_requests: int | None):
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, signal.SIG_DFL)
+        # Ctrl+C reaches only the parent, which stops workers once
+        os.setpgid(0, 0)
+
+        db_helper.resize_pool(self.pool_size)
+        self.config.limit_max_requests = limit_max_requests
+        server = uvicorn.Server(self.config)
+        server.run(sockets=[sock])
+
+        return 0 if server.started else WORKER_BOOT_ERROR
+
+    def __supervise(self, sock: socket.socket):
+        while self.__worker_pids:
+            pid, status = os.wait()
+            self.__worker_pids.discard(pid)
+            exit_code = os.waitstatus_to_exitcode(status)
+            if self.__should_exit:
+                continue
+
+            if exit_code == WORKER_BOOT_ERROR:
+                logger.error(f"Worker {pid} failed to start, stopping")
+                self.exit_code = WORKER_BOOT_ERROR
+                self.__stop_workers()
+                continue
+
+            logger.info(f"Worker {pid} exited ({exit_code}), replacing it")
+            self.__spawn_worker(sock)
+
+    def __handle_exit(self, signum: int, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, stopping")
+        self.__stop_workers()
+
+    def __stop_workers(self):
+        self.__should_exit = True
+        for pid in self.__worker_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
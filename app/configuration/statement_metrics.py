@@ -0,0 +1,52 @@
+from sqlalchemy import Connection, event
+from sqlalchemy.engine import ExecutionContext
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.utils.metrics import hit_ratio, metrics
+
+compiled_cache_lookups = metrics.counter(
+    "sqlalchemy_compiled_cache_lookups_total",
+    "Lookups of compiled statements in SQLAlchemy cache",
+    ("result",))
+prepared_statement_lookups = metrics.counter(
+    "asyncpg_prepared_statement_lookups_total",
+    "Lookups of prepared statements in asyncpg connection cache",
+    ("result",))
+metrics.gauge(
+    "sqlalchemy_compiled_cache_hit_ratio",
+    "Share of statements executed without compilation",
+    callback=lambda: hit_ratio(compiled_cache_lookups))
+metrics.gauge(
+    "asyncpg_prepared_statement_hit_ratio",
+    "Share of statements executed without preparation",
+    callback=lambda: hit_ratio(prepared_statement_lookups))
+
+
+def count_statement_cache_lookups(
+        conn: Connection,
+        cursor,
+        statement: str,
+        parameters,
+        context: ExecutionContext | None,
+        executemany: bool
+    ):
+    if context is not None:
+        compiled_cache_lookups.inc(
+            "hit" if context.cache_hit.name == "CACHE_HIT"
+            else context.cache_hit.name.lower())
+
+    prepared_statement_cache = getattr(
+        conn.connection.dbapi_connection,
+        "_prepared_statement_cache",
+        None)
+    if prepared_statement_cache is not None:
+        prepared_statement_lookups.inc(
+            "hit" if statement in prepared_statement_cache else "miss")
+
+
+def track_statement_caches(engine: AsyncEngine):
+    """Counts hits of compiled and prepared statement caches"""
+    event.listen(
+        engine.sync_engine,
+        "before_cursor_execute",
+        count_statement_cache_lookups)
@@ -0,0 +1,94 @@
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime
+
+from fastapi import HTTPException
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.pool import QueuePool
+
+from app.configuration.db_helper import DatabaseHelper
+from app.internal.crud.invoice import (
+    find_existing_products,
+    get_invoice_changes,
+    get_invoices,
+    get_pretty_invoice
+)
+from app.internal.crud.product import search_products
+from app.internal.crud.user import get_user_by_login
+from app.internal.schemas import (
+    InvoiceProductAssociationCreate, InvoiceSchema, InvoicesSchema
+)
+from app.utils.auth_jwt import decode_jwt, encode_jwt
+from app.utils.prettify_invoice import invoice_to_ticket_format
+
+# Never registered: ids and logins of users start from 1 and 3 symbols
+WARMUP_OWNER_ID = 0
+WARMUP_LOGIN = "-"
+dummy_invoice = dict(
+    id=0,
+    products=[dict(
+        name="Warm-up", price=100, quantity=2, unit_price=100, total=200)],
+    payment=dict(id=0, type="cash", amount=200),
+    total=200,
+    rest=0,
+    created_at=datetime(2000, 1, 1),
+    created_by=dict(
+        id=WARMUP_OWNER_ID, name="Warm-up", login="warm-up", password=b""))
+
+
+async def open_pool_connections(database: DatabaseHelper):
+    """Opens all connections of the pool at once and returns them to it"""
+    pool = database.engine.pool
+    connections_count = pool.size() if isinstance(pool, QueuePool) else 1
+    async with AsyncExitStack() as stack:
+        for _ in range(connections_count):
+            connection = await stack.enter_async_context(
+                database.engine.connect())
+            await connection.execute(select(1))
+
+
+async def compile_statements(database: DatabaseHelper):
+    """
+    Runs the main queries with filters matching nothing, so their SQL
+    is compiled and cached by the engine before the first request
+    """
+    async with database.session_factory() as session:
+        await get_user_by_login(session, WARMUP_LOGIN)
+        await get_invoices(
+            session, WARMUP_OWNER_ID, None, None, None, None, None,
+            None, "exact", None, 0, None)
+        await get_invoice_changes(session, WARMUP_OWNER_ID, 0, 1)
+        await find_existing_products(session, [
+            InvoiceProductAssociationCreate(name=WARMUP_LOGIN, price=0)])
+        await search_products(
+            session, WARMUP_OWNER_ID, WARMUP_LOGIN, "prefix", 1, None)
+        try:
+            await get_pretty_invoice(session, WARMUP_OWNER_ID)
+        except HTTPException:
+            pass
+
+
+def warm_up_serialization():
+    """Builds validators, serializers and JWT signing of the first use"""
+    decode_jwt(encode_jwt(dict(sub=WARMUP_LOGIN)))
+    invoice = InvoiceSchema.model_validate(dummy_invoice)
+    InvoicesSchema(limit=None, invoices=[invoice]).model_dump_json()
+    invoice_to_ticket_format(invoice)
+
+
+async def warm_up(database: DatabaseHelper):
+    """
+    Initializes everything lazily created by the first requests
+    on each shard. Returns duration in seconds
+    """
+    started_at = time.monotonic()
+    for shard in database.shards:
+        await open_pool_connections(shard)
+        await compile_statements(shard)
+
+    warm_up_serialization()
+    duration = time.monotonic() - started_at
+    logger.info(f"Worker is warmed up in {duration:.2f} s")
+
+    return duration
@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, Response, status
+from loguru import logger
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import (
+    IDEMPOTENCY_KEY_PURGE_BATCH_SIZE, IDEMPOTENCY_KEY_TTL_HOURS
+)
+from app.internal.crud.invoice import generate_invoice
+from app.internal.crud.invoice_batching import InvoiceWriteCoalescer
+from app.internal.models import IdempotencyKey
+from app.internal.schemas import InvoiceCreate, UserSchema
+
+# Requests of this worker, which are creating invoice under the key now
+in_flight_requests: dict[tuple[int, str], asyncio.Event] = dict()
+
+
+@logger.catch(reraise=True)
+async def get_stored_response(
+        session: AsyncSession,
+        user_id: int,
+        key: str,
+        request_hash: str
+    ):
+    """
+    Returns response stored under idempotency key of the user
+    or raises exception if the key was used for another request
+    """
+    stmt = (
+        select(IdempotencyKey.request_hash, IdempotencyKey.response)
+        .where(IdempotencyKey.user_id == user_id)
+        .where(IdempotencyKey.key == key)
+    )
+    stored = (await session.execute(stmt)).one_or_none()
+    if stored is None:
+        return None
+
+    if stored.request_hash != request_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=(
+                f"Idempotency key «{key}» was already used "
+                "with another invoice data"))
+
+    # Already serialized response is sent as is, without revalidation
+    return Response(
+        stored.response,
+        status_code=status.HTTP_201_CREATED,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"})
+
+
+@logger.catch(reraise=True)
+async def generate_idempotent_invoice(
+        session: AsyncSession,
+        invoice_in: InvoiceCreate,
+        created_by: UserSchema,
+        key: str,
+        coalescer: InvoiceWriteCoalescer | None = None
+    ):
+    """
+    Generates the invoice only once per idempotency key.
+    Retries get the stored response without any writes,
+    concurrent duplicates wait for the first request to finish
+    """
+    in_flight_key = (created_by.id, key)
+    while (in_flight := in_flight_requests.get(in_flight_key)) is not None:
+        await in_flight.wait()
+
+    in_flight_requests[in_flight_key] = asyncio.Event()
+    request_hash = hashlib.sha256(
+        invoice_in.model_dump_json().encode()).hexdigest()
+    try:
+        stored_response = await get_stored_response(
+            session, created_by.id, key, request_hash)
+        if stored_response is not None:
+            return stored_response
+
+        idempotency_key = IdempotencyKey(
+            user_id=created_by.id, key=key, request_hash=request_hash)
+        if coalescer is not None:
+            return await coalescer.submit(
+                invoice_in, created_by, idempotency_key)
+
+        return await generate_invoice(
+            session, invoice_in, created_by, idempotency_key)
+    except IntegrityError:
+        # The same key was committed meanwhile by another worker process
+        await session.rollback()
+        stored_response = await get_stored_response(
+            session, created_by.id, key, request_hash)
+        if stored_response is None:
+            raise
+
+        return stored_response
+    finally:
+        in_flight_requests.pop(in_flight_key).set()
+
+
+@logger.catch(reraise=True)
+async def purge_expired_idempotency_keys(
+        session: AsyncSession,
+        ttl: timedelta = timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS),
+        batch_size: int = IDEMPOTENCY_KEY_PURGE_BATCH_SIZE
+    ):
+    """
+    Deletes expired idempotency keys in batches,
+    committing each one to keep transactions and locks short
+    """
+    expired_ids = (
+        select(IdempotencyKey.id)
+        .where(IdempotencyKey.created_at < datetime.now() - ttl)
+        .limit(batch_size)
+        .scalar_subquery()
+    )
+    stmt = (
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.id.in_(expired_ids))
+        .execution_options(synchronize_session=False)
+    )
+    purged_count = 0
+    while True:
+        deleted_count = (await session.execute(stmt)).rowcount
+        await session.commit()
+        purged_count += deleted_count
+        if deleted_count < batch_size:
+            break
+
+    logger.info(f"Purged {purged_count} expired idempotency keys")
+    return purged_count
@@ -1,17 +1,50 @@
+import json
 import math
+from datetime import datetime, time
+from functools import cache
 from typing import Literal
 
 from fastapi import HTTPException, status
 from loguru import logger
-from pydantic import NonNegativeFloat, NonNegativeInt
-from sqlalchemy import desc, or_, select
+from pydantic import NonNegativeFloat, NonNegativeInt, PositiveInt
+from sqlalchemy import (
+    ARRAY,
+    bindparam,
+    column,
+    desc,
+    func,
+    insert,
+    select,
+    tuple_
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import contains_eager, joinedload, load_only
+from sqlalchemy.orm.attributes import set_committed_value
 
+from app.config import (
+    EVENTS_BROKER,
+    EVENTS_QUEUE_SIZE,
+    EVENTS_REDIS_URL,
+    INVOICE_PARTITIONING,
+    INVOICE_TICKET_CACHE_SIZE,
+    RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_MAX_SIZE,
+    RESPONSE_CACHE_REDIS_URL,
+    RESPONSE_CACHE_TTL_SECONDS
+)
+from app.internal.crud.product import match_product_name
 from app.internal.models import (
-    Invoice, InvoiceProductAssociation, Payment, Product, User
+    IdempotencyKey,
+    Invoice,
+    InvoiceArchive,
+    InvoiceProductAssociation,
+    Payment,
+    Product,
+    User
 )
 from app.internal.schemas import (
+    IngestedInvoiceSchema,
+    InvoiceChangesSchema,
     InvoiceCreate,
     InvoiceProductAssociationCreate,
     InvoiceProductAssociationSchema,
@@ -20,57 +53,233 @@ from app.internal.schemas import (
     PaymentSchema,
     UserSchema
 )
+from app.utils.compression import PrecompressedBodyCache
+from app.utils.events import MemoryEventBroker, RedisEventBroker
+from app.utils.invoice_archive import unpack_invoices
+from app.utils.money import to_decimal, to_minor_units
 from app.utils.prettify_invoice import invoice_to_ticket_format
+from app.utils.response_cache import (
+    MemoryCacheBackend, RedisCacheBackend, ResponseCache
+)
 from app.utils.work_with_dates import parse_like_date
 
+invoices_cache = ResponseCache(
+    namespace="invoices",
+    backend=(
+        MemoryCacheBackend(RESPONSE_CACHE_MAX_SIZE)
+        if RESPONSE_CACHE_BACKEND == "memory"
+        else RedisCacheBackend.from_url(RESPONSE_CACHE_REDIS_URL)
+        if RESPONSE_CACHE_BACKEND == "redis" else None),
+    ttl=RESPONSE_CACHE_TTL_SECONDS)
+ticket_cache = PrecompressedBodyCache(max_size=INVOICE_TICKET_CACHE_SIZE)
+invoice_events = (
+    RedisEventBroker.from_url(EVENTS_REDIS_URL, EVENTS_QUEUE_SIZE)
+    if EVENTS_BROKER == "redis" else MemoryEventBroker(EVENTS_QUEUE_SIZE))
+
 
 @logger.catch(reraise=True)
-async def generate_invoice_product_association_objects(
-        session: AsyncSession,
-        products_in: list[InvoiceProductAssociationCreate]
+async def announce_new_invoice(
+        owner_id: int, invoice: InvoiceSchema | IngestedInvoiceSchema
     ):
     """
-    Collects invoice-product association objects,
-    using existing products or creating new ones
+    Invalidates cached invoices of the owner and notifies
+    its subscribers. Called once the invoice is committed
     """
-    stmt = select(Product).where(or_(
-        (Product.name == product.name) &
-        (Product.price == product.price)
-        for product in products_in
-    ))
-    existing_products = (await session.scalars(stmt)).all()
-    product_objects = {
+    await invoices_cache.invalidate(owner_id)
+    try:
+        await invoice_events.publish(
+            str(owner_id),
+            invoice.model_dump_json(
+                include={"id", "total", "rest", "created_at"}))
+    except Exception:
+        # Subscribers can catch up by change feed, the invoice is saved
+        logger.exception(f"Event of invoice {invoice.id} isn't published")
+
+
+@cache
+def get_products_lookup_statement(dialect_name: str):
+    """
+    Builds query of products by pairs of name and price, which are
+    passed as a single parameter, so SQL is the same for any number
+    of pairs and it's compiled (and prepared by asyncpg) only once
+    """
+    if dialect_name == "postgresql":
+        keys = func.unnest(
+            bindparam("names", type_=ARRAY(Product.name.type)),
+            bindparam("prices", type_=ARRAY(Product.price.type))
+        ).table_valued("name", "price")
+    elif dialect_name == "sqlite":
+        keys = select(
+            func.json_extract(column("value"), "$[0]").label("name"),
+            func.json_extract(column("value"), "$[1]").label("price")
+        ).select_from(func.json_each(bindparam("keys"))).subquery()
+    else:
+        return select(Product).where(
+            tuple_(Product.name, Product.price)
+            .in_(bindparam("keys", expanding=True)))
+
+    return select(Product).where(
+        tuple_(Product.name, Product.price)
+        .in_(select(keys.c.name, keys.c.price)))
+
+
+@logger.catch(reraise=True)
+def get_products_lookup_parameters(dialect_name: str, keys: list[tuple]):
+    """Passes pairs of name and price the way the lookup expects them"""
+    if dialect_name == "postgresql":
+        names, prices = zip(*keys) if keys else ((), ())
+        return dict(names=list(names), prices=list(prices))
+
+    if dialect_name == "sqlite":
+        return dict(keys=json.dumps(keys))
+
+    return dict(keys=keys)
+
+
+@logger.catch(reraise=True)
+async def find_existing_products(
+        session: AsyncSession,
+        products_in: list[InvoiceProductAssociationCreate]
+    ):
+    """Finds already saved products with the same names and prices"""
+    keys = list(dict.fromkeys(
+        (product.name, product.price) for product in products_in))
+    dialect_name = session.get_bind().dialect.name
+    existing_products = (await session.scalars(
+        get_products_lookup_statement(dialect_name),
+        get_products_lookup_parameters(dialect_name, keys))).all()
+
+    return {
         (product.name, product.price): product
         for product in existing_products
     }
-    invoice_product_association_objects = list()
+
+
+@logger.catch(reraise=True)
+async def insert_new_products(
+        session: AsyncSession,
+        products_in: list[InvoiceProductAssociationCreate],
+        product_objects: dict[tuple, Product]
+    ):
+    """
+    Inserts products, which aren't found among existing ones,
+    with a single statement and adds them to `product_objects`
+    """
+    new_products = dict()
     for product_in in products_in:
-        product_object = product_objects.get(
-            (product_in.name, product_in.price),
-            Product(
+        key = (product_in.name, product_in.price)
+        if key not in product_objects:
+            new_products.setdefault(key, dict(
                 name=product_in.name,
                 price=product_in.price,
-                description=product_in.description)
-        )
-        invoice_product_association_objects.append(
-            InvoiceProductAssociation(
-                product=product_object,
-                quantity=product_in.quantity,
-                unit_price=product_in.price))
+                description=product_in.description))
+
+    if new_products:
+        # Rows are matched by name and price, so their order is not needed.
+        # Null descriptions are rendered to keep all rows in one statement
+        inserted_products = await session.scalars(
+            insert(Product).returning(
+                Product, sort_by_parameter_order=False),
+            list(new_products.values()),
+            execution_options=dict(render_nulls=True))
+        product_objects.update(
+            ((product.name, product.price), product)
+            for product in inserted_products)
+
+    return product_objects
 
-    return invoice_product_association_objects
+
+def invoice_reference(invoice: Invoice):
+    """Values of foreign key to the invoice"""
+    if INVOICE_PARTITIONING:
+        return dict(
+            invoice_id=invoice.id, invoice_created_at=invoice.created_at)
+
+    return dict(invoice_id=invoice.id)
 
 
 @logger.catch(reraise=True)
-async def generate_invoice(
+async def insert_invoices(
         session: AsyncSession,
-        invoice_in: InvoiceCreate,
-        created_by: UserSchema
+        invoices_in: list[InvoiceCreate],
+        created_invoices: list[dict]
     ):
     """
-    Validates invoice data from user,
-    calculates remaining fields and generates the invoice,
-    after that saving it in database
+    Inserts invoices with their payments and items using one
+    `INSERT ... RETURNING` per table, whatever the number of lines,
+    and assembles invoice objects from the returned rows,
+    so nothing is flushed or refreshed afterwards
+    """
+    products_in = [
+        product_in
+        for invoice_in in invoices_in
+        for product_in in invoice_in.products]
+    product_objects = await insert_new_products(
+        session,
+        products_in,
+        await find_existing_products(session, products_in))
+
+    invoices = (await session.scalars(
+        insert(Invoice).returning(Invoice, sort_by_parameter_order=True),
+        [
+            dict(
+                total=created_invoice["total"],
+                rest=created_invoice["rest"],
+                created_by=created_invoice["created_by"].id)
+            for created_invoice in created_invoices
+        ])).all()
+
+    payments = await session.scalars(
+        insert(Payment).returning(Payment, sort_by_parameter_order=False),
+        [
+            invoice_in.payment.model_dump() | invoice_reference(invoice)
+            for invoice_in, invoice in zip(invoices_in, invoices)
+        ])
+    payment_objects = {payment.invoice_id: payment for payment in payments}
+
+    associations = await session.scalars(
+        insert(InvoiceProductAssociation).returning(
+            InvoiceProductAssociation, sort_by_parameter_order=False),
+        [
+            dict(
+                product_id=product_objects[
+                    (product_in.name, product_in.price)].id,
+                quantity=product_in.quantity,
+                unit_price=product_in.price,
+                **invoice_reference(invoice))
+            for invoice_in, invoice in zip(invoices_in, invoices)
+            for product_in in invoice_in.products
+        ])
+    association_objects = {
+        (association.invoice_id, association.product_id): association
+        for association in associations}
+
+    # Related objects are set as loaded, not as changes to be flushed
+    for invoice_in, invoice in zip(invoices_in, invoices):
+        set_committed_value(
+            invoice, "payment", payment_objects[invoice.id])
+        invoice_product_association_objects = list()
+        for product_in in invoice_in.products:
+            product_object = product_objects[
+                (product_in.name, product_in.price)]
+            association = association_objects[
+                (invoice.id, product_object.id)]
+            set_committed_value(association, "product", product_object)
+            invoice_product_association_objects.append(association)
+
+        set_committed_value(
+            invoice, "products", invoice_product_association_objects)
+
+    return invoices
+
+
+@logger.catch(reraise=True)
+def calculate_invoice_totals(
+        invoice_in: InvoiceCreate, created_by: UserSchema
+    ):
+    """
+    Calculates total and rest of the invoice
+    or raises exception if payment amount is not enough
     """
     created_invoice = dict(
         created_by=created_by,
@@ -82,30 +291,48 @@ async def generate_invoice(
         invoice_in.payment.amount - created_invoice["total"]
     )
     if created_invoice["rest"] < 0:
-        await session.close()
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=(
                 "Invalid invoice data. "
-                f"Payment amount ({invoice_in.payment.amount}) canʼt be "
-                f"less than total ({created_invoice['total']})"))
+                "Payment amount "
+                f"({to_decimal(invoice_in.payment.amount)}) canʼt be "
+                f"less than total ({to_decimal(created_invoice['total'])})"))
+
+    return created_invoice
 
-    invoice = Invoice(
-        total=created_invoice["total"],
-        rest=created_invoice["rest"],
-        created_by=created_by.id)
 
-    # Insert payment
-    invoice.payment = Payment(**invoice_in.payment.model_dump())
+@logger.catch(reraise=True)
+async def generate_invoice(
+        session: AsyncSession,
+        invoice_in: InvoiceCreate,
+        created_by: UserSchema,
+        idempotency_key: IdempotencyKey | None = None
+    ):
+    """
+    Validates invoice data from user,
+    calculates remaining fields and generates the invoice,
+    after that saving it in database.
+    Stores the response under idempotency key in the same transaction
+    """
+    created_invoice = calculate_invoice_totals(invoice_in, created_by)
 
-    # Insert product with invoice items
-    invoice.products.extend(
-        await generate_invoice_product_association_objects(
-            session, invoice_in.products))
+    (invoice,) = await insert_invoices(
+        session, [invoice_in], [created_invoice])
+    invoice_schema = invoice_to_schema(invoice, created_invoice)
+    if idempotency_key is not None:
+        idempotency_key.response = invoice_schema.model_dump_json()
+        session.add(idempotency_key)
 
-    session.add(invoice)
     await session.commit()
+    await announce_new_invoice(created_by.id, invoice_schema)
+
+    return invoice_schema
 
+
+@logger.catch(reraise=True)
+def invoice_to_schema(invoice: Invoice, created_invoice: dict):
+    """Builds response model of just inserted invoice"""
     return InvoiceSchema(
         id=invoice.id,
         products=[
@@ -130,36 +357,39 @@ async def generate_invoice(
         **created_invoice)
 
 
+# Built once: only filters are appended to it for each query
+invoices_statement = (
+    select(Invoice)
+    .options(
+        load_only(Invoice.total, Invoice.rest, Invoice.created_at)
+    )
+    .join(Invoice.payment)
+    .options(
+        contains_eager(Invoice.payment)
+        .options(load_only(Payment.type, Payment.amount))
+    )
+    .options(
+        joinedload(Invoice.user_owner)
+        .options(load_only(User.name, User.login, User.password))
+    )
+    .join(Invoice.products)
+    .options(
+        contains_eager(Invoice.products)
+        .load_only(
+            InvoiceProductAssociation.quantity,
+            InvoiceProductAssociation.unit_price,
+            InvoiceProductAssociation.total
+        )
+        .joinedload(InvoiceProductAssociation.product)
+    )
+    .order_by(desc(Invoice.created_at))
+)
+
+
 @logger.catch(reraise=True)
 async def select_invoices(session: AsyncSession, where_clauses: list):
     """Executes query to search for invoices using received filters"""
-    stmt = (
-        select(Invoice)
-        .options(
-            load_only(Invoice.total, Invoice.rest, Invoice.created_at)
-        )
-        .join(Invoice.payment)
-        .options(
-            contains_eager(Invoice.payment)
-            .options(load_only(Payment.type, Payment.amount))
-        )
-        .options(
-            joinedload(Invoice.user_owner)
-            .options(load_only(User.name, User.login))
-        )
-        .join(Invoice.products)
-        .options(
-            contains_eager(Invoice.products)
-            .load_only(
-                InvoiceProductAssociation.quantity,
-                InvoiceProductAssociation.unit_price,
-                InvoiceProductAssociation.total
-            )
-            .joinedload(InvoiceProductAssociation.product)
-        )
-        .where(*where_clauses)
-        .order_by(desc(Invoice.created_at))
-    )
+    stmt = invoices_statement.where(*where_clauses)
     result = (await session.scalars(stmt)).unique().all()
     # Preparing to pydantic InvoiceSchema model
     for row in result:
@@ -173,21 +403,33 @@ async def select_invoices(session: AsyncSession, where_clauses: list):
 
 
 @logger.catch(reraise=True)
-async def get_invoices(
-        session: AsyncSession,
+async def select_archived_invoices(
+        session: AsyncSession, where_clauses: list
+    ):
+    """Unpacks invoices of archived months matching the filters"""
+    archives = await session.scalars(
+        select(InvoiceArchive)
+        .options(joinedload(InvoiceArchive.owner))
+        .where(*where_clauses)
+    )
+
+    return [
+        invoice
+        for archive in archives
+        for invoice in unpack_invoices(
+            archive.data, UserSchema.model_validate(archive.owner))]
+
+
+@logger.catch(reraise=True)
+def build_invoice_filters(
         owner_id: int,
         from_created_at: str | None,
         to_created_at: str | None,
         max_total: NonNegativeFloat | None,
         min_total: NonNegativeFloat | None,
-        payment_type: Literal["cash", "cashless"] | None,
-        page: NonNegativeInt,
-        limit: NonNegativeInt | None
+        payment_type: Literal["cash", "cashless"] | None
     ):
-    """
-    Converts filters from user into where clauses, sends them to query.
-    Generates pagination data and append it to response
-    """
+    """Converts filters from user into where clauses for invoices query"""
     where_clauses = [Invoice.created_by == owner_id]
     if from_created_at is not None:
         where_clauses.append(
@@ -198,19 +440,163 @@ async def get_invoices(
             Invoice.created_at <= parse_like_date(to_created_at))
 
     if max_total is not None:
-        where_clauses.append(Invoice.total <= max_total)
+        where_clauses.append(Invoice.total <= to_minor_units(max_total))
 
     if min_total is not None:
-        where_clauses.append(Invoice.total >= min_total)
+        where_clauses.append(Invoice.total >= to_minor_units(min_total))
 
     if payment_type is not None:
         where_clauses.append(Payment.type == payment_type)
 
+    return where_clauses
+
+
+def build_product_filter(
+        dialect_name: str,
+        product: str | None,
+        product_match: Literal["exact", "prefix"],
+        product_id: PositiveInt | None
+    ):
+    """
+    Builds EXISTS semi-join of invoices with their lines of the product.
+    Products are sought by name index, their lines by index of product
+    and invoice, so invoices are narrowed before they are loaded
+    """
+    product_ids = select(Product.id)
+    if product_id is not None:
+        product_ids = product_ids.where(Product.id == product_id)
+
+    if product is not None:
+        product_ids = product_ids.where(
+            Product.name == product if product_match == "exact"
+            else match_product_name(dialect_name, product, "prefix"))
+
+    return Invoice.products.any(
+        InvoiceProductAssociation.product_id.in_(product_ids))
+
+
+@logger.catch(reraise=True)
+async def get_archived_invoices(
+        session: AsyncSession,
+        owner_id: int,
+        from_created_at: str | None,
+        to_created_at: str | None,
+        max_total: NonNegativeFloat | None,
+        min_total: NonNegativeFloat | None,
+        payment_type: Literal["cash", "cashless"] | None,
+        product: str | None = None,
+        product_match: Literal["exact", "prefix"] = "exact",
+        product_id: PositiveInt | None = None
+    ):
+    """
+    Applies the same filters as `build_invoice_filters` and
+    `build_product_filter` to archived invoices of the user.
+    Only archives of matching months are unpacked
+    """
+    where_clauses = [InvoiceArchive.owner_id == owner_id]
+    from_datetime = to_datetime = None
+    if from_created_at is not None:
+        from_date = parse_like_date(from_created_at)
+        from_datetime = datetime.combine(from_date, time())
+        where_clauses.append(InvoiceArchive.month >= from_date.replace(day=1))
+
+    if to_created_at is not None:
+        to_date = parse_like_date(to_created_at)
+        to_datetime = datetime.combine(to_date, time())
+        where_clauses.append(InvoiceArchive.month <= to_date)
+
+    max_total = to_minor_units(max_total) if max_total is not None else None
+    min_total = to_minor_units(min_total) if min_total is not None else None
+
+    product_key = None
+    if product_id is not None:
+        # Archived lines keep name and price of the product, but not its id
+        product_key = (await session.execute(
+            select(Product.name, Product.price)
+            .where(Product.id == product_id))).one_or_none()
+        if product_key is None:
+            return []
+
+    def is_product_line(line: InvoiceProductAssociationSchema):
+        if product_key is not None and (
+                (line.name, line.price) != tuple(product_key)):
+            return False
+
+        if product is None:
+            return True
+
+        if product_match == "exact":
+            return line.name == product
+
+        return line.name.lower().startswith(product.lower())
+
+    return [
+        invoice
+        for invoice in await select_archived_invoices(session, where_clauses)
+        if (from_datetime is None or invoice.created_at >= from_datetime)
+        and (to_datetime is None or invoice.created_at <= to_datetime)
+        and (max_total is None or invoice.total <= max_total)
+        and (min_total is None or invoice.total >= min_total)
+        and (payment_type is None or invoice.payment.type == payment_type)
+        and (
+            product is None and product_id is None
+            or any(map(is_product_line, invoice.products)))]
+
+
+@logger.catch(reraise=True)
+async def get_invoices(
+        session: AsyncSession,
+        owner_id: int,
+        from_created_at: str | None,
+        to_created_at: str | None,
+        max_total: NonNegativeFloat | None,
+        min_total: NonNegativeFloat | None,
+        payment_type: Literal["cash", "cashless"] | None,
+        product: str | None,
+        product_match: Literal["exact", "prefix"],
+        product_id: PositiveInt | None,
+        page: NonNegativeInt,
+        limit: NonNegativeInt | None
+    ):
+    """
+    Converts filters from user into where clauses, sends them to query.
+    Archived invoices are merged with the rest by creation time.
+    Generates pagination data and append it to response
+    """
+    where_clauses = build_invoice_filters(
+        owner_id,
+        from_created_at,
+        to_created_at,
+        max_total,
+        min_total,
+        payment_type)
+    if product is not None or product_id is not None:
+        where_clauses.append(build_product_filter(
+            session.get_bind().dialect.name,
+            product,
+            product_match,
+            product_id))
+
+    invoices = await select_invoices(session, where_clauses)
+    archived_invoices = await get_archived_invoices(
+        session,
+        owner_id,
+        from_created_at,
+        to_created_at,
+        max_total,
+        min_total,
+        payment_type,
+        product,
+        product_match,
+        product_id)
+    if archived_invoices:
+        invoices = sorted(
+            [*invoices, *archived_invoices],
+            key=lambda invoice: invoice.created_at,
+            reverse=True)
+
     response = InvoicesSchema.model_validate(
-        dict(
-            limit=limit,
-            invoices=await select_invoices(session, where_clauses)
-        ),
+        dict(limit=limit, invoices=invoices),
         from_attributes=True
     )
     if limit:
@@ -224,15 +610,140 @@ async def get_invoices(
     return response
 
 
+@logger.catch(reraise=True)
+async def get_invoice_changes(
+        session: AsyncSession,
+        owner_id: int,
+        after: NonNegativeInt,
+        limit: NonNegativeInt
+    ):
+    """
+    Returns invoices of the user committed after the cursor (change
+    number) in order of commits, so invoices committed later with lower
+    ids (or moved from another shard) aren't skipped. Numbers of the
+    batch are sought in the index of owner and number, only their
+    invoices are joined with the rest of invoice data
+    """
+    changes = (await session.execute(
+        select(Invoice.id, Invoice.change_seq)
+        .where(Invoice.created_by == owner_id)
+        .where(Invoice.change_seq > after)
+        .order_by(Invoice.change_seq)
+        .limit(limit)
+    )).all()
+    change_seqs = dict(changes)
+    invoices = (
+        await select_invoices(session, [Invoice.id.in_(change_seqs)])
+        if changes else [])
+
+    return InvoiceChangesSchema.model_validate(
+        dict(
+            invoices=sorted(
+                invoices, key=lambda invoice: change_seqs[invoice.id]),
+            next_cursor=changes[-1].change_seq if changes else after,
+            has_more=len(changes) == limit
+        ),
+        from_attributes=True
+    )
+
+
+@logger.catch(reraise=True)
+async def get_cached_invoices(
+        session: AsyncSession,
+        owner_id: int,
+        from_created_at: str | None,
+        to_created_at: str | None,
+        max_total: NonNegativeFloat | None,
+        min_total: NonNegativeFloat | None,
+        payment_type: Literal["cash", "cashless"] | None,
+        product: str | None,
+        product_match: Literal["exact", "prefix"],
+        product_id: PositiveInt | None,
+        page: NonNegativeInt,
+        limit: NonNegativeInt | None
+    ):
+    """
+    Returns serialized invoices of the user from response cache,
+    building and storing them on a miss
+    """
+    params = dict(
+        from_created_at=(
+            parse_like_date(from_created_at)
+            if from_created_at is not None else None),
+        to_created_at=(
+            parse_like_date(to_created_at)
+            if to_created_at is not None else None),
+        max_total=(
+            to_minor_units(max_total) if max_total is not None else None),
+        min_total=(
+            to_minor_units(min_total) if min_total is not None else None),
+        payment_type=payment_type,
+        product=product,
+        product_match=product_match if product is not None else None,
+        product_id=product_id,
+        page=page if limit else None,
+        limit=limit or None)
+    body, key = await invoices_cache.get(owner_id, params)
+    if body is None:
+        invoices = await get_invoices(
+            session,
+            owner_id,
+            from_created_at,
+            to_created_at,
+            max_total,
+            min_total,
+            payment_type,
+            product,
+            product_match,
+            product_id,
+            page,
+            limit)
+        body = invoices.model_dump_json().encode()
+        await invoices_cache.set(key, body)
+
+    return body
+
+
+async def iter_invoices(
+        session: AsyncSession, where_clauses: list, chunk_size: int = 500
+    ):
+    """
+    Yields invoices matching the filters in chunks of `chunk_size`,
+    so that only one chunk of ORM rows is held in memory at a time
+    """
+    stmt = (
+        select(Invoice.id)
+        .join(Invoice.payment)
+        .where(*where_clauses)
+        .order_by(desc(Invoice.created_at))
+    )
+    invoice_ids = (await session.scalars(stmt)).all()
+    for offset in range(0, len(invoice_ids), chunk_size):
+        chunk_ids = invoice_ids[offset:offset + chunk_size]
+        yield [
+            InvoiceSchema.model_validate(row, from_attributes=True)
+            for row in await select_invoices(
+                session, [Invoice.id.in_(chunk_ids)])
+        ]
+        session.expunge_all()
+
+
 @logger.catch(reraise=True)
 async def get_pretty_invoice(session: AsyncSession, invoice_id: int):
     """
-    Finds for invoice by specified ID
+    Finds for invoice by specified ID (in archive as well)
     and returns it in `plain/text` format
     """
     invoices = await select_invoices(session, [Invoice.id == invoice_id])
     if not invoices:
-        await session.close()
+        invoices = [
+            invoice
+            for invoice in await select_archived_invoices(session, [
+                InvoiceArchive.min_invoice_id <= invoice_id,
+                InvoiceArchive.max_invoice_id >= invoice_id])
+            if invoice.id == invoice_id]
+
+    if not invoices:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Invoice with ID = {invoice_id} not found")
@@ -0,0 +1,132 @@
+from datetime import date, timedelta
+
+from loguru import logger
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import INVOICE_ARCHIVE_AFTER_DAYS, INVOICE_EXPORT_CHUNK_SIZE
+from app.internal.crud.invoice import invoices_cache, iter_invoices
+from app.internal.crud.partitions import add_months
+from app.internal.models import (
+    Invoice, InvoiceArchive, InvoiceProductAssociation, Payment
+)
+from app.utils.invoice_archive import pack_invoices, unpack_invoices
+
+
+@logger.catch(reraise=True)
+def get_archive_cutoff(after_days: int, today: date | None = None):
+    """
+    Returns the first day of the month, which contains the day
+    `after_days` ago. All months before it are old enough to archive
+    """
+    return ((today or date.today()) - timedelta(days=after_days)).replace(
+        day=1)
+
+
+@logger.catch(reraise=True)
+async def delete_archived_invoices(
+        session: AsyncSession, invoice_ids: list[int]
+    ):
+    """Deletes invoices with their items and payments, returns count"""
+    deleted = 0
+    for offset in range(0, len(invoice_ids), INVOICE_EXPORT_CHUNK_SIZE):
+        chunk_ids = invoice_ids[offset:offset + INVOICE_EXPORT_CHUNK_SIZE]
+        for model in (InvoiceProductAssociation, Payment):
+            await session.execute(
+                delete(model)
+                .where(model.invoice_id.in_(chunk_ids))
+                .execution_options(synchronize_session=False))
+
+        result = await session.execute(
+            delete(Invoice)
+            .where(Invoice.id.in_(chunk_ids))
+            .execution_options(synchronize_session=False))
+        deleted += result.rowcount
+
+    return deleted
+
+
+@logger.catch(reraise=True)
+async def archive_user_month(
+        session: AsyncSession, owner_id: int, month: date
+    ):
+    """
+    Packs invoices of the user's month into its archive (merging them
+    with already archived ones) and deletes them from invoice tables
+    in the same transaction. Nothing is changed if some of them are
+    gone meanwhile, e.g. archived by another worker.
+    Returns count of archived invoices
+    """
+    invoices = [
+        invoice
+        async for chunk in iter_invoices(
+            session,
+            [
+                Invoice.created_by == owner_id,
+                Invoice.created_at >= month,
+                Invoice.created_at < add_months(month, 1)],
+            INVOICE_EXPORT_CHUNK_SIZE)
+        for invoice in chunk]
+    if not invoices:
+        return 0
+
+    invoice_ids = [invoice.id for invoice in invoices]
+    archive = await session.scalar(
+        select(InvoiceArchive)
+        .where(InvoiceArchive.owner_id == owner_id)
+        .where(InvoiceArchive.month == month))
+    if archive is None:
+        archive = InvoiceArchive(owner_id=owner_id, month=month)
+        session.add(archive)
+    else:
+        invoices.extend(
+            unpack_invoices(archive.data, invoices[0].created_by))
+
+    invoices.sort(key=lambda invoice: invoice.created_at, reverse=True)
+    archive.data = pack_invoices(invoices)
+    archive.invoices_count = len(invoices)
+    archive.min_invoice_id = min(invoice.id for invoice in invoices)
+    archive.max_invoice_id = max(invoice.id for invoice in invoices)
+    try:
+        if await delete_archived_invoices(session, invoice_ids) != len(
+                invoice_ids):
+            await session.rollback()
+            return 0
+
+        await session.commit()
+    except IntegrityError:
+        # Archive of the month is just created by another worker
+        await session.rollback()
+        return 0
+
+    await invoices_cache.invalidate(owner_id)
+
+    return len(invoice_ids)
+
+
+@logger.catch(reraise=True)
+async def archive_old_invoices(
+        session: AsyncSession, after_days: int = INVOICE_ARCHIVE_AFTER_DAYS
+    ):
+    """
+    Moves invoices of months older than `after_days` into archive,
+    a transaction per user and month. Returns count of archived invoices
+    """
+    cutoff = get_archive_cutoff(after_days)
+    owners = (await session.execute(
+        select(Invoice.created_by, func.min(Invoice.created_at))
+        .where(Invoice.created_at < cutoff)
+        .group_by(Invoice.created_by)
+    )).all()
+    archived = 0
+    for owner_id, first_created_at in owners:
+        month = first_created_at.date().replace(day=1)
+        while month < cutoff:
+            archived += await archive_user_month(session, owner_id, month)
+            month = add_months(month, 1)
+
+    if archived:
+        logger.info(f"Archived invoices: {archived}")
+
+    return archived
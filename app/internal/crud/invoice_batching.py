@@ -0,0 +1,147 @@
+import asyncio
+from dataclasses import dataclass, field
+from functools import cache
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import INVOICE_BATCHING_MAX_SIZE, INVOICE_BATCHING_WINDOW_MS
+from app.internal.crud.invoice import (
+    announce_new_invoice,
+    calculate_invoice_totals,
+    insert_invoices,
+    invoice_to_schema
+)
+from app.internal.models import IdempotencyKey
+from app.internal.schemas import InvoiceCreate, InvoiceSchema, UserSchema
+
+
+@dataclass
+class PendingInvoice:
+    invoice_in: InvoiceCreate
+    created_invoice: dict
+    idempotency_key: IdempotencyKey | None
+    result: asyncio.Future[InvoiceSchema] = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future())
+
+
+@logger.catch(reraise=True)
+async def generate_invoices_batch(
+        session: AsyncSession, pending_invoices: list[PendingInvoice]
+    ):
+    """
+    Saves several invoices in one transaction, resolving and inserting
+    products and items of all of them with a single query per table
+    """
+    invoices = await insert_invoices(
+        session,
+        [pending_invoice.invoice_in for pending_invoice in pending_invoices],
+        [
+            pending_invoice.created_invoice
+            for pending_invoice in pending_invoices
+        ])
+    invoice_schemas = list()
+    for invoice, pending_invoice in zip(invoices, pending_invoices):
+        invoice_schema = invoice_to_schema(
+            invoice, pending_invoice.created_invoice)
+        if pending_invoice.idempotency_key is not None:
+            pending_invoice.idempotency_key.response = (
+                invoice_schema.model_dump_json())
+            session.add(pending_invoice.idempotency_key)
+
+        invoice_schemas.append(invoice_schema)
+
+    await session.commit()
+    for invoice_schema in invoice_schemas:
+        await announce_new_invoice(
+            invoice_schema.created_by.id, invoice_schema)
+
+    return invoice_schemas
+
+
+class InvoiceWriteCoalescer:
+    """
+    Gathers invoices created concurrently on this worker during
+    `window` seconds (or until `max_size` of them is pending)
+    and commits them together in one transaction
+    """
+
+    def __init__(
+            self,
+            session_factory: async_sessionmaker[AsyncSession],
+            window: float,
+            max_size: int
+        ):
+        self.session_factory = session_factory
+        self.window = window
+        self.max_size = max_size
+        self.__pending_invoices: list[PendingInvoice] = list()
+        self.__flush_timer: asyncio.TimerHandle | None = None
+        self.__flush_tasks: set[asyncio.Task] = set()
+
+    async def submit(
+            self,
+            invoice_in: InvoiceCreate,
+            created_by: UserSchema,
+            idempotency_key: IdempotencyKey | None = None
+        ):
+        """
+        Enqueues the invoice into the next batch and waits for its result.
+        Invalid invoices are rejected at once, without joining a batch
+        """
+        pending_invoice = PendingInvoice(
+            invoice_in,
+            calculate_invoice_totals(invoice_in, created_by),
+            idempotency_key)
+        self.__pending_invoices.append(pending_invoice)
+        if len(self.__pending_invoices) >= self.max_size:
+            self.__start_flush()
+        elif self.__flush_timer is None:
+            self.__flush_timer = asyncio.get_running_loop().call_later(
+                self.window, self.__start_flush)
+
+        # Cancelled request must not cancel the result for the batch
+        return await asyncio.shield(pending_invoice.result)
+
+    def __start_flush(self):
+        if self.__flush_timer is not None:
+            self.__flush_timer.cancel()
+            self.__flush_timer = None
+
+        pending_invoices = self.__pending_invoices
+        self.__pending_invoices = list()
+        if pending_invoices:
+            flush_task = asyncio.create_task(self.__flush(pending_invoices))
+            self.__flush_tasks.add(flush_task)
+            flush_task.add_done_callback(self.__flush_tasks.discard)
+
+    async def __flush(self, pending_invoices: list[PendingInvoice]):
+        try:
+            async with self.session_factory() as session:
+                invoice_schemas = await generate_invoices_batch(
+                    session, pending_invoices)
+        except Exception as exc:
+            if len(pending_invoices) == 1:
+                pending_invoices[0].result.set_exception(exc)
+                return
+
+            logger.warning(
+                f"Batch of {len(pending_invoices)} invoices failed ({exc!r}), "
+                "saving them one by one")
+            for pending_invoice in pending_invoices:
+                await self.__flush([pending_invoice])
+        else:
+            for pending_invoice, invoice_schema in zip(
+                    pending_invoices, invoice_schemas):
+                pending_invoice.result.set_result(invoice_schema)
+
+
+@cache
+def get_invoice_write_coalescer(
+        session_factory: async_sessionmaker[AsyncSession]
+    ):
+    """Returns the coalescer of this worker for the session factory"""
+    return InvoiceWriteCoalescer(
+        session_factory,
+        window=INVOICE_BATCHING_WINDOW_MS / 1000,
+        max_size=INVOICE_BATCHING_MAX_SIZE)
@@ -0,0 +1,274 @@
+import time
+from typing import BinaryIO
+
+from loguru import logger
+from pydantic import ValidationError
+from sqlalchemy import Table, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import INVOICE_PARTITIONING
+from app.internal.crud.invoice import invoice_reference, invoices_cache
+from app.internal.crud.invoice_ingestion import resolve_product_ids
+from app.internal.crud.partitions import create_invoice_partitions
+from app.internal.models import (
+    Invoice, InvoiceImport, InvoiceProductAssociation, Payment
+)
+from app.internal.models.invoice_change import mark_invoice_changes
+from app.internal.schemas import ImportedInvoiceCreate
+from app.utils.invoice_import import ProductIdsCache, iter_invoice_batches
+from app.utils.money import to_decimal
+
+
+@logger.catch(reraise=True)
+async def reserve_invoice_ids(session: AsyncSession, count: int):
+    """
+    Takes `count` ids from the sequence of invoice ids, so invoices
+    are loaded with their ids and rows referring to them at once
+    """
+    if session.get_bind().dialect.name == "postgresql":
+        return list(await session.scalars(
+            text(
+                "SELECT nextval(pg_get_serial_sequence('invoice', 'id')) "
+                "FROM generate_series(1, :count)"),
+            dict(count=count)))
+
+    await session.execute(text(
+        "INSERT INTO sqlite_sequence (name, seq) "
+        "SELECT 'invoice', COALESCE(MAX(id), 0) FROM invoice "
+        "WHERE NOT EXISTS "
+        "(SELECT 1 FROM sqlite_sequence WHERE name = 'invoice')"))
+    await session.execute(
+        text(
+            "UPDATE sqlite_sequence SET seq = seq + :count "
+            "WHERE name = 'invoice'"),
+        dict(count=count))
+    last_id = await session.scalar(text(
+        "SELECT seq FROM sqlite_sequence WHERE name = 'invoice'"))
+
+    return list(range(last_id - count + 1, last_id + 1))
+
+
+@logger.catch(reraise=True)
+async def load_rows(session: AsyncSession, table: Table, rows: list[dict]):
+    """
+    Bulk loads rows with the same columns: by `COPY` on PostgreSQL
+    (asyncpg) and by `executemany` of a single insert otherwise
+    """
+    if not rows:
+        return
+
+    connection = await session.connection()
+    if connection.dialect.driver == "asyncpg":
+        if table is Invoice.__table__:
+            # Rows copied by the driver aren't seen by session events
+            mark_invoice_changes(session.sync_session)
+
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            table.name,
+            columns=list(rows[0]),
+            records=[tuple(row.values()) for row in rows])
+    else:
+        await session.execute(insert(table), rows)
+
+
+@logger.catch(reraise=True)
+def validate_imported_invoices(batch: list[tuple]):
+    """
+    Validates invoices of the batch and calculates their totals
+    like `calculate_invoice_totals`, but without logging every
+    rejected one. Returns valid invoices with totals and reasons
+    of rejected ones by their first lines
+    """
+    invoices, rejected = list(), list()
+    for first_line, _, _, data in batch:
+        if data is None:
+            rejected.append((first_line, "Line is not a valid JSON"))
+            continue
+
+        try:
+            invoice_in = ImportedInvoiceCreate.model_validate(data)
+        except ValidationError as exc:
+            error = exc.errors()[0]
+            location = ".".join(map(str, error["loc"]))
+            rejected.append((first_line, f"{location}: {error['msg']}"))
+            continue
+
+        if not invoice_in.products:
+            rejected.append((first_line, "Invoice has no lines"))
+            continue
+
+        total = sum(
+            product_in.price * product_in.quantity
+            for product_in in invoice_in.products)
+        if invoice_in.payment.amount < total:
+            rejected.append((
+                first_line,
+                f"Payment amount ({to_decimal(invoice_in.payment.amount)}) "
+                f"canʼt be less than total ({to_decimal(total)})"))
+            continue
+
+        created_at = invoice_in.created_at
+        if created_at.tzinfo is not None:
+            # Creation time is stored in local time without zone
+            invoice_in.created_at = created_at.astimezone().replace(
+                tzinfo=None)
+
+        invoices.append((invoice_in, total))
+
+    return invoices, rejected
+
+
+@logger.catch(reraise=True)
+async def get_imported_product_ids(
+        session: AsyncSession,
+        invoices_in: list[ImportedInvoiceCreate],
+        products_cache: ProductIdsCache
+    ):
+    """
+    Returns ids of products of the invoices by name and price.
+    Only the ones missing in the cache are looked up or inserted
+    """
+    product_ids, missing_products = dict(), dict()
+    for invoice_in in invoices_in:
+        for product_in in invoice_in.products:
+            key = (product_in.name, product_in.price)
+            if key in product_ids or key in missing_products:
+                continue
+
+            product_id = products_cache.get(key)
+            if product_id is None:
+                missing_products[key] = [0, product_in.description]
+            else:
+                product_ids[key] = product_id
+
+    if missing_products:
+        resolved_ids = await resolve_product_ids(session, missing_products)
+        products_cache.update(resolved_ids)
+        product_ids.update(resolved_ids)
+
+    return product_ids
+
+
+@logger.catch(reraise=True)
+async def load_imported_invoices(
+        session: AsyncSession,
+        invoices: list[tuple[ImportedInvoiceCreate, int]],
+        owner_id: int,
+        products_cache: ProductIdsCache
+    ):
+    """
+    Loads valid invoices of the batch with their payments and lines,
+    keeping their creation time. Lines of the same product are merged
+    """
+    if not invoices:
+        return
+
+    invoices_in = [invoice_in for invoice_in, _ in invoices]
+    product_ids = await get_imported_product_ids(
+        session, invoices_in, products_cache)
+    invoice_ids = await reserve_invoice_ids(session, len(invoices))
+
+    invoice_rows, payment_rows, line_rows = list(), list(), dict()
+    for invoice_id, (invoice_in, total) in zip(invoice_ids, invoices):
+        invoice = Invoice(id=invoice_id, created_at=invoice_in.created_at)
+        invoice_rows.append(dict(
+            id=invoice_id,
+            total=total,
+            rest=invoice_in.payment.amount - total,
+            created_at=invoice_in.created_at,
+            created_by=owner_id))
+        payment_rows.append(
+            invoice_in.payment.model_dump() | invoice_reference(invoice))
+        for product_in in invoice_in.products:
+            product_id = product_ids[(product_in.name, product_in.price)]
+            line = line_rows.setdefault((invoice_id, product_id), dict(
+                product_id=product_id,
+                quantity=0,
+                unit_price=product_in.price,
+                **invoice_reference(invoice)))
+            line["quantity"] += product_in.quantity
+
+    await load_rows(session, Invoice.__table__, invoice_rows)
+    await load_rows(session, Payment.__table__, payment_rows)
+    await load_rows(
+        session,
+        InvoiceProductAssociation.__table__,
+        list(line_rows.values()))
+
+
+@logger.catch(reraise=True)
+async def get_invoice_import(
+        session: AsyncSession, owner_id: int, source: str, restart: bool
+    ):
+    """Finds progress of the file import or starts it from the beginning"""
+    invoice_import = await session.scalar(
+        select(InvoiceImport)
+        .where(InvoiceImport.owner_id == owner_id)
+        .where(InvoiceImport.source == source))
+    if invoice_import is None:
+        invoice_import = InvoiceImport(owner_id=owner_id, source=source)
+        session.add(invoice_import)
+
+    if invoice_import.id is None or restart:
+        invoice_import.position = invoice_import.lines = 0
+        invoice_import.invoices_count = invoice_import.rejected_count = 0
+
+    return invoice_import
+
+
+async def import_invoices(
+        session: AsyncSession,
+        owner_id: int,
+        file: BinaryIO,
+        source: str,
+        is_csv: bool,
+        batch_size: int,
+        products_cache_size: int,
+        restart: bool = False
+    ):
+    """
+    Imports historical invoices of the user from CSV or NDJSON file.
+    Each batch is loaded and committed with the progress, so an
+    interrupted import is resumed from the batch after the last one.
+    Yields the progress, rejected invoices by their lines and
+    invoices loaded per second after each batch
+    """
+    invoice_import = await get_invoice_import(
+        session, owner_id, source, restart)
+    await session.commit()
+
+    started_at = time.monotonic()
+    loaded_count = 0
+    products_cache = ProductIdsCache(products_cache_size)
+    partitions_since = None
+    for batch in iter_invoice_batches(
+            file,
+            is_csv,
+            batch_size,
+            invoice_import.position,
+            invoice_import.lines):
+        invoices, rejected = validate_imported_invoices(batch)
+        if INVOICE_PARTITIONING and invoices:
+            # Historical months get their partitions before rows
+            since = min(
+                invoice_in.created_at for invoice_in, _ in invoices).date()
+            if partitions_since is None or since < partitions_since:
+                await create_invoice_partitions(session, since=since)
+                partitions_since = since.replace(day=1)
+
+        await load_imported_invoices(
+            session, invoices, owner_id, products_cache)
+
+        _, last_line, position, _ = batch[-1]
+        invoice_import.position = position
+        invoice_import.lines = last_line
+        invoice_import.invoices_count += len(invoices)
+        invoice_import.rejected_count += len(rejected)
+        await session.commit()
+        await invoices_cache.invalidate(owner_id)
+
+        loaded_count += len(invoices)
+        rate = loaded_count / max(time.monotonic() - started_at, 1e-6)
+
+        yield invoice_import, rejected, rate
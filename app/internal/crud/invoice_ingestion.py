@@ -0,0 +1,188 @@
+from collections.abc import AsyncIterable
+from functools import cache
+
+from fastapi import HTTPException, status
+from loguru import logger
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.internal.crud.invoice import (
+    announce_new_invoice,
+    get_products_lookup_parameters,
+    get_products_lookup_statement,
+    invoice_reference
+)
+from app.internal.models import (
+    Invoice, InvoiceProductAssociation, Payment, Product
+)
+from app.internal.models.partitioning import partition_key
+from app.internal.schemas import (
+    IngestedInvoiceSchema,
+    InvoiceProductAssociationCreate,
+    PaymentCreate,
+    UserSchema
+)
+from app.utils.money import to_decimal
+from app.utils.ndjson import iter_ndjson_batches
+
+
+@logger.catch(reraise=True)
+def validate_lines(batch: list[tuple[int, dict]]):
+    """
+    Validates lines of the batch and merges the ones with the same
+    name and price, returns quantities and descriptions by them
+    """
+    lines: dict[tuple, list] = dict()
+    for line_number, data in batch:
+        try:
+            line = InvoiceProductAssociationCreate.model_validate(data)
+        except ValidationError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Line {line_number}: {exc.errors()[0]['msg']}")
+
+        key = (line.name, line.price)
+        if key in lines:
+            lines[key][0] += line.quantity
+        else:
+            lines[key] = [line.quantity, line.description]
+
+    return lines
+
+
+@cache
+def get_product_ids_lookup_statement(dialect_name: str):
+    """The same lookup by names and prices, which loads only ids"""
+    return get_products_lookup_statement(dialect_name).with_only_columns(
+        Product.id, Product.name, Product.price)
+
+
+@logger.catch(reraise=True)
+async def resolve_product_ids(session: AsyncSession, lines: dict):
+    """
+    Finds or inserts products of the lines, returns their ids
+    by name and price. Rows are loaded without ORM objects,
+    so nothing is kept in the session between batches
+    """
+    dialect_name = session.get_bind().dialect.name
+    rows = await session.execute(
+        get_product_ids_lookup_statement(dialect_name),
+        get_products_lookup_parameters(dialect_name, list(lines)))
+    product_ids = {(row.name, row.price): row.id for row in rows}
+    new_products = [
+        dict(name=name, price=price, description=description)
+        for (name, price), (_, description) in lines.items()
+        if (name, price) not in product_ids]
+    if new_products:
+        inserted_rows = await session.execute(
+            insert(Product).returning(Product.id, Product.name, Product.price),
+            new_products,
+            execution_options=dict(render_nulls=True))
+        product_ids.update(
+            ((row.name, row.price), row.id) for row in inserted_rows)
+
+    return product_ids
+
+
+@cache
+def get_lines_upsert_statement(dialect_name: str):
+    """
+    Inserts lines of invoice, adding quantity to the existing line
+    of the same product, as it's unique within invoice
+    """
+    dialect_insert = (
+        postgresql.insert if dialect_name == "postgresql" else sqlite.insert)
+    stmt = dialect_insert(InvoiceProductAssociation)
+
+    return stmt.on_conflict_do_update(
+        index_elements=(
+            "invoice_id",
+            "product_id",
+            *partition_key("invoice_created_at")),
+        set_=dict(
+            quantity=InvoiceProductAssociation.quantity +
+            stmt.excluded.quantity))
+
+
+@logger.catch(reraise=True)
+async def ingest_invoice(
+        session: AsyncSession,
+        payment_in: PaymentCreate,
+        lines: AsyncIterable[bytes],
+        created_by: UserSchema,
+        batch_size: int
+    ):
+    """
+    Generates a large invoice from lines streamed as NDJSON.
+    Lines are validated, their products are resolved and inserted
+    batch by batch, so memory doesn't grow with the number of lines.
+    Everything is committed at once after the last line
+    """
+    try:
+        invoice = (await session.execute(
+            insert(Invoice)
+            .values(total=0, rest=0, created_by=created_by.id)
+            .returning(Invoice.id, Invoice.created_at)
+        )).one()
+        upsert_statement = get_lines_upsert_statement(
+            session.get_bind().dialect.name)
+        total = lines_count = 0
+        async for batch in iter_ndjson_batches(lines, batch_size):
+            batch_lines = validate_lines(batch)
+            product_ids = await resolve_product_ids(session, batch_lines)
+            await session.execute(
+                upsert_statement,
+                [
+                    dict(
+                        product_id=product_ids[key],
+                        quantity=quantity,
+                        unit_price=key[1],
+                        **invoice_reference(invoice))
+                    for key, (quantity, _) in batch_lines.items()
+                ])
+            total += sum(
+                price * quantity
+                for (_, price), (quantity, _) in batch_lines.items())
+            lines_count += len(batch)
+
+        if not lines_count:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Invalid invoice data. Invoice has no lines")
+
+        if payment_in.amount < total:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=(
+                    "Invalid invoice data. "
+                    "Payment amount "
+                    f"({to_decimal(payment_in.amount)}) canʼt be "
+                    f"less than total ({to_decimal(total)})"))
+    except HTTPException:
+        await session.rollback()
+        raise
+
+    await session.execute(
+        update(Invoice)
+        .where(Invoice.id == invoice.id)
+        .values(total=total, rest=payment_in.amount - total))
+    await session.execute(
+        insert(Payment),
+        [payment_in.model_dump() | invoice_reference(invoice)])
+    products_count = await session.scalar(
+        select(func.count())
+        .select_from(InvoiceProductAssociation)
+        .where(InvoiceProductAssociation.invoice_id == invoice.id))
+    await session.commit()
+    ingested_invoice = IngestedInvoiceSchema(
+        id=invoice.id,
+        lines=lines_count,
+        products=products_count,
+        total=total,
+        rest=payment_in.amount - total,
+        created_at=invoice.created_at)
+    await announce_new_invoice(created_by.id, ingested_invoice)
+
+    return ingested_invoice
@@ -0,0 +1,105 @@
+import asyncio
+import csv
+from datetime import timedelta
+from pathlib import Path
+
+from loguru import logger
+from sqlalchemy import Row, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import (
+    BACKGROUND_JOBS_CONCURRENCY,
+    BACKGROUND_JOBS_DIR,
+    BACKGROUND_JOBS_STORE,
+    BACKGROUND_JOBS_TTL_HOURS,
+    INVOICE_EXPORT_CHUNK_SIZE,
+    SERVER_WORKERS
+)
+from app.internal.crud.invoice import build_invoice_filters, iter_invoices
+from app.internal.models import Invoice, Payment
+from app.utils.background_jobs import (
+    BackgroundJobRunner, Job, MemoryJobStore, SQLiteJobStore
+)
+from app.utils.money import to_decimal
+
+
+def create_job_store(workers: int):
+    """
+    Unless the store is configured, jobs are kept in memory only by
+    a single worker, several ones share them through SQLite file
+    """
+    store = BACKGROUND_JOBS_STORE or ("memory" if workers == 1 else "sqlite")
+    if store == "sqlite":
+        return SQLiteJobStore(BACKGROUND_JOBS_DIR / "jobs.sqlite3")
+
+    return MemoryJobStore()
+
+
+# Store is replaced by the server once the count of workers is known
+job_runner = BackgroundJobRunner(
+    store=create_job_store(SERVER_WORKERS),
+    results_dir=BACKGROUND_JOBS_DIR,
+    concurrency=BACKGROUND_JOBS_CONCURRENCY)
+
+
+@logger.catch(reraise=True)
+async def purge_expired_jobs():
+    await job_runner.purge_expired(timedelta(hours=BACKGROUND_JOBS_TTL_HOURS))
+
+
+@logger.catch(reraise=True)
+async def write_invoices_export(
+        session_factory: async_sessionmaker[AsyncSession],
+        job: Job,
+        path: Path
+    ):
+    """Writes invoices matching filters of the job into NDJSON file"""
+    where_clauses = build_invoice_filters(job.owner_id, **job.params)
+    # File is written by threads, so the event loop isn't blocked by disk
+    file = await asyncio.to_thread(path.open, "w")
+    try:
+        async with session_factory() as session:
+            async for invoices in iter_invoices(
+                    session, where_clauses, INVOICE_EXPORT_CHUNK_SIZE):
+                await asyncio.to_thread(file.write, "".join(
+                    invoice.model_dump_json() + "\n"
+                    for invoice in invoices))
+    finally:
+        await asyncio.to_thread(file.close)
+
+
+@logger.catch(reraise=True)
+async def write_invoices_report(
+        session_factory: async_sessionmaker[AsyncSession],
+        job: Job,
+        path: Path
+    ):
+    """
+    Writes count and sum of invoices matching filters of the job
+    for each day and payment type into CSV file
+    """
+    day = func.date(Invoice.created_at)
+    stmt = (
+        select(
+            day,
+            Payment.type,
+            func.count(Invoice.id),
+            func.sum(Invoice.total))
+        .join(Invoice.payment)
+        .where(*build_invoice_filters(job.owner_id, **job.params))
+        .group_by(day, Payment.type)
+        .order_by(day, Payment.type)
+    )
+    async with session_factory() as session:
+        rows = (await session.execute(stmt)).all()
+
+    await asyncio.to_thread(write_report_rows, path, rows)
+
+
+def write_report_rows(path: Path, rows: list[Row]):
+    with path.open("w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(("date", "payment_type", "invoices", "total"))
+        writer.writerows(
+            (date, payment_type, invoices_count, to_decimal(total))
+            for date, payment_type, invoices_count, total in rows)
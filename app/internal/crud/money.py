@@ -0,0 +1,128 @@
+from loguru import logger
+from sqlalchemy import Connection, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.internal.models import Base
+from app.internal.models.product import create_product_search_index
+from app.utils.money import MINOR_UNITS_IN_MAJOR
+
+MONEY_COLUMNS = {
+    "product": ("price",),
+    "invoice": ("total", "rest"),
+    "payment": ("amount",),
+    "invoice_product_association": ("unit_price",)
+}
+# Generated from money columns, so it's recreated after their conversion
+COMPUTED_COLUMNS = {"invoice_product_association": ("total",)}
+
+
+def get_float_money_tables(connection: Connection):
+    """Finds tables with money columns, which aren't converted yet"""
+    if connection.dialect.name == "postgresql":
+        float_columns = {
+            tuple(row) for row in connection.execute(text(
+                "SELECT table_name, column_name "
+                "FROM information_schema.columns "
+                "WHERE table_schema = current_schema() "
+                "AND data_type IN ('double precision', 'real', 'numeric')"
+            ))}
+    else:
+        float_columns = {
+            (table_name, column.name)
+            for table_name in MONEY_COLUMNS
+            for column in connection.exec_driver_sql(
+                f"PRAGMA table_info({table_name})")
+            if column.type.upper() in ("FLOAT", "REAL")}
+
+    return [
+        table_name for table_name, columns in MONEY_COLUMNS.items()
+        if any(
+            (table_name, column_name) in float_columns
+            for column_name in columns)]
+
+
+def convert_postgresql_table(connection: Connection, table_name: str):
+    """Changes types of money columns in place, rounding them to cents"""
+    table = Base.metadata.tables[table_name]
+    computed_columns = COMPUTED_COLUMNS.get(table_name, ())
+    for column_name in computed_columns:
+        connection.exec_driver_sql(
+            f"ALTER TABLE {table_name} DROP COLUMN {column_name}")
+
+    connection.exec_driver_sql(
+        f"ALTER TABLE {table_name} " + ", ".join(
+            f"ALTER COLUMN {column_name} TYPE BIGINT "
+            f"USING round({column_name} * {MINOR_UNITS_IN_MAJOR})"
+            for column_name in MONEY_COLUMNS[table_name]))
+
+    for column_name in computed_columns:
+        connection.exec_driver_sql(
+            f"ALTER TABLE {table_name} ADD COLUMN {column_name} BIGINT "
+            "GENERATED ALWAYS AS "
+            f"({table.c[column_name].computed.sqltext}) STORED")
+
+
+def convert_sqlite_table(connection: Connection, table_name: str):
+    """
+    Rebuilds the table with integer money columns, since SQLite can't
+    change column types: the old one is renamed, rows are copied into
+    the table created from the models, then the old one is dropped
+    """
+    table = Base.metadata.tables[table_name]
+    old_table_name = f"{table_name}_float"
+    # Keeps references of other tables pointing to the original name
+    connection.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+    connection.exec_driver_sql(
+        f"ALTER TABLE {table_name} RENAME TO {old_table_name}")
+    for (index_name,) in connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' "
+            f"AND tbl_name = '{old_table_name}' AND sql IS NOT NULL"):
+        connection.exec_driver_sql(f"DROP INDEX {index_name}")
+
+    table.create(connection)
+    copied_columns = [
+        column.name for column in table.columns
+        if column.computed is None]
+    connection.exec_driver_sql(
+        f"INSERT INTO {table_name} ({', '.join(copied_columns)}) "
+        "SELECT " + ", ".join(
+            f"CAST(round({column_name} * {MINOR_UNITS_IN_MAJOR}) "
+            "AS INTEGER)"
+            if column_name in MONEY_COLUMNS[table_name] else column_name
+            for column_name in copied_columns) +
+        f" FROM {old_table_name}")
+    connection.exec_driver_sql(f"DROP TABLE {old_table_name}")
+    connection.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+
+
+def convert_money_tables(connection: Connection):
+    table_names = get_float_money_tables(connection)
+    for table_name in table_names:
+        if connection.dialect.name == "postgresql":
+            convert_postgresql_table(connection, table_name)
+        else:
+            convert_sqlite_table(connection, table_name)
+
+        # E.g. index of products lookup by name and price
+        for index in Base.metadata.tables[table_name].indexes:
+            index.create(connection, checkfirst=True)
+
+    if "product" in table_names and connection.dialect.name == "sqlite":
+        # Triggers of search index are dropped with the old table
+        create_product_search_index(Base.metadata, connection)
+
+    return table_names
+
+
+@logger.catch(reraise=True)
+async def convert_money_to_minor_units(session: AsyncSession):
+    """
+    Converts money columns stored as floats into integer cents
+    in a single transaction. Already converted tables are skipped
+    """
+    table_names = await session.run_sync(
+        lambda sync_session: convert_money_tables(
+            sync_session.connection()))
+    await session.commit()
+
+    return table_names
@@ -0,0 +1,131 @@
+import re
+from datetime import date
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import PG_PARTITION_MONTHS_AHEAD
+
+# Tables referring to invoice go first, so they are detached before it
+PARTITIONED_TABLES = ("invoice_product_association", "payment", "invoice")
+PARTITION_NAME_PATTERN = re.compile(
+    r"^(?P<table>\w+)_y(?P<year>\d{4})m(?P<month>\d{2})$")
+SCHEMA_NAME_PATTERN = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+@logger.catch(reraise=True)
+def add_months(month: date, count: int):
+    """Returns the first day of the month shifted by `count` months"""
+    year, month_index = divmod(month.year * 12 + month.month - 1 + count, 12)
+    return date(year, month_index + 1, 1)
+
+
+@logger.catch(reraise=True)
+def get_partition_name(table: str, month: date):
+    return f"{table}_y{month.year}m{month.month:02}"
+
+
+@logger.catch(reraise=True)
+async def create_invoice_partitions(
+        session: AsyncSession,
+        since: date | None = None,
+        months_ahead: int = PG_PARTITION_MONTHS_AHEAD
+    ):
+    """
+    Creates missing monthly partitions of invoice tables
+    from `since` (current month by default) up to `months_ahead`
+    and default ones for rows out of them
+    """
+    current_month = date.today().replace(day=1)
+    month = (since or current_month).replace(day=1)
+    last_month = add_months(current_month, months_ahead)
+    while month <= last_month:
+        for table in reversed(PARTITIONED_TABLES):
+            await session.execute(text(
+                "CREATE TABLE IF NOT EXISTS "
+                f"{get_partition_name(table, month)} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"))
+
+        month = add_months(month, 1)
+
+    for table in reversed(PARTITIONED_TABLES):
+        await session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {table}_default "
+            f"PARTITION OF {table} DEFAULT"))
+
+    await session.commit()
+    logger.info(f"Invoice partitions are created up to {last_month}")
+
+
+@logger.catch(reraise=True)
+async def get_partition_months(session: AsyncSession, table: str):
+    """Lists months of partitions attached to the table"""
+    stmt = text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table")
+    partition_months = list()
+    for partition_name in await session.scalars(stmt, dict(table=table)):
+        if match := PARTITION_NAME_PATTERN.match(partition_name):
+            partition_months.append(
+                date(int(match["year"]), int(match["month"]), 1))
+
+    return sorted(partition_months)
+
+
+@logger.catch(reraise=True)
+async def detach_invoice_partitions(
+        session: AsyncSession,
+        before: date,
+        archive_schema: str | None = None
+    ):
+    """
+    Detaches monthly partitions of invoice tables older than `before`.
+    Detached tables are moved into `archive_schema` or dropped
+    """
+    if archive_schema is not None:
+        if not SCHEMA_NAME_PATTERN.match(archive_schema):
+            raise ValueError(f"Invalid schema name «{archive_schema}»")
+
+        await session.execute(
+            text(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}"))
+
+    detached_months = list()
+    for month in await get_partition_months(session, "invoice"):
+        if month >= before.replace(day=1):
+            break
+
+        for table in PARTITIONED_TABLES:
+            partition_name = get_partition_name(table, month)
+            await session.execute(text(
+                f"ALTER TABLE {table} DETACH PARTITION {partition_name}"))
+            if table != "invoice":
+                # Detached rows must not block detaching their invoices
+                await drop_invoice_foreign_keys(session, partition_name)
+
+        for table in PARTITIONED_TABLES:
+            partition_name = get_partition_name(table, month)
+            await session.execute(text(
+                f"ALTER TABLE {partition_name} SET SCHEMA {archive_schema}"
+                if archive_schema is not None
+                else f"DROP TABLE {partition_name}"))
+
+        await session.commit()
+        detached_months.append(month)
+        logger.info(f"Invoice partitions of {month:%Y-%m} are detached")
+
+    return detached_months
+
+
+@logger.catch(reraise=True)
+async def drop_invoice_foreign_keys(session: AsyncSession, table: str):
+    stmt = text(
+        "SELECT conname FROM pg_constraint "
+        "WHERE conrelid = to_regclass(:table) AND contype = 'f' "
+        "AND confrelid = to_regclass('invoice')")
+    constraint_names = (await session.scalars(stmt, dict(table=table))).all()
+    for constraint_name in constraint_names:
+        await session.execute(text(
+            f'ALTER TABLE {table} DROP CONSTRAINT "{constraint_name}"'))
@@ -0,0 +1,82 @@
+from typing import Literal
+
+from loguru import logger
+from pydantic import PositiveInt
+from sqlalchemy import column, func, select, table, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.internal.models import Invoice, InvoiceProductAssociation, Product
+from app.internal.schemas import ProductSchema, ProductsSearchSchema
+
+product_search = table("product_search", column("rowid"), column("name"))
+
+
+@logger.catch(reraise=True)
+def escape_like(text: str, escape: str = "\\"):
+    """Escapes wildcards of `LIKE` pattern"""
+    for char in (escape, "%", "_"):
+        text = text.replace(char, escape + char)
+
+    return text
+
+
+@logger.catch(reraise=True)
+def match_product_name(
+        dialect_name: str, query: str, match: Literal["prefix", "substring"]
+    ):
+    """
+    Builds clause matching product names by indexed `LIKE` pattern:
+    over FTS5 trigram table on SQLite and trigram GIN index otherwise
+    """
+    pattern = escape_like(query) + "%"
+    if match == "substring":
+        pattern = "%" + pattern
+
+    if dialect_name == "sqlite":
+        return Product.id.in_(
+            select(product_search.c.rowid)
+            .where(product_search.c.name.like(pattern, escape="\\")))
+
+    return Product.name.ilike(pattern, escape="\\")
+
+
+@logger.catch(reraise=True)
+async def search_products(
+        session: AsyncSession,
+        owner_id: int,
+        query: str,
+        match: Literal["prefix", "substring"],
+        limit: PositiveInt,
+        after: str | None
+    ):
+    """
+    Finds products sold by the user, whose names match the query.
+    Recently sold ones go first; pages are fetched by keyset cursor
+    """
+    last_used = func.max(InvoiceProductAssociation.invoice_id)
+    stmt = (
+        select(Product, last_used)
+        .join(Product.invoices)
+        .join(InvoiceProductAssociation.invoice)
+        .where(Invoice.created_by == owner_id)
+        .where(match_product_name(
+            session.get_bind().dialect.name, query, match))
+        .group_by(Product.id)
+        .order_by(last_used.desc(), Product.id.desc())
+        .limit(limit)
+    )
+    if after is not None:
+        stmt = stmt.having(
+            tuple_(last_used, Product.id) <
+            tuple_(*map(int, after.split(":"))))
+
+    rows = (await session.execute(stmt)).all()
+    response = ProductsSearchSchema(
+        products=[
+            ProductSchema.model_validate(product, from_attributes=True)
+            for product, _ in rows])
+    if len(rows) == limit:
+        last_product, last_product_used = rows[-1]
+        response.next_cursor = f"{last_product_used}:{last_product.id}"
+
+    return response
@@ -0,0 +1,407 @@
+import json
+
+from loguru import logger
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.config import SHARD_MOVE_BATCH_SIZE
+from app.configuration.db_helper import DatabaseHelper
+from app.internal.crud.invoice import (
+    find_existing_products,
+    insert_new_products,
+    invoice_reference,
+    invoices_cache,
+    ticket_cache
+)
+from app.internal.crud.invoice_import import reserve_invoice_ids
+from app.internal.models import (
+    IdempotencyKey,
+    Invoice,
+    InvoiceArchive,
+    InvoiceProductAssociation,
+    Payment,
+    User,
+    UserShard
+)
+from app.internal.schemas import InvoiceProductAssociationCreate, UserSchema
+from app.utils.invoice_archive import pack_invoices, unpack_invoices
+from app.utils.sharding import get_shard_id_offset
+
+
+@logger.catch(reraise=True)
+async def reserve_shard_invoice_ids(session: AsyncSession, shard: int):
+    """
+    Moves sequence of invoice ids of the shard to its offset,
+    unless it's already beyond
+    """
+    offset = get_shard_id_offset(shard)
+    if session.get_bind().dialect.name == "postgresql":
+        await session.execute(
+            text(
+                "SELECT setval(pg_get_serial_sequence('invoice', 'id'), "
+                "GREATEST(nextval(pg_get_serial_sequence('invoice', 'id')), "
+                ":offset), false)"),
+            dict(offset=offset))
+    else:
+        await session.execute(
+            text(
+                "UPDATE sqlite_sequence SET seq = :offset "
+                "WHERE name = 'invoice' AND seq < :offset"),
+            dict(offset=offset))
+        await session.execute(
+            text(
+                "INSERT INTO sqlite_sequence (name, seq) "
+                "SELECT 'invoice', :offset WHERE NOT EXISTS "
+                "(SELECT 1 FROM sqlite_sequence WHERE name = 'invoice')"),
+            dict(offset=offset))
+
+    await session.commit()
+
+
+@logger.catch(reraise=True)
+async def get_user_shard(
+        session: AsyncSession, database: DatabaseHelper, user_id: int
+    ):
+    """
+    Finds shard of the user in the directory. Users registered
+    before sharding have no entry, they stay in the main database
+    """
+    if len(database.shards) == 1:
+        return 0
+
+    shard = await session.scalar(
+        select(UserShard.shard).where(UserShard.user_id == user_id))
+
+    return shard or 0
+
+
+@logger.catch(reraise=True)
+async def copy_user_to_shard(session: AsyncSession, user: User):
+    """Invoices and idempotency keys on the shard refer to the user"""
+    await session.merge(User(
+        id=user.id,
+        name=user.name,
+        login=user.login,
+        password=user.password))
+
+
+@logger.catch(reraise=True)
+async def set_user_shard(
+        session: AsyncSession, user_id: int, shard: int
+    ):
+    user_shard = await session.scalar(
+        select(UserShard).where(UserShard.user_id == user_id))
+    if user_shard is None:
+        session.add(UserShard(user_id=user_id, shard=shard))
+    else:
+        user_shard.shard = shard
+
+    await session.commit()
+
+
+@logger.catch(reraise=True)
+async def assign_user_shard(
+        session: AsyncSession, database: DatabaseHelper, user: User
+    ):
+    """Places just registered user on a shard by consistent hashing"""
+    if len(database.shards) == 1:
+        return 0
+
+    shard = database.shard_ring.get_shard(user.id)
+    if shard != 0:
+        async with database.shards[shard].session_factory() as shard_session:
+            await copy_user_to_shard(shard_session, user)
+            await shard_session.commit()
+
+    await set_user_shard(session, user.id, shard)
+
+    return shard
+
+
+@logger.catch(reraise=True)
+async def assign_users_shards(
+        session: AsyncSession, database: DatabaseHelper, users: list[User]
+    ):
+    """
+    Places just registered users on shards like `assign_user_shard`,
+    but with a single insert of users per shard
+    """
+    if len(database.shards) == 1 or not users:
+        return
+
+    shards = {
+        user.id: database.shard_ring.get_shard(user.id) for user in users}
+    for shard, shard_database in enumerate(database.shards[1:], 1):
+        shard_users = [user for user in users if shards[user.id] == shard]
+        if not shard_users:
+            continue
+
+        async with shard_database.session_factory() as shard_session:
+            await shard_session.execute(insert(User), [
+                dict(
+                    id=user.id,
+                    name=user.name,
+                    login=user.login,
+                    password=user.password)
+                for user in shard_users])
+            await shard_session.commit()
+
+    session.add_all(
+        UserShard(user_id=user_id, shard=shard)
+        for user_id, shard in shards.items())
+    await session.commit()
+
+
+@logger.catch(reraise=True)
+async def copy_invoices(
+        target_session: AsyncSession, invoices: list[Invoice]
+    ):
+    """
+    Inserts the invoices with their items and payments into the
+    target shard, which gives them new ids.
+    Returns mapping of old ids to new ones
+    """
+    products_in = [
+        InvoiceProductAssociationCreate.model_construct(
+            name=association.product.name,
+            price=association.product.price,
+            description=association.product.description)
+        for invoice in invoices
+        for association in invoice.products]
+    product_objects = await insert_new_products(
+        target_session,
+        products_in,
+        await find_existing_products(target_session, products_in))
+
+    # Rows instead of objects, so they aren't kept by the session
+    new_invoices = (await target_session.execute(
+        insert(Invoice).returning(
+            Invoice.id, Invoice.created_at, sort_by_parameter_order=True),
+        [
+            dict(
+                total=invoice.total,
+                rest=invoice.rest,
+                created_at=invoice.created_at,
+                created_by=invoice.created_by)
+            for invoice in invoices
+        ])).all()
+    await target_session.execute(
+        insert(Payment),
+        [
+            dict(
+                type=invoice.payment.type,
+                amount=invoice.payment.amount,
+                **invoice_reference(new_invoice))
+            for invoice, new_invoice in zip(invoices, new_invoices)
+        ])
+    await target_session.execute(
+        insert(InvoiceProductAssociation),
+        [
+            dict(
+                product_id=product_objects[(
+                    association.product.name,
+                    association.product.price)].id,
+                quantity=association.quantity,
+                unit_price=association.unit_price,
+                **invoice_reference(new_invoice))
+            for invoice, new_invoice in zip(invoices, new_invoices)
+            for association in invoice.products
+        ])
+
+    return {
+        invoice.id: new_invoice.id
+        for invoice, new_invoice in zip(invoices, new_invoices)}
+
+
+@logger.catch(reraise=True)
+async def copy_user_invoices(
+        source_session: AsyncSession,
+        target_session: AsyncSession,
+        user_id: int
+    ):
+    """
+    Copies invoices of the user by batches of `SHARD_MOVE_BATCH_SIZE`
+    ids, so only one batch is held in memory.
+    Returns mapping of old ids to new ones
+    """
+    id_mapping = dict()
+    last_id = 0
+    while True:
+        invoices = (await source_session.scalars(
+            select(Invoice)
+            .where(Invoice.created_by == user_id, Invoice.id > last_id)
+            .order_by(Invoice.id)
+            .limit(SHARD_MOVE_BATCH_SIZE)
+            .options(
+                selectinload(Invoice.payment),
+                selectinload(Invoice.products)
+                .joinedload(InvoiceProductAssociation.product))
+        )).all()
+        if not invoices:
+            return id_mapping
+
+        id_mapping |= await copy_invoices(target_session, invoices)
+        last_id = invoices[-1].id
+        source_session.expunge_all()
+
+
+@logger.catch(reraise=True)
+async def copy_user_idempotency_keys(
+        source_session: AsyncSession,
+        target_session: AsyncSession,
+        user_id: int,
+        id_mapping: dict[int, int]
+    ):
+    """Stored responses refer to the new ids of moved invoices"""
+    idempotency_keys = (await source_session.scalars(
+        select(IdempotencyKey).where(IdempotencyKey.user_id == user_id)
+    )).all()
+    if idempotency_keys:
+        await target_session.execute(
+            insert(IdempotencyKey),
+            [
+                dict(
+                    user_id=user_id,
+                    key=idempotency_key.key,
+                    request_hash=idempotency_key.request_hash,
+                    response=replace_response_id(
+                        idempotency_key.response, id_mapping),
+                    created_at=idempotency_key.created_at)
+                for idempotency_key in idempotency_keys
+            ])
+
+
+@logger.catch(reraise=True)
+def replace_response_id(response: str, id_mapping: dict[int, int]):
+    """Stored invoice response is replayed with the new id"""
+    invoice = json.loads(response)
+    invoice["id"] = id_mapping.get(invoice["id"], invoice["id"])
+
+    return json.dumps(invoice, ensure_ascii=False, separators=(",", ":"))
+
+
+@logger.catch(reraise=True)
+async def copy_user_archives(
+        source_session: AsyncSession,
+        target_session: AsyncSession,
+        user: User
+    ):
+    """
+    Copies archived invoices of the user with ids taken from the
+    sequence of the target shard, like live ones, so their tickets are
+    looked up there. Returns mapping of old ids to new ones
+    """
+    archives = (await source_session.scalars(
+        select(InvoiceArchive).where(InvoiceArchive.owner_id == user.id)
+    )).all()
+    if not archives:
+        return dict()
+
+    new_ids = iter(await reserve_invoice_ids(
+        target_session,
+        sum(archive.invoices_count for archive in archives)))
+    owner = UserSchema.model_validate(user)
+    id_mapping = dict()
+    for archive in archives:
+        invoices = unpack_invoices(archive.data, owner)
+        for invoice in invoices:
+            new_id = next(new_ids)
+            id_mapping[invoice.id] = new_id
+            invoice.id = new_id
+
+        target_session.add(InvoiceArchive(
+            owner_id=archive.owner_id,
+            month=archive.month,
+            invoices_count=len(invoices),
+            min_invoice_id=min(invoice.id for invoice in invoices),
+            max_invoice_id=max(invoice.id for invoice in invoices),
+            data=pack_invoices(invoices)))
+
+    return id_mapping
+
+
+@logger.catch(reraise=True)
+async def delete_user_invoices(
+        session: AsyncSession, user_id: int, invoice_ids: list[int]
+    ):
+    """
+    Deletes moved invoices by batches of `SHARD_MOVE_BATCH_SIZE` ids,
+    each in its own transaction, then archives and idempotency keys
+    of the user
+    """
+    invoice_ids = sorted(invoice_ids)
+    for start in range(0, len(invoice_ids), SHARD_MOVE_BATCH_SIZE):
+        batch = invoice_ids[start:start + SHARD_MOVE_BATCH_SIZE]
+        for model in (InvoiceProductAssociation, Payment):
+            await session.execute(
+                delete(model)
+                .where(
+                    model.invoice_id.between(batch[0], batch[-1]),
+                    model.invoice_id.in_(batch))
+                .execution_options(synchronize_session=False))
+
+        await session.execute(
+            delete(Invoice)
+            .where(
+                Invoice.id.between(batch[0], batch[-1]),
+                Invoice.id.in_(batch))
+            .execution_options(synchronize_session=False))
+        await session.commit()
+
+    for model, owner_column in (
+            (InvoiceArchive, InvoiceArchive.owner_id),
+            (IdempotencyKey, IdempotencyKey.user_id)):
+        await session.execute(
+            delete(model)
+            .where(owner_column == user_id)
+            .execution_options(synchronize_session=False))
+    await session.commit()
+
+
+@logger.catch(reraise=True)
+async def move_user_to_shard(
+        database: DatabaseHelper, login: str, target: int
+    ):
+    """
+    Moves invoices of the user to the target shard. They're committed
+    there before the directory is switched and only then deleted from
+    the source, so they're never lost. Writes of the user made during
+    the move stay on the source, so it should run while user is idle.
+    Returns mapping of old invoice ids to new ones
+    """
+    if not 0 <= target < len(database.shards):
+        raise ValueError(f"There is no shard {target}")
+
+    async with database.session_factory() as session:
+        user = await session.scalar(select(User).where(User.login == login))
+        if user is None:
+            raise ValueError(f"User with login «{login}» not found")
+
+        source = await get_user_shard(session, database, user.id)
+        if source == target:
+            return dict()
+
+        source_factory = database.shards[source].session_factory
+        target_factory = database.shards[target].session_factory
+        async with source_factory() as source_session:
+            async with target_factory() as target_session:
+                if target != 0:
+                    await copy_user_to_shard(target_session, user)
+                invoices_mapping = await copy_user_invoices(
+                    source_session, target_session, user.id)
+                id_mapping = invoices_mapping | await copy_user_archives(
+                    source_session, target_session, user)
+                await copy_user_idempotency_keys(
+                    source_session, target_session, user.id, id_mapping)
+                await target_session.commit()
+
+            await set_user_shard(session, user.id, target)
+            await delete_user_invoices(
+                source_session, user.id, list(invoices_mapping))
+
+    await invoices_cache.invalidate(user.id)
+    # Only caches of this process, servers keep tickets until evicted
+    ticket_cache.invalidate(id_mapping)
+
+    return id_mapping
@@ -40,8 +40,6 @@ async def create_user(session: AsyncSession, user_in: UserCreate):
             detail=(
                 f"User with login «{user_in.login}» already exists. "
                 "Please, choose another one"))
-    finally:
-        await session.close()
 
     return user
 
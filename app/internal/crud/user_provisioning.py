@@ -0,0 +1,162 @@
+import csv
+import io
+import json
+from collections.abc import Iterable
+
+from fastapi import HTTPException, status
+from loguru import logger
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import USER_PROVISIONING_PROCESSES
+from app.configuration.db_helper import DatabaseHelper
+from app.internal.crud.sharding import assign_users_shards
+from app.internal.models import User
+from app.internal.schemas import (
+    ProvisionedUsersSchema, RejectedUserSchema, UserCreate, UserSchema
+)
+from app.utils.password_hashing import PasswordHashingPool
+
+password_hashing_pool = PasswordHashingPool(USER_PROVISIONING_PROCESSES)
+
+
+@logger.catch(reraise=True)
+def read_users_rows(body: bytes, is_csv: bool):
+    """
+    Reads users of bulk registration from CSV with header
+    `name,login,password` or from JSON array of objects
+    """
+    try:
+        # Spreadsheets often start CSV with byte order mark
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Users are expected in UTF-8")
+
+    if is_csv:
+        return list(csv.DictReader(io.StringIO(text)))
+
+    try:
+        rows = json.loads(text)
+    except json.JSONDecodeError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Invalid JSON: {exc}")
+
+    if not isinstance(rows, list):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="JSON array of users is expected")
+
+    return rows
+
+
+def reject_user(row_number: int, row, detail: str):
+    login = row.get("login") if isinstance(row, dict) else None
+    return RejectedUserSchema(
+        row=row_number,
+        login=login if isinstance(login, str) else None,
+        detail=detail)
+
+
+@logger.catch(reraise=True)
+def validate_provisioned_users(rows: Iterable):
+    """
+    Validates users row by row (numbered from 1). Returns valid ones
+    with their row numbers and rejections of others, including
+    repeated logins
+    """
+    users_in: list[tuple[int, UserCreate]] = list()
+    rejected: list[RejectedUserSchema] = list()
+    logins = set()
+    for row_number, row in enumerate(rows, 1):
+        try:
+            user_in = UserCreate.model_validate(row)
+        except ValidationError as exc:
+            rejected.append(reject_user(row_number, row, "; ".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                for error in exc.errors())))
+            continue
+
+        if user_in.login in logins:
+            rejected.append(reject_user(
+                row_number, row, "Login is repeated in the list"))
+            continue
+
+        logins.add(user_in.login)
+        users_in.append((row_number, user_in))
+
+    return users_in, rejected
+
+
+@logger.catch(reraise=True)
+async def provision_users(
+        session: AsyncSession,
+        database: DatabaseHelper,
+        rows: Iterable,
+        batch_size: int
+    ):
+    """
+    Registers valid users batch by batch: logins already taken
+    are rejected before their passwords are hashed (in processes of
+    the pool), the rest are inserted at once. Logins taken while the
+    batch is hashed are rejected as well
+    """
+    users_in, rejected = validate_provisioned_users(rows)
+    dialect_insert = (
+        postgresql.insert
+        if session.get_bind().dialect.name == "postgresql"
+        else sqlite.insert)
+    created: list[UserSchema] = list()
+    for offset in range(0, len(users_in), batch_size):
+        batch = users_in[offset:offset + batch_size]
+        taken_logins = set(await session.scalars(
+            select(func.lower(User.login)).where(
+                func.lower(User.login).in_(
+                    [user_in.login for _, user_in in batch]))))
+        new_users = list()
+        for row_number, user_in in batch:
+            if user_in.login in taken_logins:
+                rejected.append(RejectedUserSchema(
+                    row=row_number,
+                    login=user_in.login,
+                    detail="User with this login already exists"))
+            else:
+                new_users.append((row_number, user_in))
+
+        if not new_users:
+            continue
+
+        hashed_passwords = await password_hashing_pool.hash_passwords([
+            user_in.password.get_secret_value()
+            for _, user_in in new_users])
+        users = list(await session.scalars(
+            dialect_insert(User)
+            .on_conflict_do_nothing(index_elements=[User.login])
+            .returning(User),
+            [
+                dict(
+                    name=user_in.name,
+                    login=user_in.login,
+                    password=hashed_password)
+                for (_, user_in), hashed_password
+                in zip(new_users, hashed_passwords)]))
+        await session.commit()
+        await assign_users_shards(session, database, users)
+
+        inserted_logins = {user.login for user in users}
+        rejected.extend(
+            RejectedUserSchema(
+                row=row_number,
+                login=user_in.login,
+                detail="User with this login already exists")
+            for row_number, user_in in new_users
+            if user_in.login not in inserted_logins)
+        created.extend(UserSchema.model_validate(user) for user in users)
+
+    rejected.sort(key=lambda rejected_user: rejected_user.row)
+
+    return ProvisionedUsersSchema(created=created, rejected=rejected)
@@ -5,3 +5,8 @@ from app.internal.models.invoice import (
     Invoice, InvoiceProductAssociation
 )
 from app.internal.models.user import User
+from app.internal.models.idempotency_key import IdempotencyKey
+from app.internal.models.user_shard import UserShard
+from app.internal.models.invoice_archive import InvoiceArchive
+from app.internal.models.invoice_import import InvoiceImport
+from app.internal.models.invoice_change import InvoiceChangeClock
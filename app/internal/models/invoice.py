@@ -1,10 +1,16 @@
 from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Computed, Float, ForeignKey, UniqueConstraint
+from sqlalchemy import (
+    BigInteger, Computed, ForeignKey, Index, Integer, UniqueConstraint, text
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from app.config import INVOICE_PARTITIONING
 from app.internal.models import Base
+from app.internal.models.partitioning import (
+    invoice_foreign_key, monthly_partitioning, partition_key
+)
 
 if TYPE_CHECKING:
     from app.internal.models import Payment, Product, User
@@ -16,35 +22,58 @@ class InvoiceProductAssociation(Base):
         UniqueConstraint(
             "invoice_id",
             "product_id",
+            *partition_key("invoice_created_at"),
             name="idx_unique_invoice_product"),
+        # Invoices with a product are found by semi-join in this index
+        Index("idx_product_invoice", "product_id", "invoice_id"),
+        invoice_foreign_key(ondelete="CASCADE"),
+        monthly_partitioning("invoice_created_at")
     )
 
-    invoice_id: Mapped[int] = mapped_column(
-        ForeignKey("invoice.id", ondelete="CASCADE")
-    )
+    invoice_id: Mapped[int] = mapped_column(BigInteger)
+    if INVOICE_PARTITIONING:
+        invoice_created_at: Mapped[datetime] = mapped_column(
+            primary_key=True)
     invoice: Mapped["Invoice"] = relationship(back_populates="products")
     product_id: Mapped[int] = mapped_column(ForeignKey("product.id"))
     product: Mapped["Product"] = relationship(back_populates="invoices")
     quantity: Mapped[int] = mapped_column(default=1, server_default="1")
-    unit_price: Mapped[float] = mapped_column(
-        Float(asdecimal=True, decimal_return_scale=2)
-    )
-    total: Mapped[float] = mapped_column(Computed("unit_price * quantity"))
+    # Money is stored in integer minor units (cents)
+    unit_price: Mapped[int] = mapped_column(BigInteger)
+    total: Mapped[int] = mapped_column(
+        BigInteger, Computed("unit_price * quantity"))
 
 
 class Invoice(Base):
     __tablename__ = "invoice"
+    # Ids are never reused, as they start from the offset of the shard
+    __table_args__ = (
+        # Change feed seeks invoices of the user by change number
+        Index("idx_invoice_owner_change", "created_by", "change_seq"),
+        # Invoices of the committing transaction aren't numbered yet
+        Index(
+            "idx_invoice_unstamped",
+            "id",
+            postgresql_where=text("change_seq IS NULL"),
+            sqlite_where=text("change_seq IS NULL")),
+        monthly_partitioning("created_at") | dict(sqlite_autoincrement=True)
+    )
 
+    # Big enough for ids of any shard, SQLite only autoincrements INTEGER
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True)
     products: Mapped[list[InvoiceProductAssociation]] = relationship(
         back_populates="invoice"
     )
     payment: Mapped["Payment"] = relationship(back_populates="invoice")
-    total: Mapped[float] = mapped_column(
-        Float(asdecimal=True, decimal_return_scale=2)
-    )
-    rest: Mapped[float] = mapped_column(
-        Float(asdecimal=True, decimal_return_scale=2)
+    total: Mapped[int] = mapped_column(BigInteger)
+    rest: Mapped[int] = mapped_column(BigInteger)
+    created_at: Mapped[datetime] = mapped_column(
+        default=datetime.now, primary_key=INVOICE_PARTITIONING
     )
-    created_at: Mapped[datetime] = mapped_column(default=datetime.now)
     created_by: Mapped[int] = mapped_column(ForeignKey("user.id"))
     user_owner: Mapped["User"] = relationship(back_populates="invoices")
+    # Increases in order of commits, it's the cursor of change feed
+    change_seq: Mapped[int | None] = mapped_column(BigInteger)
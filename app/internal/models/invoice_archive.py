@@ -0,0 +1,34 @@
+from datetime import date
+from typing import TYPE_CHECKING
+
+from sqlalchemy import BigInteger, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from app.internal.models import Base
+
+if TYPE_CHECKING:
+    from app.internal.models import User
+
+
+class InvoiceArchive(Base):
+    """Invoices of a user for a month, serialized and compressed"""
+    __tablename__ = "invoice_archive"
+    __table_args__ = (
+        UniqueConstraint(
+            "owner_id",
+            "month",
+            name="idx_unique_invoice_archive_owner_month"),
+        # Ticket is unpacked only from archives with its id in range
+        Index("idx_invoice_archive_max_id", "max_invoice_id"),
+    )
+
+    owner_id: Mapped[int] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE")
+    )
+    owner: Mapped["User"] = relationship()
+    # The first day of the month
+    month: Mapped[date]
+    invoices_count: Mapped[int]
+    min_invoice_id: Mapped[int] = mapped_column(BigInteger)
+    max_invoice_id: Mapped[int] = mapped_column(BigInteger)
+    data: Mapped[bytes]
@@ -0,0 +1,109 @@
+import time
+
+from sqlalchemy import BigInteger, case, event, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import (
+    Mapped, ORMExecuteState, Session, UOWTransaction, mapped_column
+)
+
+from app.internal.models import Base
+from app.internal.models.invoice import Invoice
+
+# Session has inserted invoices, which aren't stamped yet
+HAS_INVOICE_CHANGES = "has_invoice_changes"
+
+
+class InvoiceChangeClock(Base):
+    """
+    The last change number given to invoices of the database. Its row
+    is locked by a committing transaction from stamping its invoices
+    until the commit, so numbers follow the order of commits
+    """
+    __tablename__ = "invoice_change_clock"
+
+    last_seq: Mapped[int] = mapped_column(BigInteger)
+
+
+def mark_invoice_changes(session: Session):
+    """For invoices inserted bypassing the session, e.g. by `COPY`"""
+    session.info[HAS_INVOICE_CHANGES] = True
+
+
+def advance_invoice_change_clock(session: Session, count: int):
+    """
+    Takes `count` numbers after the last one, but not before the
+    current time in microseconds, so numbers of another database
+    (e.g. of a shard the user is moved to) continue the same order.
+    Returns the last taken number
+    """
+    now = time.time_ns() // 1000
+    stmt = (
+        update(InvoiceChangeClock)
+        .values(last_seq=case(
+            (InvoiceChangeClock.last_seq > now, InvoiceChangeClock.last_seq),
+            else_=now) + count)
+        .returning(InvoiceChangeClock.last_seq))
+    last_seq = session.scalar(stmt)
+    if last_seq is None:
+        dialect_insert = (
+            postgresql.insert
+            if session.get_bind().dialect.name == "postgresql"
+            else sqlite.insert)
+        session.execute(
+            dialect_insert(InvoiceChangeClock)
+            .values(id=1, last_seq=0)
+            .on_conflict_do_nothing(index_elements=["id"]))
+        last_seq = session.scalar(stmt)
+
+    return last_seq
+
+
+def stamp_invoice_changes(session: Session):
+    """
+    Numbers invoices inserted by the transaction in order of their
+    ids. Others' uncommitted invoices aren't visible, so only its own
+    have no number yet
+    """
+    unstamped = Invoice.change_seq.is_(None)
+    first_id, last_id = session.execute(
+        select(func.min(Invoice.id), func.max(Invoice.id)).where(unstamped)
+    ).one()
+    if first_id is None:
+        return
+
+    last_seq = advance_invoice_change_clock(session, last_id - first_id + 1)
+    session.execute(
+        update(Invoice)
+        .where(unstamped)
+        .values(change_seq=Invoice.id + (last_seq - last_id))
+        .execution_options(synchronize_session=False))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def track_invoice_inserts(orm_execute_state: ORMExecuteState):
+    if (
+            orm_execute_state.is_insert and
+            orm_execute_state.statement.table.name == Invoice.__tablename__):
+        mark_invoice_changes(orm_execute_state.session)
+
+
+@event.listens_for(Session, "before_flush")
+def track_added_invoices(
+        session: Session, flush_context: UOWTransaction, instances
+    ):
+    if any(isinstance(instance, Invoice) for instance in session.new):
+        mark_invoice_changes(session)
+
+
+@event.listens_for(Session, "before_commit")
+def stamp_committed_invoices(session: Session):
+    """Invoices are numbered as the last statements before commit"""
+    # Otherwise pending objects are flushed only after this event
+    session.flush()
+    if session.info.pop(HAS_INVOICE_CHANGES, False):
+        stamp_invoice_changes(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def forget_invoice_changes(session: Session):
+    session.info.pop(HAS_INVOICE_CHANGES, None)
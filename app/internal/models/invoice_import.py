@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+from sqlalchemy import BigInteger, ForeignKey, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from app.internal.models import Base
+
+if TYPE_CHECKING:
+    from app.internal.models import User
+
+
+class InvoiceImport(Base):
+    """
+    Progress of importing a file of invoices, saved in the same
+    transaction as each batch, so it's resumed from the next one
+    """
+    __tablename__ = "invoice_import"
+    __table_args__ = (
+        UniqueConstraint(
+            "owner_id",
+            "source",
+            name="idx_unique_invoice_import_owner_source"),
+    )
+
+    owner_id: Mapped[int] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE")
+    )
+    owner: Mapped["User"] = relationship()
+    # Name of the imported file
+    source: Mapped[str] = mapped_column(String(255))
+    # Bytes and lines of the file already imported
+    position: Mapped[int] = mapped_column(BigInteger, default=0)
+    lines: Mapped[int] = mapped_column(default=0)
+    invoices_count: Mapped[int] = mapped_column(default=0)
+    rejected_count: Mapped[int] = mapped_column(default=0)
+    updated_at: Mapped[datetime] = mapped_column(
+        default=datetime.now, onupdate=datetime.now
+    )
@@ -0,0 +1,30 @@
+from sqlalchemy import ForeignKeyConstraint
+
+from app.config import INVOICE_PARTITIONING
+
+
+def invoice_foreign_key(**options):
+    """
+    Foreign key to invoice. Partitioned tables also refer to
+    the partition key, since it's a part of invoice primary key
+    """
+    if INVOICE_PARTITIONING:
+        return ForeignKeyConstraint(
+            ("invoice_id", "invoice_created_at"),
+            ("invoice.id", "invoice.created_at"),
+            **options)
+
+    return ForeignKeyConstraint(("invoice_id",), ("invoice.id",), **options)
+
+
+def partition_key(*columns: str):
+    """Columns to be included in unique constraints of partitioned table"""
+    return columns if INVOICE_PARTITIONING else ()
+
+
+def monthly_partitioning(column: str):
+    """Options of PostgreSQL table partitioned by range of `column`"""
+    if INVOICE_PARTITIONING:
+        return dict(postgresql_partition_by=f"RANGE ({column})")
+
+    return dict()
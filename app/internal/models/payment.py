@@ -1,9 +1,14 @@
+from datetime import datetime
 from typing import TYPE_CHECKING, Literal
 
-from sqlalchemy import Float, ForeignKey
+from sqlalchemy import BigInteger
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from app.config import INVOICE_PARTITIONING
 from app.internal.models import Base
+from app.internal.models.partitioning import (
+    invoice_foreign_key, monthly_partitioning
+)
 
 if TYPE_CHECKING:
     from app.internal.models import Invoice
@@ -11,10 +16,15 @@ if TYPE_CHECKING:
 
 class Payment(Base):
     __tablename__ = "payment"
+    __table_args__ = (
+        invoice_foreign_key(),
+        monthly_partitioning("invoice_created_at")
+    )
 
     type: Mapped[Literal["cash", "cashless"]]
-    amount: Mapped[float] = mapped_column(
-        Float(asdecimal=True, decimal_return_scale=2)
-    )
-    invoice_id: Mapped[int] = mapped_column(ForeignKey("invoice.id"))
+    amount: Mapped[int] = mapped_column(BigInteger)
+    invoice_id: Mapped[int] = mapped_column(BigInteger)
+    if INVOICE_PARTITIONING:
+        invoice_created_at: Mapped[datetime] = mapped_column(
+            primary_key=True)
     invoice: Mapped["Invoice"] = relationship(back_populates="payment")
@@ -1,6 +1,8 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Float
+from sqlalchemy import (
+    BigInteger, Connection, Index, MetaData, event, inspect
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.internal.models import Base
@@ -8,14 +10,72 @@ from app.internal.models import Base
 if TYPE_CHECKING:
     from app.internal.models import InvoiceProductAssociation
 
+PRODUCT_SEARCH_SQLITE_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_insert
+    AFTER INSERT ON product BEGIN
+        INSERT INTO product_search (rowid, name) VALUES (new.id, new.name);
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_delete
+    AFTER DELETE ON product BEGIN
+        INSERT INTO product_search (product_search, rowid, name)
+        VALUES ('delete', old.id, old.name);
+    END""",
+    """
+    CREATE TRIGGER IF NOT EXISTS product_search_update
+    AFTER UPDATE OF name ON product BEGIN
+        INSERT INTO product_search (product_search, rowid, name)
+        VALUES ('delete', old.id, old.name);
+        INSERT INTO product_search (rowid, name) VALUES (new.id, new.name);
+    END"""
+)
+
 
 class Product(Base):
     __tablename__ = "product"
+    __table_args__ = (Index("idx_product_name_price", "name", "price"),)
 
     name: Mapped[str]
-    price: Mapped[float] = mapped_column(
-        Float(asdecimal=True, decimal_return_scale=2)
-    )
+    price: Mapped[int] = mapped_column(BigInteger)
     description: Mapped[str | None]
     invoices: Mapped[list["InvoiceProductAssociation"]] = relationship(
         back_populates="product")
+
+
+@event.listens_for(Base.metadata, "after_create")
+def create_product_search_index(
+        target: MetaData, connection: Connection, **kw
+    ):
+    """
+    Creates index for substring search of product names:
+    FTS5 trigram table on SQLite or trigram GIN index on PostgreSQL
+    """
+    if connection.dialect.name == "sqlite":
+        is_index_created = inspect(connection).has_table("product_search")
+        connection.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS product_search "
+            "USING fts5(name, content='product', content_rowid='id', "
+            "tokenize='trigram')")
+        for trigger_ddl in PRODUCT_SEARCH_SQLITE_TRIGGERS:
+            connection.exec_driver_sql(trigger_ddl)
+
+        if not is_index_created:
+            # Indexes names of products saved before the index
+            connection.exec_driver_sql(
+                "INSERT INTO product_search (product_search) "
+                "VALUES ('rebuild')")
+
+    elif connection.dialect.name == "postgresql":
+        connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        connection.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS idx_product_name_trgm "
+            "ON product USING gin (name gin_trgm_ops)")
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def drop_product_search_index(
+        target: MetaData, connection: Connection, **kw
+    ):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("DROP TABLE IF EXISTS product_search")
@@ -0,0 +1,14 @@
+from sqlalchemy import ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.internal.models import Base
+
+
+class UserShard(Base):
+    """Directory of shards holding invoices of users"""
+    __tablename__ = "user_shard"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("user.id", ondelete="CASCADE"), unique=True
+    )
+    shard: Mapped[int]
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, status
 from loguru import logger
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.config import API_PREFIX
-from app.configuration.db_helper import db_helper
-from app.internal.schemas import TokenInfo, UserBase
+from app.config import ADMIN_LOGINS, API_PREFIX
+from app.configuration.db_helper import DatabaseHelper, db_helper
+from app.internal.crud.sharding import get_user_shard
+from app.internal.schemas import TokenInfo, UserBase, UserSchema
 from app.utils.auth_jwt import (
     encode_jwt, get_current_token_payload, validate_auth_user
 )
@@ -16,14 +17,54 @@ router = APIRouter(prefix=API_PREFIX + "/auth", tags=["auth"])
 @logger.catch(reraise=True)
 async def get_current_auth_user(
         payload: dict = Depends(get_current_token_payload),
-        session: AsyncSession = Depends(
-            db_helper.scoped_session_dependency)
+        session: AsyncSession = Depends(db_helper.session_dependency)
     ):
     user_login = payload.get("sub")
 
     return await get_user_by_login(session, user_login)
 
 
+@logger.catch(reraise=True)
+async def get_current_admin_user(
+        user: UserSchema = Depends(get_current_auth_user)
+    ):
+    if user.login not in ADMIN_LOGINS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator rights are required")
+
+    return user
+
+
+async def get_user_shard_session(
+        user: UserSchema = Depends(get_current_auth_user),
+        session: AsyncSession = Depends(db_helper.session_dependency),
+        database: DatabaseHelper = Depends(db_helper.router_dependency)
+    ):
+    """Session of the shard holding invoices of the current user"""
+    shard = await get_user_shard(session, database, user.id)
+    if shard == 0:
+        yield session
+        return
+
+    async with database.shards[shard].session_factory() as shard_session:
+        yield shard_session
+
+
+async def get_user_shard_session_factory(
+        user: UserSchema = Depends(get_current_auth_user),
+        session: AsyncSession = Depends(db_helper.session_dependency),
+        session_factory: async_sessionmaker[AsyncSession] = Depends(
+            db_helper.session_factory_dependency),
+        database: DatabaseHelper = Depends(db_helper.router_dependency)
+    ):
+    shard = await get_user_shard(session, database, user.id)
+    if shard == 0:
+        return session_factory
+
+    return database.shards[shard].session_factory
+
+
 @router.post("/jwt/login", response_model=TokenInfo)
 async def auth_user_issue_jwt(
         user: UserBase = Depends(validate_auth_user)
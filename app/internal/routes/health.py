@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+
+router = APIRouter(prefix="/health", include_in_schema=False)
+
+
+@router.get("/live")
+async def check_liveness():
+    return {"status": "alive"}
+
+
+@router.get("/ready")
+async def check_readiness(request: Request):
+    # Set by lifespan once the worker is warmed up
+    if not getattr(request.app.state, "is_ready", False):
+        return JSONResponse({"status": "warming up"}, status_code=503)
+
+    return {"status": "ready"}
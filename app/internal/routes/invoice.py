@@ -1,34 +1,117 @@
+import asyncio
 from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, Path
-from fastapi.responses import PlainTextResponse
-from sqlalchemy.ext.asyncio import AsyncSession
-from pydantic import NonNegativeInt, NonNegativeFloat
+from fastapi import APIRouter, Depends, Header, Path, Query, Request
+from fastapi.responses import (
+    JSONResponse, PlainTextResponse, Response, StreamingResponse
+)
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from pydantic import NonNegativeInt, NonNegativeFloat, PositiveInt
 
-from app.config import API_PREFIX
-from app.configuration.db_helper import db_helper
+from app.config import (
+    API_PREFIX,
+    EVENTS_KEEPALIVE_SECONDS,
+    INVOICE_BATCHING_ENABLED,
+    INVOICE_EXPORT_CHUNK_SIZE,
+    INVOICE_INGEST_BATCH_SIZE
+)
+from app.configuration.db_helper import DatabaseHelper, db_helper
+from app.internal.crud.idempotency import generate_idempotent_invoice
 from app.internal.crud.invoice import (
-    generate_invoice, get_invoices, get_pretty_invoice
+    build_invoice_filters,
+    build_product_filter,
+    generate_invoice,
+    get_cached_invoices,
+    get_invoice_changes,
+    get_pretty_invoice,
+    invoice_events,
+    iter_invoices,
+    ticket_cache
+)
+from app.internal.crud.invoice_batching import get_invoice_write_coalescer
+from app.internal.crud.invoice_ingestion import ingest_invoice
+from app.internal.routes.auth import (
+    get_current_auth_user,
+    get_user_shard_session,
+    get_user_shard_session_factory
 )
-from app.internal.routes.auth import get_current_auth_user
 from app.internal.schemas import (
-    InvoiceCreate, InvoiceSchema, InvoicesSchema, UserSchema
+    IngestedInvoiceSchema,
+    InvoiceChangesSchema,
+    InvoiceCreate,
+    InvoiceSchema,
+    InvoicesSchema,
+    PaymentCreate,
+    UserSchema
 )
+from app.utils.compression import accepts_gzip, gzip_stream
 from app.utils.prettify_invoice import ticket_response_example
+from app.utils.sharding import get_id_shard
 
 router = APIRouter(prefix=API_PREFIX + "/invoice", tags=["invoice"])
 
 
+async def get_invoice_shard_session(
+        invoice_id: Annotated[int, Path(ge=1)],
+        session: AsyncSession = Depends(db_helper.session_dependency),
+        database: DatabaseHelper = Depends(db_helper.router_dependency)
+    ):
+    """Session of the shard encoded in the invoice id"""
+    shard = get_id_shard(invoice_id)
+    if shard == 0 or shard >= len(database.shards):
+        # Ids of missing shards aren't found in the main database either
+        yield session
+        return
+
+    async with database.shards[shard].session_factory() as shard_session:
+        yield shard_session
+
+
 @router.post("/create", response_model=InvoiceSchema, status_code=201)
 async def create_invoice(
         invoice_in: InvoiceCreate,
+        idempotency_key: Annotated[
+            str | None, Header(min_length=1, max_length=255)] = None,
         user: UserSchema = Depends(get_current_auth_user),
-        session: AsyncSession = Depends(
-            db_helper.scoped_session_dependency)):
+        session: AsyncSession = Depends(get_user_shard_session),
+        session_factory: async_sessionmaker[AsyncSession] = Depends(
+            get_user_shard_session_factory)):
+
+    coalescer = (
+        get_invoice_write_coalescer(session_factory)
+        if INVOICE_BATCHING_ENABLED else None)
+    if idempotency_key is not None:
+        return await generate_idempotent_invoice(
+            session, invoice_in, user, idempotency_key, coalescer)
+
+    if coalescer is not None:
+        return await coalescer.submit(invoice_in, user)
 
     return await generate_invoice(session, invoice_in, user)
 
 
+@router.post(
+        "/ingest",
+        response_model=IngestedInvoiceSchema,
+        status_code=201,
+        openapi_extra={"requestBody": {
+            "content": {"application/x-ndjson": {}}, "required": True}})
+async def ingest_large_invoice(
+        request: Request,
+        payment_type: Literal["cash", "cashless"],
+        payment_amount: NonNegativeFloat,
+        user: UserSchema = Depends(get_current_auth_user),
+        session: AsyncSession = Depends(get_user_shard_session)):
+
+    # Lines are processed in batches while the body is received
+    return await ingest_invoice(
+        session,
+        PaymentCreate(type=payment_type, amount=payment_amount),
+        request.stream(),
+        user,
+        INVOICE_INGEST_BATCH_SIZE)
+
+
 @router.get("/retrieve", response_model=InvoicesSchema)
 async def get_owned_invoices(
         from_created_at: str = None,
@@ -36,22 +119,123 @@ async def get_owned_invoices(
         max_total: NonNegativeFloat = None,
         min_total: NonNegativeFloat = None,
         payment_type: Literal["cash", "cashless"] = None,
+        product: Annotated[str, Query(min_length=1, max_length=100)] = None,
+        product_match: Literal["exact", "prefix"] = "exact",
+        product_id: PositiveInt = None,
         page: NonNegativeInt = 0,
         limit: NonNegativeInt = None,
         user: UserSchema = Depends(get_current_auth_user),
-        session: AsyncSession = Depends(
-            db_helper.scoped_session_dependency)):
+        session: AsyncSession = Depends(get_user_shard_session)):
 
-    return await get_invoices(
-        session,
+    # Serialized once, so a cached page is sent as is
+    return Response(
+        await get_cached_invoices(
+            session,
+            user.id,
+            from_created_at,
+            to_created_at,
+            max_total,
+            min_total,
+            payment_type,
+            product,
+            product_match,
+            product_id,
+            page,
+            limit),
+        media_type=JSONResponse.media_type)
+
+
+@router.get("/changes", response_model=InvoiceChangesSchema)
+async def get_owned_invoice_changes(
+        after: NonNegativeInt = 0,
+        limit: Annotated[PositiveInt, Query(le=1000)] = 100,
+        user: UserSchema = Depends(get_current_auth_user),
+        session: AsyncSession = Depends(get_user_shard_session)):
+
+    return await get_invoice_changes(session, user.id, after, limit)
+
+
+@router.get(
+        "/events",
+        response_class=StreamingResponse,
+        responses={"200": {"content": {"text/event-stream": {}}}})
+async def stream_invoice_events(
+        user: UserSchema = Depends(get_current_auth_user)):
+
+    async def events():
+        # Nothing but the subscription is kept while the client waits
+        with invoice_events.subscribe(str(user.id)) as subscription:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    async with asyncio.timeout(EVENTS_KEEPALIVE_SECONDS):
+                        event = await subscription.get()
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                dropped = subscription.take_dropped()
+                if dropped:
+                    # The client should catch up by the change feed
+                    yield f"event: dropped\ndata: {dropped}\n\n"
+
+                yield f"event: invoice\ndata: {event}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get(
+        "/export",
+        response_class=StreamingResponse,
+        responses={"200": {"content": {"application/x-ndjson": {}}}})
+async def export_owned_invoices(
+        request: Request,
+        from_created_at: str = None,
+        to_created_at: str = None,
+        max_total: NonNegativeFloat = None,
+        min_total: NonNegativeFloat = None,
+        payment_type: Literal["cash", "cashless"] = None,
+        product: Annotated[str, Query(min_length=1, max_length=100)] = None,
+        product_match: Literal["exact", "prefix"] = "exact",
+        product_id: PositiveInt = None,
+        user: UserSchema = Depends(get_current_auth_user),
+        session_factory: async_sessionmaker[AsyncSession] = Depends(
+            get_user_shard_session_factory)):
+
+    where_clauses = build_invoice_filters(
         user.id,
         from_created_at,
         to_created_at,
         max_total,
         min_total,
-        payment_type,
-        page,
-        limit)
+        payment_type)
+    if product is not None or product_id is not None:
+        where_clauses.append(build_product_filter(
+            session_factory.kw["bind"].dialect.name,
+            product,
+            product_match,
+            product_id))
+
+    async def export_lines():
+        # Session from dependency is already closed while streaming
+        async with session_factory() as session:
+            async for invoices in iter_invoices(
+                    session, where_clauses, INVOICE_EXPORT_CHUNK_SIZE):
+                yield "".join(
+                    invoice.model_dump_json() + "\n"
+                    for invoice in invoices)
+
+    if accepts_gzip(request):
+        return StreamingResponse(
+            gzip_stream(export_lines()),
+            media_type="application/x-ndjson",
+            headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+
+    return StreamingResponse(
+        export_lines(), media_type="application/x-ndjson")
 
 
 @router.get(
@@ -60,7 +244,13 @@ async def get_owned_invoices(
         responses={"200": ticket_response_example})
 async def get_represented_invoice(
         invoice_id: Annotated[int, Path(ge=1)],
-        session: AsyncSession = Depends(
-            db_helper.scoped_session_dependency)):
+        request: Request,
+        session: AsyncSession = Depends(get_invoice_shard_session)):
+
+    ticket = ticket_cache.get(invoice_id)
+    if ticket is None:
+        ticket = ticket_cache.set(
+            invoice_id, await get_pretty_invoice(session, invoice_id))
 
-    return await get_pretty_invoice(session, invoice_id)
+    return ticket.to_response(
+        PlainTextResponse.media_type, accepts_gzip(request))
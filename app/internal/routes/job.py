@@ -0,0 +1,139 @@
+from functools import partial
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Path, status
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from pydantic import NonNegativeFloat
+
+from app.config import API_PREFIX
+from app.internal.crud.invoice import build_invoice_filters
+from app.internal.crud.invoice_jobs import (
+    job_runner, write_invoices_export, write_invoices_report
+)
+from app.internal.routes.auth import (
+    get_current_auth_user, get_user_shard_session_factory
+)
+from app.internal.schemas import JobSchema, UserSchema
+from app.utils.background_jobs import Job
+
+router = APIRouter(prefix=API_PREFIX + "/job", tags=["job"])
+
+job_handlers = {
+    "ndjson": write_invoices_export,
+    "csv": write_invoices_report
+}
+media_types = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+
+def job_to_schema(job: Job):
+    result_url = (
+        router.url_path_for("get_job_result", job_id=job.id)
+        if job.status == "done" else None)
+
+    return JobSchema.model_validate(job).model_copy(
+        update=dict(result_url=result_url))
+
+
+async def submit_invoices_job(
+        kind: Literal["ndjson", "csv"],
+        user: UserSchema,
+        session_factory: async_sessionmaker[AsyncSession],
+        **filters
+    ):
+    # Invalid filters are rejected before the job is accepted
+    build_invoice_filters(user.id, **filters)
+    job = await job_runner.submit(
+        kind,
+        user.id,
+        filters,
+        partial(job_handlers[kind], session_factory))
+
+    return job_to_schema(job)
+
+
+async def get_owned_job(job_id: str, user: UserSchema):
+    job = await job_runner.store.get(job_id)
+    if job is None or job.owner_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with id {job_id} not found")
+
+    return job
+
+
+@router.post("/export", response_model=JobSchema, status_code=202)
+async def start_invoices_export(
+        from_created_at: str = None,
+        to_created_at: str = None,
+        max_total: NonNegativeFloat = None,
+        min_total: NonNegativeFloat = None,
+        payment_type: Literal["cash", "cashless"] = None,
+        user: UserSchema = Depends(get_current_auth_user),
+        session_factory: async_sessionmaker[AsyncSession] = Depends(
+            get_user_shard_session_factory)):
+
+    return await submit_invoices_job(
+        "ndjson",
+        user,
+        session_factory,
+        from_created_at=from_created_at,
+        to_created_at=to_created_at,
+        max_total=max_total,
+        min_total=min_total,
+        payment_type=payment_type)
+
+
+@router.post("/report", response_model=JobSchema, status_code=202)
+async def start_invoices_report(
+        from_created_at: str = None,
+        to_created_at: str = None,
+        max_total: NonNegativeFloat = None,
+        min_total: NonNegativeFloat = None,
+        payment_type: Literal["cash", "cashless"] = None,
+        user: UserSchema = Depends(get_current_auth_user),
+        session_factory: async_sessionmaker[AsyncSession] = Depends(
+            get_user_shard_session_factory)):
+
+    return await submit_invoices_job(
+        "csv",
+        user,
+        session_factory,
+        from_created_at=from_created_at,
+        to_created_at=to_created_at,
+        max_total=max_total,
+        min_total=min_total,
+        payment_type=payment_type)
+
+
+@router.get("/{job_id}", response_model=JobSchema)
+async def get_job(
+        job_id: Annotated[str, Path(max_length=32)],
+        user: UserSchema = Depends(get_current_auth_user)):
+
+    return job_to_schema(await get_owned_job(job_id, user))
+
+
+@router.get(
+        "/{job_id}/result",
+        response_class=FileResponse,
+        responses={"200": {"content": {
+            media_type: {} for media_type in media_types.values()}}})
+async def get_job_result(
+        job_id: Annotated[str, Path(max_length=32)],
+        user: UserSchema = Depends(get_current_auth_user)):
+
+    job = await get_owned_job(job_id, user)
+    if job.status != "done":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job with id {job_id} is {job.status}")
+
+    # Range requests are served too, so a download can be resumed
+    return FileResponse(
+        job_runner.get_result_path(job),
+        media_type=media_types[job.kind],
+        filename=f"invoices.{job.kind}")
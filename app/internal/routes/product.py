@@ -0,0 +1,26 @@
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Depends, Query
+from pydantic import PositiveInt
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import API_PREFIX
+from app.internal.crud.product import search_products
+from app.internal.routes.auth import (
+    get_current_auth_user, get_user_shard_session
+)
+from app.internal.schemas import ProductsSearchSchema, UserSchema
+
+router = APIRouter(prefix=API_PREFIX + "/product", tags=["product"])
+
+
+@router.get("/search", response_model=ProductsSearchSchema)
+async def search_sold_products(
+        q: Annotated[str, Query(min_length=1, max_length=100)],
+        match: Literal["prefix", "substring"] = "prefix",
+        limit: Annotated[PositiveInt, Query(le=100)] = 20,
+        after: Annotated[str, Query(pattern=r"^\d+:\d+$")] = None,
+        user: UserSchema = Depends(get_current_auth_user),
+        session: AsyncSession = Depends(get_user_shard_session)):
+
+    return await search_products(session, user.id, q, match, limit, after)
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from datetime import datetime
+from pathlib import Path as FilePath
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, status
+from fastapi.responses import FileResponse
+
+from app.config import (
+    API_PREFIX,
+    PROFILING_DIR,
+    PROFILING_INTERVAL_MS,
+    PROFILING_MAX_CAPTURE_SECONDS
+)
+from app.internal.routes.auth import get_current_admin_user
+from app.internal.schemas import ProfileSchema
+from app.utils.profiling import (
+    make_profile_name, sample_stacks, write_collapsed_stacks
+)
+
+router = APIRouter(
+    prefix=API_PREFIX + "/profiling",
+    tags=["profiling"],
+    dependencies=[Depends(get_current_admin_user)])
+
+media_types = {
+    ".pstats": "application/octet-stream",
+    ".folded": "text/plain"
+}
+
+
+def profile_to_schema(path: FilePath):
+    stat = path.stat()
+    return ProfileSchema(
+        name=path.name,
+        size=stat.st_size,
+        created_at=datetime.fromtimestamp(stat.st_mtime),
+        url=router.url_path_for("get_profile", name=path.name))
+
+
+@router.post("/capture", response_model=ProfileSchema, status_code=201)
+async def capture_profile(
+        seconds: Annotated[
+            int, Query(ge=1, le=PROFILING_MAX_CAPTURE_SECONDS)] = 10):
+    """
+    Samples what the event loop of this worker is doing
+    for `seconds` and stores stacks collapsed for a flame graph
+    """
+    stacks = await asyncio.to_thread(
+        sample_stacks,
+        threading.get_ident(),
+        seconds,
+        PROFILING_INTERVAL_MS / 1000)
+    path = PROFILING_DIR / make_profile_name("capture", "folded")
+    write_collapsed_stacks(stacks, path)
+
+    return profile_to_schema(path)
+
+
+@router.get("/files", response_model=list[ProfileSchema])
+async def get_profiles():
+    if not PROFILING_DIR.is_dir():
+        return list()
+
+    return [
+        profile_to_schema(path)
+        for path in sorted(PROFILING_DIR.iterdir(), reverse=True)
+        if path.suffix in media_types]
+
+
+@router.get("/files/{name}", response_class=FileResponse)
+async def get_profile(name: Annotated[str, Path(max_length=255)]):
+    path = PROFILING_DIR / name
+    if (
+            FilePath(name).name != name or
+            path.suffix not in media_types or
+            not path.is_file()):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Profile {name} not found")
+
+    return FileResponse(
+        path, media_type=media_types[path.suffix], filename=name)
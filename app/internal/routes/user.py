@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.config import API_PREFIX
-from app.configuration.db_helper import db_helper
+from app.config import API_PREFIX, USER_PROVISIONING_BATCH_SIZE
+from app.configuration.db_helper import DatabaseHelper, db_helper
+from app.internal.crud.sharding import assign_user_shard
 from app.internal.crud.user import create_user, validate_creating_user
-from app.internal.routes.auth import get_current_auth_user
-from app.internal.schemas import UserCreate, UserSchema
+from app.internal.crud.user_provisioning import (
+    provision_users, read_users_rows
+)
+from app.internal.routes.auth import (
+    get_current_admin_user, get_current_auth_user
+)
+from app.internal.schemas import (
+    ProvisionedUsersSchema, UserCreate, UserSchema
+)
 
 router = APIRouter(prefix=API_PREFIX + "/user", tags=["user"])
 
@@ -13,10 +21,34 @@ router = APIRouter(prefix=API_PREFIX + "/user", tags=["user"])
 @router.post("/register", response_model=UserSchema, status_code=201)
 async def register_user(
         user_in: UserCreate = Depends(validate_creating_user),
-        session: AsyncSession = Depends(
-            db_helper.scoped_session_dependency)):
+        session: AsyncSession = Depends(db_helper.session_dependency),
+        database: DatabaseHelper = Depends(db_helper.router_dependency)):
 
-    return await create_user(session, user_in)
+    user = await create_user(session, user_in)
+    await assign_user_shard(session, database, user)
+
+    return user
+
+
+@router.post(
+        "/provision",
+        response_model=ProvisionedUsersSchema,
+        dependencies=[Depends(get_current_admin_user)],
+        openapi_extra={"requestBody": {
+            "content": {"application/json": {}, "text/csv": {}},
+            "required": True}})
+async def provision_users_in_bulk(
+        request: Request,
+        session: AsyncSession = Depends(db_helper.session_dependency),
+        database: DatabaseHelper = Depends(db_helper.router_dependency)):
+
+    rows = read_users_rows(
+        await request.body(),
+        is_csv=request.headers.get("content-type", "").startswith(
+            "text/csv"))
+
+    return await provision_users(
+        session, database, rows, USER_PROVISIONING_BATCH_SIZE)
 
 
 @router.get("/details", response_model=UserSchema)
@@ -1,11 +1,23 @@
 from app.internal.schemas.payment import PaymentCreate, PaymentSchema
-from app.internal.schemas.product import ProductCreate
+from app.internal.schemas.product import (
+    ProductCreate, ProductSchema, ProductsSearchSchema
+)
 from app.internal.schemas.user import (
-    TokenInfo, UserBase, UserCreate, UserSchema
+    ProvisionedUsersSchema,
+    RejectedUserSchema,
+    TokenInfo,
+    UserBase,
+    UserCreate,
+    UserSchema
 )
 from app.internal.schemas.invoice import (
+    ImportedInvoiceCreate,
+    IngestedInvoiceSchema,
+    InvoiceChangesSchema,
     InvoiceCreate,
     InvoiceSchema,
     InvoiceProductAssociationCreate,
     InvoiceProductAssociationSchema,
     InvoicesSchema)
+from app.internal.schemas.job import JobSchema
+from app.internal.schemas.profile import ProfileSchema
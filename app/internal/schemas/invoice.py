@@ -1,16 +1,10 @@
 from datetime import datetime
-from typing import Annotated
 
-from pydantic import (
-    AfterValidator,
-    BaseModel,
-    NonNegativeFloat,
-    NonNegativeInt)
+from pydantic import BaseModel, NonNegativeInt
 
 from app.internal.schemas import (
     PaymentCreate, PaymentSchema, ProductCreate, UserSchema)
-
-total_round = lambda value: round(value, 2)
+from app.utils.money import Money
 
 
 class InvoiceProductAssociationCreate(ProductCreate):
@@ -18,8 +12,9 @@ class InvoiceProductAssociationCreate(ProductCreate):
 
 
 class InvoiceProductAssociationSchema(InvoiceProductAssociationCreate):
-    unit_price: Annotated[NonNegativeFloat, AfterValidator(total_round)]
-    total: Annotated[NonNegativeFloat, AfterValidator(total_round)]
+    price: Money
+    unit_price: Money
+    total: Money
 
 
 class InvoiceCreate(BaseModel):
@@ -27,16 +22,30 @@ class InvoiceCreate(BaseModel):
     payment: PaymentCreate | None
     
 
+class ImportedInvoiceCreate(InvoiceCreate):
+    payment: PaymentCreate
+    created_at: datetime
+
+
 class InvoiceSchema(BaseModel):
     id: int
     products: list[InvoiceProductAssociationSchema]
     payment: PaymentSchema | None
-    total: Annotated[NonNegativeFloat, AfterValidator(total_round)]
-    rest: Annotated[NonNegativeFloat, AfterValidator(total_round)]
+    total: Money
+    rest: Money
     created_at: datetime
     created_by: UserSchema
 
 
+class IngestedInvoiceSchema(BaseModel):
+    id: int
+    lines: NonNegativeInt
+    products: NonNegativeInt
+    total: Money
+    rest: Money
+    created_at: datetime
+
+
 class PaginationInfo(BaseModel):
     current_page: NonNegativeInt = 0
     limit: NonNegativeInt | None
@@ -45,3 +54,9 @@ class PaginationInfo(BaseModel):
 
 class InvoicesSchema(PaginationInfo):
     invoices: list[InvoiceSchema]
+
+
+class InvoiceChangesSchema(BaseModel):
+    invoices: list[InvoiceSchema]
+    next_cursor: NonNegativeInt
+    has_more: bool
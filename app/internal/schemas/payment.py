@@ -1,12 +1,15 @@
 from typing import Literal
 
-from pydantic import BaseModel, NonNegativeFloat
+from pydantic import BaseModel
+
+from app.utils.money import Money, MoneyInput
 
 
 class PaymentCreate(BaseModel):
     type: Literal["cash", "cashless"]
-    amount: NonNegativeFloat
+    amount: MoneyInput
 
 
 class PaymentSchema(PaymentCreate):
     id: int
+    amount: Money
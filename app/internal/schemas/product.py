@@ -1,11 +1,19 @@
-from pydantic import BaseModel, NonNegativeFloat
+from pydantic import BaseModel
+
+from app.utils.money import Money, MoneyInput
 
 
 class ProductCreate(BaseModel):
     name: str
-    price: NonNegativeFloat
+    price: MoneyInput
     description: str | None = None
 
 
 class ProductSchema(ProductCreate):
     id: int
+    price: Money
+
+
+class ProductsSearchSchema(BaseModel):
+    products: list[ProductSchema]
+    next_cursor: str | None = None
@@ -0,0 +1,10 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class ProfileSchema(BaseModel):
+    name: str
+    size: int
+    created_at: datetime
+    url: str
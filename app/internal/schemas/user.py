@@ -29,3 +29,14 @@ class UserSchema(UserBase):
 class TokenInfo(BaseModel):
     access_token: str
     token_type: str = "Bearer"
+
+
+class RejectedUserSchema(BaseModel):
+    row: int
+    login: str | None
+    detail: str
+
+
+class ProvisionedUsersSchema(BaseModel):
+    created: list[UserSchema]
+    rejected: list[RejectedUserSchema]
@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from dataclasses import dataclass, field
+
+from app.utils.metrics import metrics
+
+queue_depth = metrics.gauge(
+    "admission_queue_depth",
+    "Requests waiting for a slot to be executed",
+    ("class",))
+in_flight_requests = metrics.gauge(
+    "admission_in_flight_requests",
+    "Requests being executed",
+    ("class",))
+shed_requests = metrics.counter(
+    "admission_shed_requests_total",
+    "Requests rejected without execution",
+    ("class", "reason"))
+queue_wait_seconds = metrics.counter(
+    "admission_queue_wait_seconds_total",
+    "Time requests spent waiting in queue",
+    ("class",))
+admitted_requests = metrics.counter(
+    "admission_admitted_requests_total",
+    "Requests admitted to be executed",
+    ("class",))
+
+
+class Overloaded(Exception):
+    """Request is rejected, the client should retry after a while"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class AdmissionClass:
+    """
+    Requests limited together. Waiting requests of a class with
+    lower `priority` value are always admitted before others
+    """
+    name: str
+    priority: int
+    concurrency: int
+    queue_size: int
+    queue_timeout: float
+
+    @property
+    def retry_after(self):
+        return max(1, math.ceil(self.queue_timeout))
+
+
+@dataclass(order=True)
+class Waiter:
+    priority: int
+    sequence: int
+    admission_class: AdmissionClass = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class AdmissionController:
+    """
+    Limits requests executed concurrently in total and per class.
+    Others wait for a slot in a priority queue. Request is rejected
+    at once if the queue of its class is full or its wait is estimated
+    to be longer than `queue_timeout`, otherwise after the timeout
+    """
+
+    def __init__(
+            self,
+            max_concurrency: int,
+            classes: tuple[AdmissionClass, ...],
+            service_time_decay: float = 0.1
+        ):
+        self.max_concurrency = max_concurrency
+        self.classes = {
+            admission_class.name: admission_class
+            for admission_class in classes}
+        self.service_time_decay = service_time_decay
+        # Exponential moving average of request execution time
+        self.service_time = 0.0
+        self.in_flight = dict.fromkeys(self.classes, 0)
+        self.queued = dict.fromkeys(self.classes, 0)
+        self.__waiters: list[Waiter] = list()
+        self.__sequence = itertools.count()
+
+    def __can_start(self, admission_class: AdmissionClass):
+        return (
+            sum(self.in_flight.values()) < self.max_concurrency and
+            self.in_flight[admission_class.name] <
+            admission_class.concurrency)
+
+    def __estimate_wait(self, admission_class: AdmissionClass):
+        waiters_ahead = sum(
+            1 for waiter in self.__waiters
+            if waiter.priority <= admission_class.priority)
+
+        return (
+            (waiters_ahead + 1) * self.service_time / self.max_concurrency)
+
+    def __shed(self, admission_class: AdmissionClass, reason: str):
+        shed_requests.inc(admission_class.name, reason)
+        return Overloaded(reason, admission_class.retry_after)
+
+    def __start(self, admission_class: AdmissionClass):
+        self.in_flight[admission_class.name] += 1
+        in_flight_requests.set(
+            admission_class.name,
+            value=self.in_flight[admission_class.name])
+        admitted_requests.inc(admission_class.name)
+
+    def __dequeue(self, waiter: Waiter):
+        self.__waiters.remove(waiter)
+        heapq.heapify(self.__waiters)
+        self.queued[waiter.admission_class.name] -= 1
+        queue_depth.set(
+            waiter.admission_class.name,
+            value=self.queued[waiter.admission_class.name])
+
+    def __dispatch(self):
+        """Admits waiting requests in order of priority and arrival"""
+        for waiter in sorted(self.__waiters):
+            if sum(self.in_flight.values()) >= self.max_concurrency:
+                break
+
+            if (
+                    not waiter.future.done() and
+                    self.__can_start(waiter.admission_class)):
+                self.__dequeue(waiter)
+                self.__start(waiter.admission_class)
+                waiter.future.set_result(None)
+
+    async def acquire(self, class_name: str):
+        """
+        Waits for a slot to execute request of the class
+        or raises `Overloaded` exception
+        """
+        admission_class = self.classes[class_name]
+        # Waiting requests can't start, otherwise they'd be dispatched
+        if self.__can_start(admission_class):
+            self.__start(admission_class)
+            return time.monotonic()
+
+        if self.queued[class_name] >= admission_class.queue_size:
+            raise self.__shed(admission_class, "queue_full")
+
+        if (
+                self.__estimate_wait(admission_class) >
+                admission_class.queue_timeout):
+            raise self.__shed(admission_class, "queue_budget")
+
+        waiter = Waiter(
+            admission_class.priority,
+            next(self.__sequence),
+            admission_class,
+            asyncio.get_running_loop().create_future())
+        heapq.heappush(self.__waiters, waiter)
+        self.queued[class_name] += 1
+        queue_depth.set(class_name, value=self.queued[class_name])
+        queued_at = time.monotonic()
+        try:
+            async with asyncio.timeout(admission_class.queue_timeout):
+                await waiter.future
+        except TimeoutError:
+            # Admitted just before the timeout
+            if not waiter.future.cancelled():
+                return time.monotonic()
+
+            self.__dequeue(waiter)
+            raise self.__shed(admission_class, "queue_timeout")
+        except asyncio.CancelledError:
+            if waiter.future.cancelled():
+                self.__dequeue(waiter)
+            else:
+                self.release(class_name)
+            raise
+        finally:
+            queue_wait_seconds.inc(
+                class_name, amount=time.monotonic() - queued_at)
+
+        return time.monotonic()
+
+    def release(self, class_name: str, started_at: float | None = None):
+        """Frees the slot and passes it to the next waiting request"""
+        self.in_flight[class_name] -= 1
+        in_flight_requests.set(class_name, value=self.in_flight[class_name])
+        if started_at is not None:
+            self.service_time += self.service_time_decay * (
+                time.monotonic() - started_at - self.service_time)
+
+        self.__dispatch()
@@ -20,12 +20,17 @@ from app.internal.crud.user import get_user_by_login
 
 oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl=API_PREFIX + "/auth/jwt/login")
+# Keys are parsed once on import (i.e. in the parent process before
+# workers are forked) instead of parsing PEM text for each token
+jwt_algorithm = jwt.get_algorithm_by_name(AUTH_JWT_ALGORITHM)
+jwt_private_key = jwt_algorithm.prepare_key(AUTH_JWT_PRIVATE_KEY)
+jwt_public_key = jwt_algorithm.prepare_key(AUTH_JWT_PUBLIC_KEY)
 
 
 @logger.catch(reraise=True)
 def encode_jwt(
         payload: dict,
-        private_key: str = AUTH_JWT_PRIVATE_KEY,
+        private_key=jwt_private_key,
         algorithm: str = AUTH_JWT_ALGORITHM,
         expire_minutes: int = AUTH_JWT_ACCESS_TOKEN_EXPIRE_MINUTES,
         expire_timedelta: timedelta | None = None
@@ -45,7 +50,7 @@ def encode_jwt(
 @logger.catch(reraise=True)
 def decode_jwt(
         token: str,
-        public_key: str = AUTH_JWT_PUBLIC_KEY,
+        public_key=jwt_public_key,
         algorithm: str = AUTH_JWT_ALGORITHM
     ):
     """Decodes data from JWT token"""
@@ -90,8 +95,7 @@ def get_current_token_payload(token: str = Depends(oauth2_scheme)):
 async def validate_auth_user(
         username: str = Form(),
         password: SecretStr = Form(),
-        session: AsyncSession = Depends(
-            db_helper.scoped_session_dependency)
+        session: AsyncSession = Depends(db_helper.session_dependency)
     ):
     """
     Checks username and password entered by user.
@@ -101,7 +105,6 @@ async def validate_auth_user(
     if logged_user and validate_password(password, logged_user.password):
         return logged_user
 
-    await session.close()
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid login or password")
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Literal
+
+import aiosqlite
+from loguru import logger
+
+from app.utils.periodic_jobs import delete_files_older_than
+
+JobStatus = Literal["queued", "running", "done", "failed"]
+
+
+@dataclass(frozen=True)
+class Job:
+    kind: str
+    owner_id: int
+    params: dict
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = "queued"
+    created_at: datetime = field(default_factory=datetime.now)
+    finished_at: datetime | None = None
+    error: str | None = None
+    file_name: str | None = None
+
+
+class MemoryJobStore:
+    """Jobs of this process, they are lost on restart"""
+
+    def __init__(self):
+        self.__jobs: dict[str, Job] = dict()
+
+    async def save(self, job: Job):
+        self.__jobs[job.id] = job
+
+    async def get(self, job_id: str):
+        return self.__jobs.get(job_id)
+
+    async def delete_finished_before(self, moment: datetime):
+        for job in list(self.__jobs.values()):
+            if job.finished_at is not None and job.finished_at < moment:
+                del self.__jobs[job.id]
+
+
+class SQLiteJobStore:
+    """Jobs in a local SQLite file, shared by workers of the host"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.__is_prepared = False
+
+    async def __connect(self):
+        if not self.__is_prepared:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        connection = await aiosqlite.connect(self.path)
+        if not self.__is_prepared:
+            await connection.execute(
+                "CREATE TABLE IF NOT EXISTS job "
+                "(id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            self.__is_prepared = True
+
+        return connection
+
+    async def save(self, job: Job):
+        async with await self.__connect() as connection:
+            await connection.execute(
+                "INSERT OR REPLACE INTO job (id, data) VALUES (?, ?)",
+                (job.id, json.dumps(asdict(job), default=str)))
+            await connection.commit()
+
+    async def get(self, job_id: str):
+        async with await self.__connect() as connection:
+            async with connection.execute(
+                    "SELECT data FROM job WHERE id = ?",
+                    (job_id,)) as cursor:
+                row = await cursor.fetchone()
+
+        if row is None:
+            return None
+
+        data = json.loads(row[0])
+        for date_field in ("created_at", "finished_at"):
+            if data[date_field] is not None:
+                data[date_field] = datetime.fromisoformat(data[date_field])
+
+        return Job(**data)
+
+    async def delete_finished_before(self, moment: datetime):
+        # Dates are stored as `str(datetime)`, so they compare as strings
+        async with await self.__connect() as connection:
+            await connection.execute(
+                "DELETE FROM job WHERE "
+                "json_extract(data, '$.finished_at') < ?",
+                (str(moment),))
+            await connection.commit()
+
+
+JobHandler = Callable[[Job, Path], Awaitable[None]]
+# Results are named by ids of their jobs, hex of UUID4
+RESULT_FILES_PATTERN = "[0-9a-f]" * 32 + ".*"
+
+
+class BackgroundJobRunner:
+    """
+    Runs jobs of this worker in background tasks, no more than
+    `concurrency` at a time. Handler of a job writes its result into
+    the file, which is moved into `results_dir` once it's complete
+    """
+
+    def __init__(
+            self,
+            store: MemoryJobStore | SQLiteJobStore,
+            results_dir: Path,
+            concurrency: int
+        ):
+        self.store = store
+        self.results_dir = results_dir
+        self.__semaphore = asyncio.Semaphore(concurrency)
+        self.__tasks: set[asyncio.Task] = set()
+
+    def get_result_path(self, job: Job):
+        return self.results_dir / job.file_name
+
+    async def submit(
+            self,
+            kind: str,
+            owner_id: int,
+            params: dict,
+            handler: JobHandler
+        ):
+        """Saves the job as queued and schedules it"""
+        job = Job(kind, owner_id, params)
+        await self.store.save(job)
+        task = asyncio.create_task(self.__run(job, handler))
+        self.__tasks.add(task)
+        task.add_done_callback(self.__tasks.discard)
+
+        return job
+
+    async def __write_result(self, job: Job, handler: JobHandler):
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        file_name = f"{job.id}.{job.kind}"
+        partial_path = self.results_dir / f"{file_name}.partial"
+        try:
+            await handler(job, partial_path)
+            partial_path.rename(self.results_dir / file_name)
+        finally:
+            partial_path.unlink(missing_ok=True)
+
+        return file_name
+
+    async def __run(self, job: Job, handler: JobHandler):
+        try:
+            async with self.__semaphore:
+                job = replace(job, status="running")
+                await self.store.save(job)
+                file_name = await self.__write_result(job, handler)
+        except BaseException as exc:
+            logger.opt(exception=exc).error(f"Job {job.id} failed")
+            is_cancelled = isinstance(exc, asyncio.CancelledError)
+            await self.store.save(replace(
+                job,
+                status="failed",
+                finished_at=datetime.now(),
+                error=(
+                    "Interrupted" if is_cancelled
+                    else "Failed to generate the result")))
+            if is_cancelled:
+                raise
+        else:
+            await self.store.save(replace(
+                job,
+                status="done",
+                finished_at=datetime.now(),
+                file_name=file_name))
+
+    async def purge_expired(self, max_age: timedelta):
+        """
+        Deletes jobs finished earlier than `max_age` ago with their
+        results, also results left by jobs of restarted workers
+        """
+        await self.store.delete_finished_before(datetime.now() - max_age)
+        await asyncio.to_thread(
+            delete_files_older_than,
+            self.results_dir,
+            max_age,
+            RESULT_FILES_PATTERN)
+
+    async def shutdown(self):
+        """Cancels running and queued jobs of this worker"""
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
@@ -0,0 +1,101 @@
+import gzip
+import zlib
+from collections import OrderedDict
+from collections.abc import AsyncIterable, Hashable, Iterable
+from dataclasses import dataclass
+
+from fastapi import Request, Response
+from loguru import logger
+
+from app.config import GZIP_COMPRESS_LEVEL, GZIP_MINIMUM_SIZE
+
+
+@logger.catch(reraise=True)
+def accepts_gzip(request: Request):
+    """Checks whether the client is able to decode gzip responses"""
+    return "gzip" in request.headers.get("Accept-Encoding", "")
+
+
+async def gzip_stream(
+        chunks: AsyncIterable[bytes | str],
+        compresslevel: int = GZIP_COMPRESS_LEVEL
+    ):
+    """
+    Compresses streamed chunks into a single gzip member.
+    Every chunk is sync-flushed, so the client
+    can decode it as soon as it arrives
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+
+        compressed = compressor.compress(chunk)
+        compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if compressed:
+            yield compressed
+
+    yield compressor.flush()
+
+
+@dataclass(frozen=True, slots=True)
+class PrecompressedBody:
+    body: bytes
+    gzipped_body: bytes | None = None
+
+    @classmethod
+    def from_text(
+            cls,
+            text: str,
+            minimum_size: int = GZIP_MINIMUM_SIZE,
+            compresslevel: int = GZIP_COMPRESS_LEVEL
+        ):
+        body = text.encode()
+        if len(body) < minimum_size:
+            return cls(body)
+
+        return cls(body, gzip.compress(body, compresslevel))
+
+    def to_response(self, media_type: str, gzip_accepted: bool):
+        """
+        Returns the stored gzip variant as is if the client accepts it.
+        `Content-Encoding` header makes compression middleware skip it
+        """
+        if gzip_accepted and self.gzipped_body is not None:
+            return Response(
+                self.gzipped_body,
+                media_type=media_type,
+                headers={
+                    "Content-Encoding": "gzip",
+                    "Vary": "Accept-Encoding"})
+
+        return Response(self.body, media_type=media_type)
+
+
+class PrecompressedBodyCache:
+    """LRU cache of immutable response bodies kept with gzip variants"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.__bodies: OrderedDict[Hashable, PrecompressedBody] = (
+            OrderedDict())
+
+    def get(self, key: Hashable):
+        body = self.__bodies.get(key)
+        if body is not None:
+            self.__bodies.move_to_end(key)
+
+        return body
+
+    def set(self, key: Hashable, text: str):
+        body = PrecompressedBody.from_text(text)
+        if self.max_size > 0:
+            self.__bodies[key] = body
+            if len(self.__bodies) > self.max_size:
+                self.__bodies.popitem(last=False)
+
+        return body
+
+    def invalidate(self, keys: Iterable[Hashable]):
+        for key in keys:
+            self.__bodies.pop(key, None)
@@ -0,0 +1,149 @@
+import asyncio
+from collections import deque
+from contextlib import contextmanager
+
+from loguru import logger
+
+from app.utils.metrics import metrics
+
+subscribers = metrics.gauge(
+    "events_subscribers", "Connections waiting for events of this worker")
+dropped_events = metrics.counter(
+    "events_dropped_total", "Events dropped for slow subscribers")
+
+
+class Subscription:
+    """
+    Bounded queue of events of a subscriber. If the subscriber
+    doesn't keep up, the oldest events are dropped and counted
+    """
+
+    def __init__(self, max_size: int):
+        self.__events: deque[str] = deque(maxlen=max_size)
+        self.__ready = asyncio.Event()
+        self.dropped = 0
+
+    def put(self, event: str):
+        if len(self.__events) == self.__events.maxlen:
+            self.dropped += 1
+            dropped_events.inc()
+
+        self.__events.append(event)
+        self.__ready.set()
+
+    async def get(self):
+        while not self.__events:
+            self.__ready.clear()
+            await self.__ready.wait()
+
+        return self.__events.popleft()
+
+    def take_dropped(self):
+        """Returns the number of events dropped since the last call"""
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class EventHub:
+    """Fan-out of events to subscribers of a channel in this process"""
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.__channels: dict[str, set[Subscription]] = dict()
+
+    @contextmanager
+    def subscribe(self, channel: str):
+        subscription = Subscription(self.queue_size)
+        self.__channels.setdefault(channel, set()).add(subscription)
+        subscribers.inc()
+        try:
+            yield subscription
+        finally:
+            subscribers.dec()
+            channel_subscriptions = self.__channels[channel]
+            channel_subscriptions.discard(subscription)
+            if not channel_subscriptions:
+                del self.__channels[channel]
+
+    def dispatch(self, channel: str, event: str):
+        for subscription in self.__channels.get(channel, ()):
+            subscription.put(event)
+
+
+class MemoryEventBroker:
+    """Events are delivered only to subscribers of the same worker"""
+
+    def __init__(self, queue_size: int):
+        self.hub = EventHub(queue_size)
+
+    def subscribe(self, channel: str):
+        return self.hub.subscribe(channel)
+
+    async def publish(self, channel: str, event: str):
+        self.hub.dispatch(channel, event)
+
+    async def close(self):
+        pass
+
+
+class RedisEventBroker:
+    """
+    Events are published to Redis (or any server speaking its
+    protocol) and each worker dispatches them to its own subscribers
+    from a single pattern subscription
+    """
+
+    def __init__(self, client, queue_size: int, prefix: str = "events:"):
+        self.client = client
+        self.hub = EventHub(queue_size)
+        self.prefix = prefix
+        self.__listener: asyncio.Task | None = None
+
+    @classmethod
+    def from_url(cls, url: str, queue_size: int):
+        try:
+            from redis import asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError(
+                "Package `redis` is required for Redis event broker"
+            ) from exc
+
+        return cls(redis.from_url(url), queue_size)
+
+    async def __listen(self):
+        pubsub = self.client.pubsub()
+        await pubsub.psubscribe(f"{self.prefix}*")
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "pmessage":
+                    continue
+
+                channel = message["channel"]
+                event = message["data"]
+                if isinstance(channel, bytes):
+                    channel, event = channel.decode(), event.decode()
+
+                self.hub.dispatch(channel.removeprefix(self.prefix), event)
+        finally:
+            await pubsub.aclose()
+
+    def subscribe(self, channel: str):
+        if self.__listener is None or self.__listener.done():
+            self.__listener = asyncio.create_task(self.__listen())
+            self.__listener.add_done_callback(self.__log_failure)
+
+        return self.hub.subscribe(channel)
+
+    @staticmethod
+    def __log_failure(listener: asyncio.Task):
+        if not listener.cancelled() and listener.exception() is not None:
+            logger.opt(exception=listener.exception()).error(
+                "Listener of events failed, it restarts with a subscriber")
+
+    async def publish(self, channel: str, event: str):
+        await self.client.publish(f"{self.prefix}{channel}", event)
+
+    async def close(self):
+        if self.__listener is not None:
+            self.__listener.cancel()
+            await asyncio.gather(self.__listener, return_exceptions=True)
@@ -0,0 +1,29 @@
+import json
+import zlib
+
+from loguru import logger
+
+from app.config import INVOICE_ARCHIVE_COMPRESS_LEVEL
+from app.internal.schemas import InvoiceSchema, UserSchema
+
+
+@logger.catch(reraise=True)
+def pack_invoices(invoices: list[InvoiceSchema]):
+    """
+    Serializes invoices of the same owner into compressed JSON.
+    Money is kept in cents and the owner isn't repeated in each one
+    """
+    data = json.dumps(
+        [invoice.model_dump(exclude={"created_by"}) for invoice in invoices],
+        default=str,
+        separators=(",", ":"))
+
+    return zlib.compress(data.encode(), INVOICE_ARCHIVE_COMPRESS_LEVEL)
+
+
+@logger.catch(reraise=True)
+def unpack_invoices(data: bytes, owner: UserSchema):
+    """Restores invoices packed by `pack_invoices`"""
+    return [
+        InvoiceSchema(created_by=owner, **invoice)
+        for invoice in json.loads(zlib.decompress(data))]
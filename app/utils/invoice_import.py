@@ -0,0 +1,127 @@
+import csv
+import json
+from collections import OrderedDict
+from typing import BinaryIO
+
+# Columns of invoice line in CSV, optional ones may be left empty
+CSV_LINE_FIELDS = ("name", "price", "quantity", "description")
+
+
+class ProductIdsCache:
+    """
+    Ids of products by name and price. The least recently used ones
+    are evicted, so memory doesn't grow with the number of products
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.__ids: OrderedDict[tuple, int] = OrderedDict()
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def get(self, key: tuple):
+        product_id = self.__ids.get(key)
+        if product_id is not None:
+            self.__ids.move_to_end(key)
+
+        return product_id
+
+    def update(self, product_ids: dict[tuple, int]):
+        for key, product_id in product_ids.items():
+            self.__ids[key] = product_id
+            self.__ids.move_to_end(key)
+
+        while len(self.__ids) > self.max_size:
+            self.__ids.popitem(last=False)
+
+
+def iter_file_lines(file: BinaryIO, position: int):
+    """Yields lines of the file from the position with positions after them"""
+    file.seek(position)
+    for line in file:
+        position += len(line)
+        yield position, line
+
+
+def iter_ndjson_invoices(file: BinaryIO, position: int, lines: int):
+    """
+    Yields invoices of NDJSON file, an invoice per line, with
+    numbers of their first and last lines and position after them.
+    Invoices, which aren't valid JSON, are yielded as `None`
+    """
+    for position, line in iter_file_lines(file, position):
+        lines += 1
+        if not line.strip():
+            continue
+
+        try:
+            invoice = json.loads(line)
+        except ValueError:
+            invoice = None
+
+        yield lines, lines, position, invoice
+
+
+def iter_csv_invoices(file: BinaryIO, position: int, lines: int):
+    """
+    Yields invoices of CSV file with a row per invoice line, like
+    `iter_ndjson_invoices`. Consecutive rows with the same `invoice`
+    column make an invoice, its columns `created_at`, `payment_type`
+    and `payment_amount` are taken from the first row
+    """
+    file.seek(0)
+    header = file.readline()
+    fields = next(csv.reader([header.decode("utf-8-sig")]))
+    if position < len(header):
+        position, lines = len(header), 1
+
+    invoice_key = invoice = None
+    first_line = last_line = lines
+    for line_end, line in iter_file_lines(file, position):
+        lines += 1
+        if not line.strip():
+            continue
+
+        row = dict(zip(fields, next(csv.reader([line.decode()]))))
+        if invoice is None or row.get("invoice") != invoice_key:
+            if invoice is not None:
+                yield first_line, last_line, position, invoice
+
+            invoice_key, first_line = row.get("invoice"), lines
+            invoice = dict(
+                created_at=row.get("created_at"),
+                payment=dict(
+                    type=row.get("payment_type"),
+                    amount=row.get("payment_amount")),
+                products=list())
+
+        invoice["products"].append({
+            field: row[field] for field in CSV_LINE_FIELDS if row.get(field)})
+        last_line, position = lines, line_end
+
+    if invoice is not None:
+        yield first_line, last_line, position, invoice
+
+
+def iter_invoice_batches(
+        file: BinaryIO,
+        is_csv: bool,
+        size: int,
+        position: int = 0,
+        lines: int = 0
+    ):
+    """
+    Reads invoices of the file from the position (`lines` are already
+    read before it) in batches of no more than `size` invoices
+    """
+    iter_invoices = iter_csv_invoices if is_csv else iter_ndjson_invoices
+    batch = list()
+    for invoice in iter_invoices(file, position, lines):
+        batch.append(invoice)
+        if len(batch) >= size:
+            yield batch
+            batch = list()
+
+    if batch:
+        yield batch
@@ -0,0 +1,103 @@
+from collections import defaultdict
+from collections.abc import Callable
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            label_names: tuple[str, ...] = ()
+        ):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.values: defaultdict[tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, *label_values: str, amount: float = 1):
+        self.values[label_values] += amount
+
+    def get(self, *label_values: str):
+        return self.values.get(label_values, 0)
+
+    def samples(self):
+        return self.values.items()
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            label_names: tuple[str, ...] = (),
+            callback: Callable[[], float] | None = None
+        ):
+        super().__init__(name, description, label_names)
+        self.callback = callback
+
+    def set(self, *label_values: str, value: float):
+        self.values[label_values] = value
+
+    def dec(self, *label_values: str, amount: float = 1):
+        self.values[label_values] -= amount
+
+    def samples(self):
+        if self.callback is not None:
+            return (((), self.callback()),)
+
+        return self.values.items()
+
+
+class MetricsRegistry:
+    """In-process metrics rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.__metrics: dict[str, Counter] = dict()
+
+    def counter(
+            self,
+            name: str,
+            description: str,
+            label_names: tuple[str, ...] = ()
+        ) -> Counter:
+        return self.__metrics.setdefault(
+            name, Counter(name, description, label_names))
+
+    def gauge(
+            self,
+            name: str,
+            description: str,
+            label_names: tuple[str, ...] = (),
+            callback: Callable[[], float] | None = None
+        ) -> Gauge:
+        return self.__metrics.setdefault(
+            name, Gauge(name, description, label_names, callback))
+
+    def render(self):
+        lines = list()
+        for metric in self.__metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for label_values, value in metric.samples():
+                labels = ",".join(
+                    f'{label_name}="{label_value}"'
+                    for label_name, label_value in zip(
+                        metric.label_names, label_values))
+                lines.append(
+                    f"{metric.name}{{{labels}}} {value}" if labels
+                    else f"{metric.name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def hit_ratio(counter: Counter):
+    """Share of `hit` lookups among all ones counted by `result` label"""
+    lookups_count = sum(counter.values.values())
+    return counter.get("hit") / lookups_count if lookups_count else 0
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,49 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Annotated
+
+from pydantic import (
+    BeforeValidator, Field, PlainSerializer, WithJsonSchema
+)
+
+# Money is stored and calculated in integer minor units (cents),
+# it's converted from and to major units only at the API boundary
+MINOR_UNITS_IN_MAJOR = 100
+
+
+def to_minor_units(value):
+    """Converts amount in major units (e.g. `12.3`) into cents (`1230`)"""
+    if isinstance(value, bool) or not isinstance(
+            value, (int, float, str, Decimal)):
+        # Left for pydantic to reject with its own error
+        return value
+
+    try:
+        amount = Decimal(str(value)) * MINOR_UNITS_IN_MAJOR
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount of money «{value}»")
+
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount of money «{value}»")
+
+    return int(amount.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_major_units(value: int):
+    """Converts amount in cents into major units for JSON responses"""
+    return value / MINOR_UNITS_IN_MAJOR
+
+
+def to_decimal(value: int):
+    """Converts amount in cents into exact decimal of major units"""
+    return Decimal(value) / MINOR_UNITS_IN_MAJOR
+
+
+# Amount in cents, which is serialized to JSON in major units
+Money = Annotated[
+    int,
+    Field(ge=0),
+    PlainSerializer(to_major_units, return_type=float, when_used="json"),
+    WithJsonSchema({"type": "number", "minimum": 0})
+]
+# Amount received from user in major units and converted into cents
+MoneyInput = Annotated[Money, BeforeValidator(to_minor_units)]
@@ -0,0 +1,47 @@
+import json
+from collections.abc import AsyncIterable
+
+from fastapi import HTTPException, status
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]):
+    """
+    Splits streamed bytes into lines, keeping in memory
+    only the line being received
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+
+    if buffer:
+        yield buffer
+
+
+async def iter_ndjson_batches(chunks: AsyncIterable[bytes], size: int):
+    """
+    Yields batches of no more than `size` objects parsed from
+    non-empty lines, each one with the number of its line
+    """
+    batch = list()
+    line_number = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+
+        try:
+            batch.append((line_number, json.loads(line)))
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Line {line_number} is not a valid JSON")
+
+        if len(batch) >= size:
+            yield batch
+            batch = list()
+
+    if batch:
+        yield batch
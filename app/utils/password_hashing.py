@@ -0,0 +1,46 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+
+def hash_passwords_chunk(passwords: list[str]):
+    """Hashes passwords one by one in a process of the pool"""
+    return [
+        bcrypt.hashpw(password.encode(), bcrypt.gensalt())
+        for password in passwords]
+
+
+class PasswordHashingPool:
+    """
+    Hashes many passwords by bcrypt in parallel processes (one per
+    CPU core if `processes` is 0), while the event loop keeps serving.
+    Processes are started on the first use
+    """
+
+    def __init__(self, processes: int = 0):
+        self.processes = processes or os.cpu_count() or 1
+        self.__executor: ProcessPoolExecutor | None = None
+
+    async def hash_passwords(self, passwords: list[str]):
+        """Returns hashes in order of the passwords"""
+        if self.__executor is None:
+            self.__executor = ProcessPoolExecutor(self.processes)
+
+        # A few chunks per process even out their load
+        chunk_size = max(1, -(-len(passwords) // (self.processes * 4)))
+        loop = asyncio.get_running_loop()
+        chunks = await asyncio.gather(*(
+            loop.run_in_executor(
+                self.__executor,
+                hash_passwords_chunk,
+                passwords[start:start + chunk_size])
+            for start in range(0, len(passwords), chunk_size)))
+
+        return [hashed for chunk in chunks for hashed in chunk]
+
+    def shutdown(self):
+        if self.__executor is not None:
+            self.__executor.shutdown(cancel_futures=True)
+            self.__executor = None
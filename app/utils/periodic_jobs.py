@@ -0,0 +1,55 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from datetime import timedelta
+from pathlib import Path
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+
+async def run_periodically(
+        interval: float,
+        job: Callable[..., Awaitable],
+        session_factory: async_sessionmaker[AsyncSession] | None = None
+    ):
+    """
+    Runs maintenance job in its own session (unless there's no
+    `session_factory`) every `interval` seconds.
+    Failures are logged and do not stop subsequent runs
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if session_factory is None:
+                await job()
+                continue
+
+            async with session_factory() as session:
+                await job(session)
+        except Exception:
+            logger.exception(f"Periodic job {job.__name__} failed")
+
+
+def delete_files_older_than(
+        directory: Path, max_age: timedelta, pattern: str = "*"
+    ):
+    """
+    Deletes files matching the pattern, which weren't modified
+    for `max_age`. Returns count of deleted files
+    """
+    if not directory.is_dir():
+        return 0
+
+    expired_at = time.time() - max_age.total_seconds()
+    deleted_count = 0
+    for path in directory.glob(pattern):
+        # Other workers may delete the same files
+        try:
+            if path.is_file() and path.stat().st_mtime < expired_at:
+                path.unlink()
+                deleted_count += 1
+        except FileNotFoundError:
+            continue
+
+    return deleted_count
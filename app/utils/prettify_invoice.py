@@ -6,6 +6,7 @@ from loguru import logger
 from app.config import INVOICE_TICKET_MAX_WIDTH
 from app.internal.schemas import (
     InvoiceProductAssociationSchema, InvoiceSchema)
+from app.utils.money import to_decimal
 
 ticket_example = (
 """      ФОП Джонсонюк Борис
@@ -74,8 +75,9 @@ def products_text_formatting(
     pruducts_separator = "\n" + "-" * line_max_width + "\n"
     products_text_formatted = pruducts_separator.join(
         add_thousands_separator(product.quantity) + " x " +
-        add_thousands_separator(product.unit_price) + "\n" +
-        add_space_between(product.name, product.total, line_max_width)
+        add_thousands_separator(to_decimal(product.unit_price)) + "\n" +
+        add_space_between(
+            product.name, to_decimal(product.total), line_max_width)
         for product in products)
 
     return products_text_formatted
@@ -98,11 +100,15 @@ def invoice_to_ticket_format(invoice: InvoiceSchema):
         blocks_separator,
         products_text_formatting(invoice.products, ticket_max_width),
         blocks_separator,
-        add_space_between("СУМА", invoice.total, ticket_max_width),
         add_space_between(
-            payment_type, invoice.payment.amount, ticket_max_width
+            "СУМА", to_decimal(invoice.total), ticket_max_width),
+        add_space_between(
+            payment_type,
+            to_decimal(invoice.payment.amount),
+            ticket_max_width
         ),
-        add_space_between("Решта", invoice.rest, ticket_max_width),
+        add_space_between(
+            "Решта", to_decimal(invoice.rest), ticket_max_width),
         blocks_separator,
         invoice.created_at.strftime("%d.%m.%Y %H:%M:%S").center(33),
         "Дякуємо за покупку!".center(33)
@@ -0,0 +1,104 @@
+import cProfile
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from types import FrameType
+
+from loguru import logger
+
+
+def make_profile_name(label: str, extension: str):
+    """Unique file name, which sorts by time of the capture"""
+    safe_label = "".join(
+        char if char.isalnum() else "_" for char in label).strip("_")
+
+    return (
+        f"{datetime.now():%Y%m%d-%H%M%S-%f}-{safe_label or 'root'}"
+        f".{extension}")
+
+
+def get_frame_name(frame: FrameType):
+    code = frame.f_code
+    return f"{code.co_qualname} ({Path(code.co_filename).name})"
+
+
+def collapse_stack(frame: FrameType | None):
+    """Stack from the outermost frame, as `a;b;c` for flame graphs"""
+    names = list()
+    while frame is not None:
+        names.append(get_frame_name(frame))
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
+
+
+@logger.catch(reraise=True)
+def sample_stacks(thread_id: int, duration: float, interval: float):
+    """
+    Samples stack of the thread every `interval` seconds,
+    counting how many times each stack has been seen
+    """
+    stacks: Counter[str] = Counter()
+    finish_at = time.monotonic() + duration
+    while time.monotonic() < finish_at:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+
+        stacks[collapse_stack(frame)] += 1
+        del frame
+        time.sleep(interval)
+
+    return stacks
+
+
+@logger.catch(reraise=True)
+def write_collapsed_stacks(stacks: Counter[str], path: Path):
+    """Writes stacks in the format of `flamegraph.pl` and speedscope"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w") as file:
+        for stack, count in stacks.most_common():
+            file.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    """
+    Deterministic profiler of requests. Only one of them can be
+    profiled at a time, as a profiler covers the whole event loop
+    thread, others are skipped meanwhile
+    """
+
+    def __init__(self, results_dir: Path):
+        self.results_dir = results_dir
+        self.__lock = threading.Lock()
+
+    def start(self):
+        """Returns started profiler or None if another one is running"""
+        if not self.__lock.acquire(blocking=False):
+            return None
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool is active in the process
+            self.__lock.release()
+            return None
+
+        return profiler
+
+    def stop(self, profiler: cProfile.Profile, label: str):
+        """Saves pstats of the profiled request, returns its file name"""
+        try:
+            profiler.disable()
+        finally:
+            self.__lock.release()
+
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        file_name = make_profile_name(label, "pstats")
+        profiler.dump_stats(self.results_dir / file_name)
+
+        return file_name
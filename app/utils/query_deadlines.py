@@ -0,0 +1,30 @@
+from contextvars import ContextVar
+
+from sqlalchemy.exc import DBAPIError
+
+from app.utils.metrics import metrics
+
+# Monotonic time, by which queries of the current request must finish
+query_deadline: ContextVar[float | None] = ContextVar(
+    "query_deadline", default=None)
+
+exceeded_query_deadlines = metrics.counter(
+    "query_deadline_exceeded_total",
+    "Requests, whose queries were cancelled at the deadline of their route",
+    ("route",))
+
+# SQLSTATE of PostgreSQL statement cancelled by `statement_timeout`
+QUERY_CANCELED_SQLSTATE = "57014"
+
+
+def is_query_deadline_error(exc: Exception):
+    """
+    Statement is cancelled by `statement_timeout` on PostgreSQL
+    or interrupted by progress handler on SQLite
+    """
+    if not isinstance(exc, DBAPIError):
+        return False
+
+    return (
+        getattr(exc.orig, "sqlstate", None) == QUERY_CANCELED_SQLSTATE or
+        str(exc.orig) == "interrupted")
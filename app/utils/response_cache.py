@@ -0,0 +1,162 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+from loguru import logger
+
+
+class CacheBackend(Protocol):
+
+    async def get(self, key: str) -> bytes | None: ...
+
+    async def set(self, key: str, value: bytes, ttl: int): ...
+
+    async def incr(self, key: str) -> int: ...
+
+
+class MemoryCacheBackend:
+    """
+    LRU cache of this process. Counters are never evicted,
+    so cached values can't outlive their invalidation
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.__values: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self.__counters: dict[str, int] = dict()
+
+    async def get(self, key: str):
+        if key in self.__counters:
+            return str(self.__counters[key]).encode()
+
+        item = self.__values.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self.__values[key]
+            return None
+
+        self.__values.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        self.__values[key] = (time.monotonic() + ttl, value)
+        self.__values.move_to_end(key)
+        while len(self.__values) > self.max_size:
+            self.__values.popitem(last=False)
+
+    async def incr(self, key: str):
+        self.__counters[key] = self.__counters.get(key, 0) + 1
+        return self.__counters[key]
+
+
+class RedisCacheBackend:
+    """
+    Cache shared by all workers in Redis or any server speaking
+    its protocol. `client` is an asyncio client, e.g. `redis.asyncio`
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str):
+        try:
+            from redis import asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError(
+                "Package `redis` is required for Redis response cache"
+            ) from exc
+
+        return cls(redis.from_url(url))
+
+    async def get(self, key: str):
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await self.client.set(key, value, ex=ttl)
+
+    async def incr(self, key: str):
+        return await self.client.incr(key)
+
+
+class ResponseCache:
+    """
+    Serialized responses of each user, stored under the current
+    generation of the user. Bumping the generation invalidates all
+    responses of the user at once, old ones just expire after `ttl`.
+    Without backend nothing is cached. Errors of the backend are
+    logged and treated as misses, so its outage only slows responses
+    """
+
+    def __init__(
+            self,
+            namespace: str,
+            backend: CacheBackend | None,
+            ttl: int
+        ):
+        self.namespace = namespace
+        self.backend = backend
+        self.ttl = ttl
+
+    def __generation_key(self, owner_id: int):
+        return f"{self.namespace}:generation:{owner_id}"
+
+    async def get_generation(self, owner_id: int):
+        generation = await self.backend.get(self.__generation_key(owner_id))
+        return int(generation or 0)
+
+    def make_key(self, owner_id: int, generation: int, params: dict):
+        """Key doesn't depend on order of params and omitted ones"""
+        normalized_params = json.dumps(
+            {
+                name: value for name, value in sorted(params.items())
+                if value is not None},
+            separators=(",", ":"),
+            default=str)
+
+        return f"{self.namespace}:{owner_id}:{generation}:{normalized_params}"
+
+    async def get(self, owner_id: int, params: dict):
+        """
+        Returns the stored response and the key to store it under
+        if it's missing. The key is taken before the response is built,
+        so the one built during a write is never served after it.
+        Without the key (backend failed) the response isn't stored
+        """
+        if self.backend is None:
+            return None, None
+
+        try:
+            key = self.make_key(
+                owner_id, await self.get_generation(owner_id), params)
+
+            return await self.backend.get(key), key
+        except Exception:
+            logger.exception(f"Cached responses of {owner_id} aren't read")
+            return None, None
+
+    async def set(self, key: str | None, value: bytes):
+        if self.backend is None or key is None:
+            return
+
+        try:
+            await self.backend.set(key, value, self.ttl)
+        except Exception:
+            logger.exception("Response isn't cached")
+
+    async def invalidate(self, owner_id: int):
+        """
+        Makes responses of the user stale in O(1). If the backend fails,
+        cached ones may be served until they expire
+        """
+        if self.backend is None:
+            return
+
+        try:
+            await self.backend.incr(self.__generation_key(owner_id))
+        except Exception:
+            logger.exception(f"Cached responses of {owner_id} aren't reset")
@@ -0,0 +1,39 @@
+import bisect
+import hashlib
+
+# Invoice ids of a shard start from `shard << SHARD_ID_BITS`,
+# so the shard is known from the id itself
+SHARD_ID_BITS = 40
+
+
+def get_shard_id_offset(shard: int):
+    return shard << SHARD_ID_BITS
+
+
+def get_id_shard(object_id: int):
+    return object_id >> SHARD_ID_BITS
+
+
+def hash_key(key: str):
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest())
+
+
+class HashRing:
+    """
+    Consistent hashing of keys onto shards. Each shard owns
+    `virtual_nodes` points of the ring, so keys are spread evenly and
+    adding a shard only moves keys onto it, not between old ones
+    """
+
+    def __init__(self, shards_count: int, virtual_nodes: int = 64):
+        points = sorted(
+            (hash_key(f"{shard}:{node}"), shard)
+            for shard in range(shards_count)
+            for node in range(virtual_nodes))
+        self.__hashes = [point_hash for point_hash, _ in points]
+        self.__shards = [shard for _, shard in points]
+
+    def get_shard(self, key: str | int):
+        index = bisect.bisect(self.__hashes, hash_key(str(key)))
+        return self.__shards[index % len(self.__shards)]
@@ -0,0 +1,262 @@
+"""
+Measures memory allocated by listing, export, batch creation and
+ticket rendering of a seeded account (in a temporary SQLite database)
+with tracemalloc and compares it per row with the budgets stored in
+`memory_budgets.json`:
+
+    python -m benchmarks.memory
+    python -m benchmarks.memory --invoices 5000 --update-budgets
+
+Peak is the most memory held at once during the call, retained is
+what's still held after it. Rows are invoices, lines for tickets.
+Exits with an error if any budget is exceeded. Budgets are stored
+with sizes of the account, which are used by default
+"""
+import argparse
+import asyncio
+import gc
+import json
+import tempfile
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import func, select
+
+from app.config import INVOICE_EXPORT_CHUNK_SIZE
+from app.configuration.db_helper import DatabaseHelper
+from app.internal.crud.invoice import (
+    build_invoice_filters,
+    calculate_invoice_totals,
+    get_invoices,
+    get_pretty_invoice,
+    insert_invoices,
+    iter_invoices
+)
+from app.internal.crud.invoice_import import load_imported_invoices
+from app.internal.models import Base, Invoice, User
+from app.internal.schemas import ImportedInvoiceCreate, InvoiceCreate
+from app.utils.invoice_import import ProductIdsCache
+
+BUDGETS_PATH = Path(__file__).with_name("memory_budgets.json")
+# Budgets are set above measured usage, so noise doesn't fail them
+BUDGET_HEADROOM = 1.5
+# Allocations of caches filled on the first call aren't per row
+MIN_RETAINED_BUDGET = 64
+
+
+@dataclass(frozen=True)
+class MemoryUsage:
+    name: str
+    rows: int
+    peak: int
+    retained: int
+
+    @property
+    def peak_per_row(self):
+        return self.peak / self.rows
+
+    @property
+    def retained_per_row(self):
+        return self.retained / self.rows
+
+
+async def measure(name: str, rows: int, call):
+    """Runs the call once to fill caches, then under tracemalloc"""
+    await call()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        await call()
+        gc.collect()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return MemoryUsage(name, rows, peak, retained)
+
+
+def make_invoice_data(lines_count: int, created_at: datetime):
+    return dict(
+        created_at=created_at,
+        payment=dict(type="cash", amount=lines_count * 10),
+        products=[
+            dict(name=f"Product {line}", price=line % 9 + 1, quantity=1)
+            for line in range(lines_count)])
+
+
+async def seed_account(
+        database: DatabaseHelper,
+        invoices_count: int,
+        lines_count: int,
+        ticket_lines_count: int
+    ):
+    """
+    Creates a user with invoices of `lines_count` lines and one more
+    of `ticket_lines_count` lines. Returns the user and the last id
+    """
+    async with database.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with database.session_factory() as session:
+        user = User(name="Memory", login="memory", password=b"")
+        session.add(user)
+        await session.commit()
+
+        now = datetime.now()
+        invoices_data = [
+            make_invoice_data(lines_count, now - timedelta(seconds=index))
+            for index in range(invoices_count, 0, -1)]
+        invoices_data.append(make_invoice_data(ticket_lines_count, now))
+        invoices = list()
+        for invoice_data in invoices_data:
+            invoice_in = ImportedInvoiceCreate.model_validate(invoice_data)
+            invoices.append((invoice_in, sum(
+                product_in.price * product_in.quantity
+                for product_in in invoice_in.products)))
+
+        await load_imported_invoices(
+            session, invoices, user.id, ProductIdsCache(ticket_lines_count))
+        await session.commit()
+        ticket_id = await session.scalar(select(func.max(Invoice.id)))
+
+    return user, ticket_id
+
+
+async def run_benchmark(
+        db_url: str,
+        invoices_count: int,
+        lines_count: int,
+        ticket_lines_count: int,
+        batch_size: int
+    ):
+    database = DatabaseHelper(db_url)
+    try:
+        user, ticket_id = await seed_account(
+            database, invoices_count, lines_count, ticket_lines_count)
+        batch = [
+            InvoiceCreate.model_validate(
+                make_invoice_data(lines_count, datetime.now()))
+            for _ in range(batch_size)]
+
+        async def retrieve():
+            async with database.session_factory() as session:
+                invoices = await get_invoices(
+                    session, user.id, None, None, None, None, None,
+                    None, "exact", None, 0, None)
+                invoices.model_dump_json()
+
+        async def export():
+            async with database.session_factory() as session:
+                async for invoices in iter_invoices(
+                        session,
+                        build_invoice_filters(user.id, *[None] * 5),
+                        INVOICE_EXPORT_CHUNK_SIZE):
+                    "".join(
+                        invoice.model_dump_json() + "\n"
+                        for invoice in invoices)
+
+        async def create_batch():
+            async with database.session_factory() as session:
+                await insert_invoices(
+                    session,
+                    batch,
+                    [
+                        calculate_invoice_totals(invoice_in, user)
+                        for invoice_in in batch])
+                await session.rollback()
+
+        async def render_ticket():
+            async with database.session_factory() as session:
+                await get_pretty_invoice(session, ticket_id)
+
+        # The ticket invoice is listed and exported as well
+        return [
+            await measure("retrieve", invoices_count + 1, retrieve),
+            await measure("export", invoices_count + 1, export),
+            await measure("create_batch", batch_size, create_batch),
+            await measure("ticket", ticket_lines_count, render_ticket)]
+    finally:
+        await database.dispose()
+
+
+def load_budgets(path: Path = BUDGETS_PATH):
+    """Returns sizes of the seeded account and budgets measured with them"""
+    return json.loads(path.read_text())
+
+
+def make_budgets(sizes: dict, usages: list[MemoryUsage]):
+    return dict(
+        sizes=sizes,
+        budgets={
+            usage.name: dict(
+                peak_per_row=round(usage.peak_per_row * BUDGET_HEADROOM),
+                retained_per_row=max(
+                    MIN_RETAINED_BUDGET,
+                    round(usage.retained_per_row * BUDGET_HEADROOM)))
+            for usage in usages})
+
+
+def check_budgets(usages: list[MemoryUsage], budgets: dict):
+    """Returns descriptions of exceeded budgets"""
+    exceeded = list()
+    for usage in usages:
+        for kind in ("peak_per_row", "retained_per_row"):
+            used, budget = getattr(usage, kind), budgets[usage.name][kind]
+            if used > budget:
+                exceeded.append(
+                    f"{usage.name} {kind}: {used:.0f} B > {budget} B")
+
+    return exceeded
+
+
+def parse_args():
+    sizes = load_budgets()["sizes"]
+    parser = argparse.ArgumentParser(
+        description="Measures memory of invoice paths per row")
+    parser.add_argument(
+        "--invoices", type=int, default=sizes["invoices_count"])
+    parser.add_argument("--lines", type=int, default=sizes["lines_count"])
+    parser.add_argument(
+        "--ticket-lines", type=int, default=sizes["ticket_lines_count"])
+    parser.add_argument(
+        "--batch-size", type=int, default=sizes["batch_size"])
+    parser.add_argument(
+        "--update-budgets",
+        action="store_true",
+        help=f"store measured usage with headroom in {BUDGETS_PATH.name}")
+
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace):
+    # Export and listing keep different rows at once, so budgets per row
+    # hold only for the sizes they're measured with
+    sizes = dict(
+        invoices_count=args.invoices,
+        lines_count=args.lines,
+        ticket_lines_count=args.ticket_lines,
+        batch_size=args.batch_size)
+    with tempfile.TemporaryDirectory() as db_dir:
+        usages = await run_benchmark(
+            f"sqlite+aiosqlite:///{db_dir}/memory.sqlite3", **sizes)
+
+    print(f"{'path':<14}{'rows':>8}{'peak B/row':>14}{'retained B/row':>16}")
+    for usage in usages:
+        print(
+            f"{usage.name:<14}{usage.rows:>8}"
+            f"{usage.peak_per_row:>14.0f}{usage.retained_per_row:>16.0f}")
+
+    if args.update_budgets:
+        BUDGETS_PATH.write_text(
+            json.dumps(make_budgets(sizes, usages), indent=4) + "\n")
+        return
+
+    exceeded = check_budgets(usages, load_budgets()["budgets"])
+    if exceeded:
+        raise SystemExit("\n".join(("Memory budgets exceeded:", *exceeded)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
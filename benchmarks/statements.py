@@ -0,0 +1,128 @@
+"""
+Measures time spent per request to build and compile statements
+of invoice queries and counts distinct SQL strings they produce
+(each one is compiled and prepared by asyncpg separately):
+
+    python -m benchmarks.statements
+"""
+import random
+import time
+
+from sqlalchemy import desc, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import contains_eager, joinedload, load_only
+
+from app.internal.crud.invoice import (
+    get_products_lookup_statement, invoices_statement
+)
+from app.internal.models import (
+    Invoice, InvoiceProductAssociation, Payment, Product, User
+)
+
+REQUESTS_COUNT = 2000
+MAX_LINES_COUNT = 30
+
+
+def build_invoices_statement_per_call(where_clauses: list):
+    """`select_invoices` statement built as before caching"""
+    return (
+        select(Invoice)
+        .options(
+            load_only(Invoice.total, Invoice.rest, Invoice.created_at)
+        )
+        .join(Invoice.payment)
+        .options(
+            contains_eager(Invoice.payment)
+            .options(load_only(Payment.type, Payment.amount))
+        )
+        .options(
+            joinedload(Invoice.user_owner)
+            .options(load_only(User.name, User.login, User.password))
+        )
+        .join(Invoice.products)
+        .options(
+            contains_eager(Invoice.products)
+            .load_only(
+                InvoiceProductAssociation.quantity,
+                InvoiceProductAssociation.unit_price,
+                InvoiceProductAssociation.total
+            )
+            .joinedload(InvoiceProductAssociation.product)
+        )
+        .where(*where_clauses)
+        .order_by(desc(Invoice.created_at))
+    )
+
+
+def build_products_lookup_per_call(keys: list[tuple[str, float]]):
+    """Products lookup as variable-arity `OR` of name-price pairs"""
+    return select(Product).where(or_(
+        (Product.name == name) & (Product.price == price)
+        for name, price in keys
+    ))
+
+
+def measure(build_statement, requests: list, dialect):
+    """
+    Emulates SQLAlchemy compiled cache: statement is compiled only
+    if its cache key was not met before. Returns time per request
+    and count of distinct SQL strings
+    """
+    compiled_cache = dict()
+    started_at = time.perf_counter()
+    for request in requests:
+        stmt = build_statement(request)
+        cache_key = stmt._generate_cache_key().key
+        if cache_key not in compiled_cache:
+            compiled_cache[cache_key] = str(stmt.compile(dialect=dialect))
+
+    elapsed = time.perf_counter() - started_at
+
+    return (
+        elapsed / len(requests) * 1e6,
+        len(set(compiled_cache.values())))
+
+
+def main():
+    random.seed(0)
+    invoice_requests = [
+        [Invoice.created_by == random.randint(1, 100)]
+        for _ in range(REQUESTS_COUNT)]
+    lookup_requests = [
+        [
+            (f"product {random.randint(1, 1000)}", random.randint(1, 100))
+            for _ in range(random.randint(1, MAX_LINES_COUNT))
+        ]
+        for _ in range(REQUESTS_COUNT)]
+
+    print(f"{'dialect':<12}{'statement':<28}{'µs/request':>12}{'SQL':>6}")
+    for dialect in (postgresql.dialect(), sqlite.dialect()):
+        cases = (
+            (
+                "invoices per call",
+                build_invoices_statement_per_call,
+                invoice_requests),
+            (
+                "invoices cached",
+                lambda where_clauses: invoices_statement.where(
+                    *where_clauses),
+                invoice_requests),
+            (
+                "products lookup OR",
+                build_products_lookup_per_call,
+                lookup_requests),
+            (
+                "products lookup stable",
+                lambda _: get_products_lookup_statement(dialect.name),
+                lookup_requests)
+        )
+        for name, build_statement, requests in cases:
+            time_per_request, sql_count = measure(
+                build_statement, requests, dialect)
+            print(
+                f"{dialect.name:<12}{name:<28}"
+                f"{time_per_request:>12.1f}{sql_count:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -55,8 +55,12 @@ async def prepare_database():
 
 
 app = create_app()
-app.dependency_overrides[db_helper.scoped_session_dependency] = (
-    db_test.scoped_session_dependency)
+app.dependency_overrides[db_helper.session_dependency] = (
+    db_test.session_dependency)
+app.dependency_overrides[db_helper.session_factory_dependency] = (
+    db_test.session_factory_dependency)
+app.dependency_overrides[db_helper.router_dependency] = (
+    db_test.router_dependency)
 
 @pytest.fixture(scope="session")
 async def ac() -> AsyncGenerator[AsyncClient, None]:
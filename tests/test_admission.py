@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from starlette.responses import PlainTextResponse
+
+from app.configuration.middlewares.admission import AdmissionMiddleware
+from app.utils.admission import (
+    AdmissionClass, AdmissionController, Overloaded
+)
+
+admission_classes = (
+    AdmissionClass(
+        "critical", priority=0, concurrency=1, queue_size=2,
+        queue_timeout=1),
+    AdmissionClass(
+        "bulk", priority=2, concurrency=1, queue_size=2,
+        queue_timeout=0.05)
+)
+
+
+async def test_priority_admission():
+    controller = AdmissionController(1, admission_classes)
+    started_at = await controller.acquire("bulk")
+    admitted = list()
+
+    async def admit(class_name: str):
+        await controller.acquire(class_name)
+        admitted.append(class_name)
+
+    waiters = [
+        asyncio.create_task(admit(class_name))
+        for class_name in ("bulk", "critical")]
+    await asyncio.sleep(0)
+    assert controller.queued == {"critical": 1, "bulk": 1}
+
+    controller.release("bulk", started_at)
+    await asyncio.sleep(0)
+    # Critical request is admitted first, though it came later
+    assert admitted == ["critical"]
+
+    controller.release("critical")
+    await asyncio.gather(*waiters)
+    assert admitted == ["critical", "bulk"]
+
+
+async def test_load_shedding():
+    controller = AdmissionController(1, admission_classes)
+    await controller.acquire("critical")
+    waiters = [
+        asyncio.create_task(controller.acquire("bulk")) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(Overloaded, match="queue_full"):
+        await controller.acquire("bulk")
+
+    for result in await asyncio.gather(*waiters, return_exceptions=True):
+        assert isinstance(result, Overloaded)
+        assert result.reason == "queue_timeout"
+    assert controller.queued["bulk"] == 0
+
+    # Expected wait is longer than the timeout, so it's not queued
+    controller.service_time = 1
+    with pytest.raises(Overloaded, match="queue_budget"):
+        await controller.acquire("bulk")
+
+
+async def test_admission_middleware():
+    release_response = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await release_response.wait()
+        await PlainTextResponse("OK")(scope, receive, send)
+
+    async with AsyncClient(
+            transport=ASGITransport(AdmissionMiddleware(
+                app,
+                max_concurrency=1,
+                classes=admission_classes,
+                routes=(("GET", "/export", "bulk"),))),
+            base_url="http://test"
+        ) as ac:
+        requests = [
+            asyncio.create_task(ac.get("/export")) for _ in range(4)]
+        await asyncio.sleep(0.1)
+        release_response.set()
+        responses = await asyncio.gather(*requests)
+        # Not limited route
+        assert (await ac.get("/")).status_code == 200
+
+    assert [response.status_code for response in responses].count(200) == 1
+    for response in responses:
+        if response.status_code == 503:
+            assert response.headers["retry-after"] == "1"
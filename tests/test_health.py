@@ -0,0 +1,28 @@
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app.configuration.statement_metrics import compiled_cache_lookups
+from app.configuration.warmup import WARMUP_OWNER_ID, warm_up
+from app.internal.crud.invoice import get_invoice_changes
+from tests.conftest import app, db_test
+
+
+async def test_readiness_after_warm_up(monkeypatch: pytest.MonkeyPatch):
+    async with AsyncClient(
+            transport=ASGITransport(app), base_url="http://test") as client:
+        response = await client.get("/health/live")
+        assert response.status_code == 200
+
+        response = await client.get("/health/ready")
+        assert response.status_code == 503
+
+        assert await warm_up(db_test) >= 0
+        monkeypatch.setattr(app.state, "is_ready", True, raising=False)
+        response = await client.get("/health/ready")
+        assert response.status_code == 200
+
+    # Statements of the first requests are already compiled
+    hits = compiled_cache_lookups.get("hit")
+    async with db_test.session_factory() as session:
+        await get_invoice_changes(session, WARMUP_OWNER_ID, 0, 1)
+    assert compiled_cache_lookups.get("hit") > hits
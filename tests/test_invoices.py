@@ -1,9 +1,22 @@
-from datetime import datetime
+import asyncio
+import json
+from datetime import datetime, timedelta
 from pprint import pprint
 
+from fastapi import HTTPException
 from httpx import AsyncClient, Headers
+from sqlalchemy import Engine, event, select
 
 from app.config import API_PREFIX
+from app.internal.crud.idempotency import purge_expired_idempotency_keys
+from app.internal.crud.invoice_batching import InvoiceWriteCoalescer
+from app.internal.crud.user import get_user_by_login
+from app.internal.crud.invoice_import import reserve_invoice_ids
+from app.internal.models import (
+    IdempotencyKey, Invoice, InvoiceProductAssociation, Payment, Product
+)
+from app.internal.schemas import InvoiceCreate, InvoiceSchema
+from tests.conftest import db_test
 
 test_invoices = [
     {
@@ -148,3 +161,266 @@ async def test_public_invoice_not_found(ac: AsyncClient):
     response = await ac.get(API_PREFIX + f"/invoice/{invoice_id}")
     pprint(response.json())
     assert response.status_code == 404
+
+
+async def test_compressed_invoices_listing(
+        ac: AsyncClient, headers: Headers
+    ):
+    response = await ac.get(
+        API_PREFIX + "/invoice/retrieve",
+        headers={**headers, "Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert len(response.json()["invoices"]) == len(test_invoices)
+
+
+async def test_export_invoices(ac: AsyncClient, headers: Headers):
+    for accept_encoding in ("gzip", "identity"):
+        response = await ac.get(
+            API_PREFIX + "/invoice/export",
+            headers={**headers, "Accept-Encoding": accept_encoding},
+            params=dict(payment_type="cash"))
+
+        exported_invoices = [
+            json.loads(line) for line in response.text.splitlines()]
+        assert response.status_code == 200
+        assert (
+            response.headers.get("content-encoding") ==
+            (accept_encoding if accept_encoding == "gzip" else None))
+        assert len(exported_invoices) == 3
+        assert all(
+            invoice["payment"]["type"] == "cash"
+            for invoice in exported_invoices)
+
+
+async def test_idempotent_invoice_creation(
+        ac: AsyncClient, headers: Headers
+    ):
+    invoice = test_invoices[1]
+    idempotency_headers = {**headers, "Idempotency-Key": "retry-1"}
+    responses = await asyncio.gather(*(
+        ac.post(
+            API_PREFIX + "/invoice/create",
+            headers=idempotency_headers,
+            json=invoice)
+        for _ in range(3)))
+    responses.append(await ac.post(
+        API_PREFIX + "/invoice/create",
+        headers=idempotency_headers,
+        json=invoice))
+
+    assert all(response.status_code == 201 for response in responses)
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert sum(
+        "idempotent-replayed" in response.headers
+        for response in responses) == len(responses) - 1
+
+    response = await ac.post(
+        API_PREFIX + "/invoice/create",
+        headers=idempotency_headers,
+        json=test_invoices[2])
+    pprint(response.json())
+    assert response.status_code == 422
+
+
+async def test_purge_expired_idempotency_keys():
+    async with db_test.session_factory() as session:
+        purged_count = await purge_expired_idempotency_keys(
+            session, ttl=timedelta(0), batch_size=1)
+
+        assert purged_count == 1
+        assert not (await session.scalars(select(IdempotencyKey))).all()
+
+
+async def test_invoice_write_coalescer(headers: Headers):
+    coalescer = InvoiceWriteCoalescer(
+        db_test.session_factory, window=0.05, max_size=len(test_invoices))
+    commits = list()
+    count_commit = lambda conn: commits.append(conn)
+    event.listen(db_test.engine.sync_engine, "commit", count_commit)
+    try:
+        async with db_test.session_factory() as session:
+            user = await get_user_by_login(session, "test")
+
+        invoices_in = [
+            InvoiceCreate.model_validate(invoice)
+            for invoice in test_invoices[1:]]
+        # Payment amount of this one is less than total
+        invoices_in.insert(1, InvoiceCreate.model_validate(
+            test_invoices[3] | {"payment": test_invoices[1]["payment"]}))
+        results = await asyncio.gather(
+            *(
+                coalescer.submit(invoice_in, user)
+                for invoice_in in invoices_in),
+            return_exceptions=True)
+    finally:
+        event.remove(db_test.engine.sync_engine, "commit", count_commit)
+
+    pprint(results)
+    assert isinstance(results.pop(1), HTTPException)
+    assert all(isinstance(result, InvoiceSchema) for result in results)
+    assert len({result.id for result in results}) == len(results)
+    assert len(commits) == 1
+
+
+async def test_exact_money_totals(ac: AsyncClient, headers: Headers):
+    invoice = {
+        "products": [
+            {"name": "Tea", "price": 0.1, "quantity": 3},
+            {"name": "Sugar", "price": 0.2}
+        ],
+        # Equals total exactly, though 0.1 * 3 + 0.2 > 0.5 in floats
+        "payment": {"type": "cash", "amount": 0.5}
+    }
+    for _ in range(2):
+        response = await ac.post(
+            API_PREFIX + "/invoice/create", headers=headers, json=invoice)
+
+        pprint(response.json())
+        assert response.status_code == 201
+        assert response.json()["total"] == 0.5
+        assert response.json()["rest"] == 0
+
+    async with db_test.session_factory() as session:
+        tea_products = (await session.scalars(
+            select(Product).where(Product.name == "Tea"))).all()
+    # Saved product is found by its price and reused
+    assert [product.price for product in tea_products] == [10]
+
+    response = await ac.get(
+        API_PREFIX + f"/invoice/{response.json()['id']}")
+    assert "0.50" in response.text
+
+
+async def test_invoice_creation_statements_count(
+        ac: AsyncClient, headers: Headers
+    ):
+    statements_counts = list()
+    for lines_count in (1, 5):
+        statements = list()
+        count_statement = (
+            lambda conn, cursor, statement, *args:
+            statements.append(statement))
+        event.listen(Engine, "before_cursor_execute", count_statement)
+        try:
+            response = await ac.post(
+                API_PREFIX + "/invoice/create",
+                headers=headers,
+                json={
+                    "products": [
+                        {
+                            "name": f"Pen {lines_count}.{line}",
+                            "price": 1,
+                            "description": "blue" if line % 2 else None
+                        }
+                        for line in range(lines_count)
+                    ],
+                    "payment": {"type": "cash", "amount": 10}
+                })
+        finally:
+            event.remove(Engine, "before_cursor_execute", count_statement)
+
+        pprint(statements)
+        assert response.status_code == 201
+        assert [
+            product["total"] for product in response.json()["products"]
+        ] == [1] * lines_count
+        statements_counts.append(len(statements))
+
+    # User, products lookup, one insert into each of 4 tables and
+    # numbering of the invoice at commit: its ids, the clock and itself
+    assert statements_counts == [9, 9]
+
+
+async def test_invoice_changes_feed(ac: AsyncClient, headers: Headers):
+    response = await ac.get(
+        API_PREFIX + "/invoice/retrieve", headers=headers)
+    invoice_ids = sorted(
+        invoice["id"] for invoice in response.json()["invoices"])
+
+    synced_ids = list()
+    cursor, has_more = 0, True
+    while has_more:
+        response = await ac.get(
+            API_PREFIX + "/invoice/changes",
+            headers=headers,
+            params={"after": cursor, "limit": 3})
+        assert response.status_code == 200
+        changes = response.json()
+        assert len(changes["invoices"]) <= 3
+        synced_ids.extend(invoice["id"] for invoice in changes["invoices"])
+        cursor, has_more = changes["next_cursor"], changes["has_more"]
+
+    assert synced_ids == invoice_ids
+
+    # Nothing new after the last cursor
+    response = await ac.get(
+        API_PREFIX + "/invoice/changes",
+        headers=headers,
+        params={"after": cursor})
+    assert response.json() == {
+        "invoices": [], "next_cursor": cursor, "has_more": False}
+
+    if db_test.engine.dialect.name == "sqlite":
+        async with db_test.engine.connect() as conn:
+            plan = (await conn.exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT id, change_seq FROM invoice "
+                "WHERE created_by = 1 AND change_seq > 0 "
+                "ORDER BY change_seq")).all()
+        assert "COVERING INDEX idx_invoice_owner_change" in plan[0][-1]
+
+
+async def test_invoice_changes_out_of_order_commits(
+        ac: AsyncClient, headers: Headers
+    ):
+    """
+    Invoice with a lower id committed after a higher one (like ids
+    reserved by an import or taken in parallel on PostgreSQL)
+    """
+    async with db_test.session_factory() as session:
+        (late_id,) = await reserve_invoice_ids(session, 1)
+        await session.commit()
+
+    response = await ac.post(
+        API_PREFIX + "/invoice/create",
+        headers=headers,
+        json={
+            "products": [{"name": "Juice", "price": 25}],
+            "payment": {"type": "cash", "amount": 25}
+        })
+    early_invoice = response.json()
+    assert early_invoice["id"] > late_id
+
+    response = await ac.get(
+        API_PREFIX + "/invoice/changes", headers=headers)
+    cursor = response.json()["next_cursor"]
+    while response.json()["has_more"]:
+        response = await ac.get(
+            API_PREFIX + "/invoice/changes",
+            headers=headers,
+            params={"after": cursor})
+        cursor = response.json()["next_cursor"]
+    assert response.json()["invoices"][-1]["id"] == early_invoice["id"]
+
+    async with db_test.session_factory() as session:
+        product_id = await session.scalar(
+            select(Product.id).where(Product.name == "Juice"))
+        session.add(Invoice(
+            id=late_id,
+            total=2500,
+            rest=0,
+            created_by=early_invoice["created_by"]["id"],
+            payment=Payment(type="cash", amount=2500),
+            products=[InvoiceProductAssociation(
+                product_id=product_id, quantity=1, unit_price=2500)]))
+        await session.commit()
+
+    response = await ac.get(
+        API_PREFIX + "/invoice/changes",
+        headers=headers,
+        params={"after": cursor})
+    changes = response.json()
+    assert [invoice["id"] for invoice in changes["invoices"]] == [late_id]
+    assert changes["next_cursor"] > cursor
@@ -0,0 +1,122 @@
+import asyncio
+import csv
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient, Headers
+
+from app.config import API_PREFIX
+from app.internal.crud import invoice_jobs
+from app.internal.crud.invoice_jobs import create_job_store
+from app.utils.background_jobs import (
+    BackgroundJobRunner, Job, MemoryJobStore, SQLiteJobStore
+)
+
+
+async def wait_for_job(ac: AsyncClient, headers: Headers, job_id: str):
+    for _ in range(100):
+        response = await ac.get(
+            API_PREFIX + f"/job/{job_id}", headers=headers)
+        assert response.status_code == 200
+        if response.json()["status"] in ("done", "failed"):
+            return response.json()
+
+        await asyncio.sleep(0.05)
+
+    raise TimeoutError(f"Job {job_id} isn't finished")
+
+
+async def test_export_job(ac: AsyncClient, headers: Headers):
+    response = await ac.post(API_PREFIX + "/job/export", headers=headers)
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+    assert response.json()["result_url"] is None
+
+    job = await wait_for_job(ac, headers, response.json()["id"])
+    assert job["status"] == "done"
+    assert job["finished_at"] is not None
+
+    response = await ac.get(job["result_url"], headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["accept-ranges"] == "bytes"
+    export = response.content
+
+    response = await ac.get(
+        API_PREFIX + "/invoice/retrieve", headers=headers)
+    assert len(export.splitlines()) == len(response.json()["invoices"])
+
+    response = await ac.get(
+        job["result_url"], headers={**headers, "Range": "bytes=10-"})
+    assert response.status_code == 206
+    assert response.content == export[10:]
+
+
+async def test_report_job(ac: AsyncClient, headers: Headers):
+    response = await ac.post(
+        API_PREFIX + "/job/report",
+        headers=headers,
+        params={"payment_type": "cashless"})
+    assert response.status_code == 202
+
+    job = await wait_for_job(ac, headers, response.json()["id"])
+    assert job["status"] == "done"
+
+    response = await ac.get(job["result_url"], headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(response.text.splitlines()))
+    assert rows[0] == ["date", "payment_type", "invoices", "total"]
+    assert {row[1] for row in rows[1:]} == {"cashless"}
+
+
+async def test_decline_job_with_invalid_filters(
+        ac: AsyncClient, headers: Headers
+    ):
+    response = await ac.post(
+        API_PREFIX + "/job/export",
+        headers=headers,
+        params={"from_created_at": "yesterday"})
+    assert response.status_code == 422
+
+
+async def test_missing_job(ac: AsyncClient, headers: Headers):
+    response = await ac.get(API_PREFIX + "/job/missing", headers=headers)
+    assert response.status_code == 404
+
+    response = await ac.get(
+        API_PREFIX + "/job/missing/result", headers=headers)
+    assert response.status_code == 404
+
+
+async def test_purge_expired_jobs(tmp_path):
+    async def write_result(job: Job, path: Path):
+        path.write_text("result")
+
+    for store in (MemoryJobStore(), SQLiteJobStore(tmp_path / "jobs.db")):
+        runner = BackgroundJobRunner(store, tmp_path, concurrency=1)
+        job = await runner.submit("txt", 1, dict(), write_result)
+        await asyncio.sleep(0.05)
+        job = await store.get(job.id)
+        assert job.status == "done"
+
+        await runner.purge_expired(timedelta(hours=1))
+        assert await store.get(job.id) is not None
+        assert runner.get_result_path(job).exists()
+
+        await runner.purge_expired(timedelta(0))
+        assert await store.get(job.id) is None
+        assert not runner.get_result_path(job).exists()
+
+    # File of the store in the directory of results isn't a result
+    assert (tmp_path / "jobs.db").exists()
+
+
+def test_job_store_of_workers(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(invoice_jobs, "BACKGROUND_JOBS_STORE", "")
+    assert isinstance(create_job_store(1), MemoryJobStore)
+    assert isinstance(create_job_store(4), SQLiteJobStore)
+
+    monkeypatch.setattr(invoice_jobs, "BACKGROUND_JOBS_STORE", "memory")
+    assert isinstance(create_job_store(4), MemoryJobStore)
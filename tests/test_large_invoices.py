@@ -0,0 +1,82 @@
+import json
+
+import pytest
+from httpx import AsyncClient, Headers
+
+from app.config import API_PREFIX
+from app.internal.routes import invoice as invoice_routes
+
+
+def make_lines(count: int):
+    return "".join(
+        json.dumps({
+            "name": f"Bolt-{number % 7}",
+            "price": 0.25,
+            "quantity": 2
+        }) + "\n"
+        for number in range(count))
+
+
+async def test_ingest_large_invoice(
+        ac: AsyncClient, headers: Headers, monkeypatch: pytest.MonkeyPatch
+    ):
+    # Duplicate lines are split between batches too
+    monkeypatch.setattr(invoice_routes, "INVOICE_INGEST_BATCH_SIZE", 10)
+
+    async def stream_lines():
+        lines = make_lines(100).encode()
+        for start in range(0, len(lines), 333):
+            yield lines[start:start + 333]
+
+    response = await ac.post(
+        API_PREFIX + "/invoice/ingest",
+        headers=headers,
+        params={"payment_type": "cashless", "payment_amount": 60},
+        content=stream_lines())
+    assert response.status_code == 201
+    invoice = response.json()
+    assert invoice["lines"] == 100
+    assert invoice["products"] == 7
+    assert invoice["total"] == 50
+    assert invoice["rest"] == 10
+
+    response = await ac.get(API_PREFIX + f"/invoice/{invoice['id']}")
+    assert response.status_code == 200
+    assert "Bolt-0" in response.text
+
+    response = await ac.get(
+        API_PREFIX + "/invoice/retrieve",
+        headers=headers,
+        params={"payment_type": "cashless", "min_total": 50})
+    (retrieved,) = [
+        item for item in response.json()["invoices"]
+        if item["id"] == invoice["id"]]
+    quantities = {
+        product["name"]: product["quantity"]
+        for product in retrieved["products"]}
+    assert quantities["Bolt-0"] == 2 * 15
+    assert sum(quantities.values()) == 200
+
+
+@pytest.mark.parametrize(
+    ("lines", "payment_amount", "detail"),
+    (
+        (make_lines(10), 1, "Payment amount (1) canʼt be less than total"),
+        ("", 1, "Invoice has no lines"),
+        ('{"name": "Bolt"}\n', 1, "Line 1: Field required"),
+        ('\n{"name": ', 1, "Line 2 is not a valid JSON")
+    ))
+async def test_decline_large_invoice(
+        ac: AsyncClient,
+        headers: Headers,
+        lines: str,
+        payment_amount: float,
+        detail: str
+    ):
+    response = await ac.post(
+        API_PREFIX + "/invoice/ingest",
+        headers=headers,
+        params={"payment_type": "cash", "payment_amount": payment_amount},
+        content=lines)
+    assert response.status_code == 422
+    assert detail in response.json()["detail"]
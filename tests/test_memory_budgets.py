@@ -0,0 +1,9 @@
+from benchmarks.memory import check_budgets, load_budgets, run_benchmark
+
+
+async def test_memory_budgets(tmp_path):
+    budgets = load_budgets()
+    usages = await run_benchmark(
+        f"sqlite+aiosqlite:///{tmp_path}/memory.sqlite3", **budgets["sizes"])
+
+    assert not check_budgets(usages, budgets["budgets"])
@@ -0,0 +1,113 @@
+import json
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from sqlalchemy import func, select
+
+from app.internal.crud.invoice_import import import_invoices
+from app.internal.models import Invoice, InvoiceProductAssociation, User
+from app.utils.invoice_import import ProductIdsCache, iter_invoice_batches
+from tests.conftest import db_test, test_users
+
+
+def test_iter_csv_invoice_batches():
+    file = BytesIO("\n".join((
+        "invoice,created_at,payment_type,payment_amount,name,price,quantity",
+        "A1,2020-01-02T10:00:00,cash,10,Tea,2,2",
+        "A1,,,,Coffee,3,",
+        "",
+        "A2,2020-01-03T10:00:00,cashless,5,Tea,2,1",
+    )).encode())
+    (batch,) = iter_invoice_batches(file, is_csv=True, size=10)
+    assert [invoice[:2] for invoice in batch] == [(2, 3), (5, 5)]
+    assert batch[0][3] == dict(
+        created_at="2020-01-02T10:00:00",
+        payment=dict(type="cash", amount="10"),
+        products=[
+            dict(name="Tea", price="2", quantity="2"),
+            dict(name="Coffee", price="3")])
+
+    # Reading is resumed after the first invoice
+    _, last_line, position, _ = batch[0]
+    (resumed_batch,) = iter_invoice_batches(
+        file, is_csv=True, size=10, position=position, lines=last_line)
+    assert resumed_batch == batch[1:]
+
+
+def test_product_ids_cache():
+    products_cache = ProductIdsCache(max_size=2)
+    products_cache.update({("Tea", 100): 1, ("Coffee", 200): 2})
+    assert products_cache.get(("Tea", 100)) == 1
+    products_cache.update({("Juice", 300): 3})
+    assert len(products_cache) == 2
+    assert products_cache.get(("Coffee", 200)) is None
+    assert products_cache.get(("Tea", 100)) == 1
+
+
+async def test_import_invoices():
+    created_at = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+    lines = [
+        json.dumps(dict(
+            created_at=(created_at - timedelta(minutes=index)).isoformat(),
+            payment=dict(type="cash", amount=10),
+            products=[
+                dict(name="Sparkling water", price=1.5, quantity=2),
+                dict(name="Sparkling water", price=1.5),
+                dict(name=f"Crisps {index % 2}", price=2)]))
+        for index in range(5)]
+    lines.insert(2, "{not json")
+    lines.insert(4, json.dumps(dict(
+        created_at=created_at.isoformat(),
+        payment=dict(type="cash", amount=1),
+        products=[dict(name="Sparkling water", price=1.5)])))
+    file = BytesIO("\n".join(lines).encode())
+
+    async with db_test.session_factory() as session:
+        owner_id = await session.scalar(
+            select(User.id).where(User.login == test_users[0]["login"]))
+        invoices_before = await session.scalar(select(func.count(Invoice.id)))
+
+        # The import is interrupted after the first batch
+        progress = import_invoices(
+            session, owner_id, file, "history.ndjson", False, 2, 1)
+        invoice_import, rejected, rate = await anext(progress)
+        await progress.aclose()
+        assert (invoice_import.lines, invoice_import.invoices_count) == (2, 2)
+        assert not rejected and rate > 0
+
+        batches = [
+            (invoice_import.lines, rejected)
+            async for invoice_import, rejected, _ in import_invoices(
+                session, owner_id, file, "history.ndjson", False, 2, 1)]
+        assert batches == [
+            (4, [(3, "Line is not a valid JSON")]),
+            (6, [(5, "Payment amount (1) canʼt be less than total (1.5)")]),
+            (7, [])]
+        assert invoice_import.invoices_count == 5
+        assert invoice_import.rejected_count == 2
+
+        # Nothing is imported again
+        assert not [
+            batch async for batch in import_invoices(
+                session, owner_id, file, "history.ndjson", False, 2, 1)]
+
+        invoices = (await session.scalars(
+            select(Invoice)
+            .where(Invoice.created_by == owner_id)
+            .order_by(Invoice.id.desc())
+            .limit(5))).all()
+        assert await session.scalar(
+            select(func.count(Invoice.id))) == invoices_before + 5
+        assert [invoice.created_at for invoice in invoices] == [
+            created_at - timedelta(minutes=index)
+            for index in reversed(range(5))]
+        assert {(invoice.total, invoice.rest) for invoice in invoices} == {
+            (650, 350)}
+
+        lines = (await session.scalars(
+            select(InvoiceProductAssociation)
+            .where(InvoiceProductAssociation.invoice_id == invoices[0].id)
+            .order_by(InvoiceProductAssociation.unit_price))).all()
+        assert [
+            (line.unit_price, line.quantity) for line in lines
+        ] == [(150, 3), (200, 1)]
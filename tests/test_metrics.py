@@ -0,0 +1,16 @@
+from httpx import AsyncClient, Headers
+
+from app.config import API_PREFIX
+
+
+async def test_statement_cache_metrics(ac: AsyncClient, headers: Headers):
+    for _ in range(2):
+        response = await ac.get(
+            API_PREFIX + "/invoice/retrieve", headers=headers)
+        assert response.status_code == 200
+
+    response = await ac.get("/metrics")
+    assert response.status_code == 200
+    assert (
+        'sqlalchemy_compiled_cache_lookups_total{result="hit"}'
+        in response.text)
@@ -0,0 +1,78 @@
+from datetime import date, datetime, timedelta
+
+from httpx import AsyncClient, Headers
+from sqlalchemy import func, select, update
+
+from app.config import API_PREFIX
+from app.internal.crud.invoice import get_pretty_invoice
+from app.internal.crud.invoice_archive import (
+    archive_old_invoices, get_archive_cutoff
+)
+from app.internal.models import Invoice, InvoiceArchive
+from tests.conftest import db_test
+
+
+def test_archive_cutoff():
+    assert get_archive_cutoff(90, date(2024, 6, 15)) == date(2024, 3, 1)
+    assert get_archive_cutoff(0, date(2024, 6, 15)) == date(2024, 6, 1)
+
+
+async def test_archive_old_invoices(ac: AsyncClient, headers: Headers):
+    old_ids = list()
+    for payment_type, price in (("cash", 10), ("cashless", 20)):
+        response = await ac.post(
+            API_PREFIX + "/invoice/create",
+            headers=headers,
+            json={
+                "products": [{"name": "Old tea", "price": price}],
+                "payment": {"type": payment_type, "amount": price}
+            })
+        assert response.status_code == 201
+        old_ids.append(response.json()["id"])
+
+    created_at = datetime.now() - timedelta(days=400)
+    async with db_test.session_factory() as session:
+        await session.execute(
+            update(Invoice)
+            .where(Invoice.id.in_(old_ids))
+            .values(created_at=created_at))
+        await session.commit()
+        ticket = await get_pretty_invoice(session, old_ids[0])
+
+    response = await ac.get(API_PREFIX + "/invoice/retrieve", headers=headers)
+    invoices = response.json()["invoices"]
+
+    async with db_test.session_factory() as session:
+        assert await archive_old_invoices(session, after_days=90) == 2
+        assert await archive_old_invoices(session, after_days=90) == 0
+        assert await session.scalar(
+            select(func.count())
+            .select_from(Invoice)
+            .where(Invoice.id.in_(old_ids))) == 0
+        assert await session.scalar(
+            select(InvoiceArchive.invoices_count)) == 2
+        # Ticket is found in the archive
+        assert await get_pretty_invoice(session, old_ids[0]) == ticket
+
+    response = await ac.get(API_PREFIX + "/invoice/retrieve", headers=headers)
+    assert response.json()["invoices"] == invoices
+
+    response = await ac.get(
+        API_PREFIX + "/invoice/retrieve",
+        headers=headers,
+        params={
+            "payment_type": "cashless",
+            "to_created_at": date.today().isoformat(),
+            "limit": 100
+        })
+    archived_ids = [
+        invoice["id"] for invoice in response.json()["invoices"]
+        if invoice["id"] in old_ids]
+    assert archived_ids == old_ids[1:]
+
+    response = await ac.get(
+        API_PREFIX + "/invoice/retrieve",
+        headers=headers,
+        params={"from_created_at": date.today().isoformat()})
+    assert not set(old_ids) & {
+        invoice["id"] for invoice in response.json()["invoices"]}
@@ -0,0 +1,11 @@
+from datetime import date
+
+from app.internal.crud.partitions import add_months, get_partition_name
+
+
+def test_partition_months():
+    assert add_months(date(2024, 11, 1), 2) == date(2025, 1, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert (
+        get_partition_name("invoice", date(2024, 3, 1)) ==
+        "invoice_y2024m03")
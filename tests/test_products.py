@@ -0,0 +1,92 @@
+import json
+from pprint import pprint
+
+from httpx import AsyncClient, Headers
+
+from app.config import API_PREFIX
+
+
+async def test_search_products(ac: AsyncClient, headers: Headers):
+    response = await ac.get(
+        API_PREFIX + "/product/search",
+        headers=headers,
+        params=dict(q="CREAM", match="substring"))
+
+    pprint(response.json())
+    assert response.status_code == 200
+    assert {
+        product["name"] for product in response.json()["products"]
+    } == {"Ice-cream"}
+
+    response = await ac.get(
+        API_PREFIX + "/product/search",
+        headers=headers,
+        params=dict(q="cream", match="prefix"))
+    assert response.status_code == 200
+    assert not response.json()["products"]
+
+
+async def test_search_products_pagination(
+        ac: AsyncClient, headers: Headers
+    ):
+    found_products = list()
+    params = dict(q="m", limit=1)
+    while True:
+        response = await ac.get(
+            API_PREFIX + "/product/search", headers=headers, params=params)
+        assert response.status_code == 200
+        found_products.extend(response.json()["products"])
+        if response.json()["next_cursor"] is None:
+            break
+
+        params["after"] = response.json()["next_cursor"]
+
+    pprint(found_products)
+    assert found_products[0]["name"] == "Meat"
+    assert {product["name"] for product in found_products} == {"Meat", "Milk"}
+    assert len({product["id"] for product in found_products}) == len(
+        found_products)
+
+
+async def test_filter_invoices_by_product(ac: AsyncClient, headers: Headers):
+    invoice_ids = list()
+    for name in ("Coffee beans", "Coffee filter", "Tea"):
+        response = await ac.post(
+            API_PREFIX + "/invoice/create",
+            headers=headers,
+            json={
+                "products": [{"name": name, "price": 3}],
+                "payment": {"type": "cash", "amount": 3}
+            })
+        assert response.status_code == 201
+        invoice_ids.append(response.json()["id"])
+
+    async def get_filtered_ids(**params):
+        response = await ac.get(
+            API_PREFIX + "/invoice/retrieve", headers=headers, params=params)
+        assert response.status_code == 200
+        return [
+            invoice["id"] for invoice in response.json()["invoices"]
+            if invoice["id"] in invoice_ids]
+
+    assert await get_filtered_ids(product="Coffee beans") == invoice_ids[:1]
+    assert await get_filtered_ids(product="Coffee") == []
+    assert await get_filtered_ids(
+        product="coffee", product_match="prefix") == invoice_ids[1::-1]
+
+    response = await ac.get(
+        API_PREFIX + "/product/search",
+        headers=headers,
+        params=dict(q="Coffee filter"))
+    product_id = response.json()["products"][0]["id"]
+    assert await get_filtered_ids(product_id=product_id) == invoice_ids[1:2]
+    assert await get_filtered_ids(
+        product_id=product_id, product="Tea") == []
+
+    response = await ac.get(
+        API_PREFIX + "/invoice/export",
+        headers=headers,
+        params=dict(product="Tea"))
+    exported_ids = {
+        json.loads(line)["id"] for line in response.text.splitlines()}
+    assert exported_ids & set(invoice_ids) == {invoice_ids[2]}
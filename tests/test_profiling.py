@@ -0,0 +1,77 @@
+import pstats
+import threading
+
+import pytest
+from httpx import ASGITransport, AsyncClient, Headers
+from starlette.responses import PlainTextResponse
+
+from app.config import API_PREFIX
+from app.configuration.middlewares.profiling import ProfilingMiddleware
+from app.internal.routes import auth, profiling
+from app.utils.profiling import sample_stacks
+
+
+async def test_profiling_requires_admin(ac: AsyncClient, headers: Headers):
+    response = await ac.get(API_PREFIX + "/profiling/files", headers=headers)
+    assert response.status_code == 403
+
+
+async def test_capture_profile(
+        ac: AsyncClient,
+        headers: Headers,
+        monkeypatch: pytest.MonkeyPatch,
+        tmp_path
+    ):
+    monkeypatch.setattr(auth, "ADMIN_LOGINS", ["test"])
+    monkeypatch.setattr(profiling, "PROFILING_DIR", tmp_path)
+
+    response = await ac.post(
+        API_PREFIX + "/profiling/capture",
+        headers=headers,
+        params={"seconds": 1})
+    assert response.status_code == 201
+    profile = response.json()
+    assert profile["name"].endswith(".folded")
+
+    response = await ac.get(API_PREFIX + "/profiling/files", headers=headers)
+    assert [item["name"] for item in response.json()] == [profile["name"]]
+
+    response = await ac.get(profile["url"], headers=headers)
+    assert response.status_code == 200
+    for line in response.text.splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack and int(count) > 0
+
+    response = await ac.get(
+        API_PREFIX + "/profiling/files/..%2F.env", headers=headers)
+    assert response.status_code == 404
+
+
+def test_sample_stacks():
+    stacks = sample_stacks(threading.get_ident(), 0.01, 0.001)
+    # The sampler sees itself in the current thread
+    assert all("sample_stacks" in stack for stack in stacks)
+
+
+async def test_profiling_middleware(tmp_path):
+    async def endpoint(scope, receive, send):
+        await PlainTextResponse("OK")(scope, receive, send)
+
+    middleware = ProfilingMiddleware(endpoint, tmp_path, token="secret")
+    async with AsyncClient(
+            transport=ASGITransport(middleware),
+            base_url="http://test"
+        ) as client:
+        response = await client.get("/")
+        assert "X-Profile" not in response.headers
+
+        response = await client.get(
+            "/", headers={"X-Profile-Token": "wrong"})
+        assert "X-Profile" not in response.headers
+
+        response = await client.get(
+            "/", headers={"X-Profile-Token": "secret"})
+        assert response.text == "OK"
+
+    stats = pstats.Stats(str(tmp_path / response.headers["X-Profile"]))
+    assert stats.total_calls > 0
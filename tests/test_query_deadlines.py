@@ -0,0 +1,70 @@
+import time
+
+import pytest
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.configuration.middlewares.query_deadline import (
+    QueryDeadlineMiddleware
+)
+from app.utils.query_deadlines import (
+    exceeded_query_deadlines, is_query_deadline_error, query_deadline
+)
+from tests.conftest import db_test
+
+# Counts up to a hundred million, which takes far longer than deadlines
+slow_query = text(
+    "WITH RECURSIVE numbers(x) AS "
+    "(SELECT 1 UNION ALL SELECT x + 1 FROM numbers WHERE x < 100000000) "
+    "SELECT count(*) FROM numbers")
+
+
+async def test_query_cancelled_at_deadline():
+    token = query_deadline.set(time.monotonic() + 0.1)
+    try:
+        async with db_test.request_session_factory() as session:
+            started_at = time.monotonic()
+            with pytest.raises(DBAPIError) as exc_info:
+                await session.execute(slow_query)
+    finally:
+        query_deadline.reset(token)
+
+    assert is_query_deadline_error(exc_info.value)
+    assert time.monotonic() - started_at < 2
+
+    # Queries without deadline aren't affected by the previous one
+    async with db_test.request_session_factory() as session:
+        assert await session.scalar(text("SELECT 1")) == 1
+
+
+async def test_query_deadline_response():
+    app = FastAPI()
+
+    @app.get("/slow")
+    async def run_slow_query(
+            session: AsyncSession = Depends(db_test.session_dependency)):
+        return await session.scalar(slow_query)
+
+    @app.get("/fast")
+    async def run_fast_query(
+            session: AsyncSession = Depends(db_test.session_dependency)):
+        return await session.scalar(text("SELECT 1"))
+
+    app.add_middleware(
+        QueryDeadlineMiddleware,
+        routes=(("GET", "/", 100),),
+        export_path="/export")
+    exceeded_count = exceeded_query_deadlines.get("/")
+    async with AsyncClient(
+            transport=ASGITransport(app), base_url="http://test") as client:
+        response = await client.get("/slow")
+        assert response.status_code == 504
+        assert "`GET /export`" in response.json()["detail"]
+
+        response = await client.get("/fast")
+        assert response.status_code == 200
+
+    assert exceeded_query_deadlines.get("/") == exceeded_count + 1
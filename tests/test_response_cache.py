@@ -0,0 +1,143 @@
+import pytest
+from httpx import AsyncClient, Headers
+
+from app.config import API_PREFIX
+from app.internal.crud.invoice import invoices_cache
+from app.utils.response_cache import (
+    MemoryCacheBackend, RedisCacheBackend, ResponseCache
+)
+
+
+class FakeRedis:
+    """Subset of `redis.asyncio` client used by the cache"""
+
+    def __init__(self):
+        self.values: dict[str, bytes] = dict()
+        self.expirations: dict[str, int] = dict()
+
+    async def get(self, key: str):
+        return self.values.get(key)
+
+    async def set(self, key: str, value: bytes, ex: int | None = None):
+        self.values[key] = value
+        self.expirations[key] = ex
+
+    async def incr(self, key: str):
+        value = int(self.values.get(key, b"0")) + 1
+        self.values[key] = str(value).encode()
+        return value
+
+
+class BrokenRedis:
+    """Client of Redis, which is down"""
+
+    async def get(self, key: str):
+        raise ConnectionError("Redis is down")
+
+    async def set(self, key: str, value: bytes, ex: int | None = None):
+        raise ConnectionError("Redis is down")
+
+    async def incr(self, key: str):
+        raise ConnectionError("Redis is down")
+
+
+@pytest.fixture(params=["memory", "redis"])
+def response_cache(request: pytest.FixtureRequest):
+    backend = (
+        MemoryCacheBackend(max_size=2) if request.param == "memory"
+        else RedisCacheBackend(FakeRedis()))
+
+    return ResponseCache("test", backend, ttl=60)
+
+
+async def test_response_cache_invalidation(response_cache: ResponseCache):
+    body, key = await response_cache.get(1, dict(page=0, limit=None))
+    assert body is None
+    await response_cache.set(key, b"first")
+
+    # Params are normalized into the same key
+    body, _ = await response_cache.get(1, dict(limit=None, page=0))
+    assert body == b"first"
+    body, _ = await response_cache.get(2, dict(page=0, limit=None))
+    assert body is None
+
+    await response_cache.invalidate(1)
+    body, key = await response_cache.get(1, dict(page=0))
+    assert body is None
+    await response_cache.set(key, b"second")
+    body, _ = await response_cache.get(1, dict(page=0))
+    assert body == b"second"
+
+
+async def test_memory_cache_eviction():
+    backend = MemoryCacheBackend(max_size=2)
+    await backend.incr("generation")
+    for key in ("a", "b", "c"):
+        await backend.set(key, key.encode(), ttl=60)
+
+    assert await backend.get("a") is None
+    assert await backend.get("c") == b"c"
+    # Counters aren't evicted with values
+    assert await backend.get("generation") == b"1"
+
+    await backend.set("d", b"d", ttl=0)
+    assert await backend.get("d") is None
+
+
+async def test_cached_invoices_listing(
+        ac: AsyncClient, headers: Headers, monkeypatch: pytest.MonkeyPatch
+    ):
+    monkeypatch.setattr(
+        invoices_cache, "backend", MemoryCacheBackend(max_size=16))
+    params = {"payment_type": "cash", "from_created_at": "01.01.2000"}
+
+    response = await ac.get(
+        API_PREFIX + "/invoice/retrieve", headers=headers, params=params)
+    assert response.status_code == 200
+    invoices = response.json()["invoices"]
+
+    # The same date in another format hits the cache
+    response = await ac.get(
+        API_PREFIX + "/invoice/retrieve",
+        headers=headers,
+        params=params | {"from_created_at": "2000-01-01"})
+    assert response.json()["invoices"] == invoices
+
+    response = await ac.post(
+        API_PREFIX + "/invoice/create",
+        headers=headers,
+        json={
+            "products": [{"name": "Tea", "price": 4.5}],
+            "payment": {"type": "cash", "amount": 5}
+        })
+    assert response.status_code == 201
+
+    response = await ac.get(
+        API_PREFIX + "/invoice/retrieve", headers=headers, params=params)
+    assert len(response.json()["invoices"]) == len(invoices) + 1
+
+
+async def test_cache_outage(
+        ac: AsyncClient, headers: Headers, monkeypatch: pytest.MonkeyPatch
+    ):
+    monkeypatch.setattr(
+        invoices_cache, "backend", RedisCacheBackend(BrokenRedis()))
+    assert await invoices_cache.get(1, dict(page=0)) == (None, None)
+    await invoices_cache.set("key", b"value")
+    await invoices_cache.invalidate(1)
+
+    # Invoice is stored and reported as created, listing is built anew
+    response = await ac.post(
+        API_PREFIX + "/invoice/create",
+        headers=headers,
+        json={
+            "products": [{"name": "Tea", "price": 4.5}],
+            "payment": {"type": "cash", "amount": 5}
+        })
+    assert response.status_code == 201
+    invoice_id = response.json()["id"]
+
+    response = await ac.get(API_PREFIX + "/invoice/retrieve", headers=headers)
+    assert response.status_code == 200
+    assert invoice_id in [
+        invoice["id"] for invoice in response.json()["invoices"]]
@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient, Headers
+
+from app.config import API_PREFIX
+from app.internal.crud.invoice import invoice_events
+from app.utils.events import EventHub, RedisEventBroker, Subscription
+
+
+class FakePubSub:
+    """Subset of `redis.asyncio` pub/sub used by the broker"""
+
+    def __init__(self, messages: asyncio.Queue):
+        self.messages = messages
+        self.patterns: list[str] = list()
+        self.is_closed = False
+
+    async def psubscribe(self, pattern: str):
+        self.patterns.append(pattern)
+
+    async def listen(self):
+        while True:
+            yield await self.messages.get()
+
+    async def aclose(self):
+        self.is_closed = True
+
+
+class FakeRedis:
+    """Delivers published messages to the single pub/sub"""
+
+    def __init__(self):
+        self.messages = asyncio.Queue()
+        self.pubsubs: list[FakePubSub] = list()
+
+    def pubsub(self):
+        pubsub = FakePubSub(self.messages)
+        self.pubsubs.append(pubsub)
+        return pubsub
+
+    async def publish(self, channel: str, data: str):
+        self.messages.put_nowait(dict(
+            type="pmessage",
+            pattern=None,
+            channel=channel.encode(),
+            data=data.encode()))
+
+
+async def test_subscription_drops_oldest():
+    subscription = Subscription(max_size=2)
+    for event in ("a", "b", "c"):
+        subscription.put(event)
+
+    assert subscription.take_dropped() == 1
+    assert subscription.take_dropped() == 0
+    assert await subscription.get() == "b"
+    assert await subscription.get() == "c"
+
+    waiter = asyncio.create_task(subscription.get())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    subscription.put("d")
+    assert await waiter == "d"
+
+
+async def test_event_hub_fan_out():
+    hub = EventHub(queue_size=4)
+    with hub.subscribe("1") as first, hub.subscribe("1") as second:
+        with hub.subscribe("2") as other:
+            hub.dispatch("1", "event")
+            hub.dispatch("3", "nobody")
+            assert await first.get() == "event"
+            assert await second.get() == "event"
+            assert other.take_dropped() == 0
+
+    # Subscriptions are forgotten, so events aren't queued anymore
+    hub.dispatch("1", "late")
+    with pytest.raises(TimeoutError):
+        async with asyncio.timeout(0.01):
+            await first.get()
+
+
+async def test_redis_event_broker():
+    client = FakeRedis()
+    broker = RedisEventBroker(client, queue_size=4)
+    with broker.subscribe("1") as subscription:
+        await client.publish("other:1", "foreign")
+        await broker.publish("1", "event")
+        async with asyncio.timeout(1):
+            assert await subscription.get() == "event"
+
+    await broker.close()
+    assert len(client.pubsubs) == 1
+    assert client.pubsubs[0].patterns == ["events:*"]
+    assert client.pubsubs[0].is_closed
+
+
+async def test_new_invoice_event(ac: AsyncClient, headers: Headers):
+    response = await ac.get(API_PREFIX + "/user/details", headers=headers)
+    user_id = response.json()["id"]
+
+    with invoice_events.subscribe(str(user_id)) as subscription:
+        response = await ac.post(
+            API_PREFIX + "/invoice/create",
+            headers=headers,
+            json={
+                "products": [{"name": "Tea", "price": 4.5}],
+                "payment": {"type": "cash", "amount": 5}
+            })
+        assert response.status_code == 201
+        async with asyncio.timeout(1):
+            event = json.loads(await subscription.get())
+
+    invoice = response.json()
+    assert event["id"] == invoice["id"]
+    assert event["total"] == invoice["total"]
+    assert set(event) == {"id", "total", "rest", "created_at"}
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+from sqlalchemy import text
+
+from app.configuration import serving
+from app.configuration.db_helper import DatabaseHelper
+from app.configuration.serving import (
+    check_workers_settings, get_pool_size, get_workers_count
+)
+from tests.conftest import DB_URL_TEST
+
+
+def test_workers_count():
+    assert get_workers_count(3) == 3
+    assert get_workers_count(0) == len(os.sched_getaffinity(0))
+
+
+def test_pool_size():
+    assert get_pool_size(90, 16) == 5
+    assert get_pool_size(4, 16) == 1
+
+
+def test_workers_settings(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(serving, "RESPONSE_CACHE_BACKEND", "memory")
+    check_workers_settings(1)
+    with pytest.raises(ValueError):
+        check_workers_settings(2)
+
+    monkeypatch.setattr(serving, "RESPONSE_CACHE_BACKEND", "redis")
+    check_workers_settings(2)
+
+    monkeypatch.setattr(serving, "BACKGROUND_JOBS_STORE", "memory")
+    with pytest.raises(ValueError):
+        check_workers_settings(2)
+    monkeypatch.setattr(serving, "BACKGROUND_JOBS_STORE", "")
+    check_workers_settings(2)
+
+
+async def test_resize_pool():
+    db = DatabaseHelper(DB_URL_TEST)
+    session_factory = db.session_factory
+    db.resize_pool(2)
+    try:
+        assert db.engine.pool.size() == 2
+        assert session_factory is db.session_factory
+        async with db.session_factory() as session:
+            assert session.get_bind() is db.engine.sync_engine
+            assert await session.scalar(text("SELECT 1")) == 1
+    finally:
+        await db.engine.dispose()
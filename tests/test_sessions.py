@@ -0,0 +1,81 @@
+from collections import Counter
+
+import pytest
+from httpx import AsyncClient, Headers
+from sqlalchemy import event, select
+from sqlalchemy.pool import Pool
+
+from app.config import API_PREFIX
+from tests.conftest import db_test
+
+
+@pytest.fixture
+def pool_events():
+    """Counts connections checked out of and into all pools"""
+    counter = Counter()
+    listeners = {
+        name: lambda *args, name=name: counter.update((name,))
+        for name in ("checkout", "checkin")}
+    for name, listener in listeners.items():
+        event.listen(Pool, name, listener)
+    yield counter
+    for name, listener in listeners.items():
+        event.remove(Pool, name, listener)
+
+
+async def test_request_session_connection(pool_events: Counter):
+    async with db_test.request_session_factory() as session:
+        # The dialect is inspected without connecting
+        assert session.get_bind().dialect.name
+        assert pool_events["checkout"] == 0
+
+        await session.execute(select(1))
+        await session.commit()
+        await session.execute(select(1))
+        await session.commit()
+        assert pool_events["checkout"] == 1
+
+    assert pool_events["checkin"] == 1
+
+
+@pytest.mark.parametrize(
+    "method, url, json, status_code",
+    [
+        ("get", "/user/details", None, 200),
+        (
+            "post",
+            "/invoice/create",
+            {
+                "products": [{"name": "Tea", "price": 1}],
+                "payment": {"type": "cash", "amount": 1}
+            },
+            201
+        ),
+        (
+            "post",
+            "/invoice/create",
+            {
+                "products": [{"name": "Tea", "price": 1}],
+                "payment": {"type": "cash", "amount": 0.5}
+            },
+            422
+        ),
+        ("get", "/invoice/retrieve", None, 200),
+        ("get", "/invoice/1", None, 200)
+    ])
+async def test_connection_checkouts_per_request(
+        ac: AsyncClient,
+        headers: Headers,
+        pool_events: Counter,
+        method: str,
+        url: str,
+        json: dict | None,
+        status_code: int
+    ):
+    response = await ac.request(
+        method, API_PREFIX + url, headers=headers, json=json)
+    assert response.status_code == status_code
+    # Authentication and the route share the session and its connection,
+    # which is returned even if the request fails
+    assert pool_events["checkout"] == 1
+    assert pool_events["checkin"] == 1
@@ -0,0 +1,164 @@
+from collections import Counter
+from datetime import date
+
+import pytest
+from httpx import ASGITransport, AsyncClient, Headers
+from sqlalchemy import func, select
+
+from app.config import API_PREFIX
+from app.configuration.db_helper import DatabaseHelper, db_helper
+from app.internal.crud import sharding
+from app.internal.crud.invoice_archive import archive_user_month
+from app.internal.crud.sharding import (
+    move_user_to_shard, reserve_shard_invoice_ids
+)
+from app.internal.models import Base, Invoice
+from app.utils.sharding import HashRing, get_id_shard
+from tests.conftest import DB_URL_TEST, app
+
+sharded_invoice = {
+    "products": [{"name": "Tea", "price": 4.5, "quantity": 2}],
+    "payment": {"type": "cashless", "amount": 9}
+}
+
+
+def test_hash_ring():
+    keys = range(3000)
+    ring = HashRing(3)
+    shards = Counter(ring.get_shard(key) for key in keys)
+    assert set(shards) == {0, 1, 2}
+    assert min(shards.values()) > 500
+
+    # Keys only move onto the added shard
+    extended_ring = HashRing(4)
+    for key in keys:
+        shard = extended_ring.get_shard(key)
+        assert shard in (ring.get_shard(key), 3)
+
+
+@pytest.fixture
+async def sharded_database(tmp_path):
+    """
+    Test database with two more SQLite shards. Module of conftest
+    imported here isn't the one of `ac` fixture, so its app is used
+    """
+    database = DatabaseHelper(
+        DB_URL_TEST,
+        shard_urls=tuple(
+            f"sqlite+aiosqlite:///{tmp_path}/shard{shard}.sqlite3"
+            for shard in (1, 2)))
+    for shard, shard_database in enumerate(database.shards[1:], 1):
+        async with shard_database.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async with shard_database.session_factory() as session:
+            await reserve_shard_invoice_ids(session, shard)
+
+    app.dependency_overrides[db_helper.router_dependency] = lambda: database
+    yield database
+    del app.dependency_overrides[db_helper.router_dependency]
+    await database.dispose()
+
+
+@pytest.fixture
+async def sharded_ac(sharded_database: DatabaseHelper):
+    async with AsyncClient(
+            transport=ASGITransport(app),
+            base_url="http://test"
+        ) as ac:
+        yield ac
+
+
+async def count_invoices(database: DatabaseHelper, shard: int):
+    async with database.shards[shard].session_factory() as session:
+        return await session.scalar(select(func.count(Invoice.id)))
+
+
+async def register_user(ac: AsyncClient, name: str, login: str):
+    response = await ac.post(
+        API_PREFIX + "/user/register",
+        data=dict(name=name, login=login, password="password"))
+    assert response.status_code == 201
+    response = await ac.post(
+        API_PREFIX + "/auth/jwt/login",
+        data=dict(username=login, password="password"))
+
+    return Headers(dict(
+        Authorization=f"Bearer {response.json()['access_token']}"))
+
+
+async def test_move_user_between_shards(
+        sharded_ac: AsyncClient,
+        sharded_database: DatabaseHelper,
+        monkeypatch: pytest.MonkeyPatch
+    ):
+    # Invoices are copied and deleted by several batches
+    monkeypatch.setattr(sharding, "SHARD_MOVE_BATCH_SIZE", 1)
+    headers = await register_user(sharded_ac, "Denis", "denis")
+
+    await move_user_to_shard(sharded_database, "denis", 2)
+    response = await sharded_ac.post(
+        API_PREFIX + "/invoice/create",
+        headers=headers,
+        json=sharded_invoice)
+    assert response.status_code == 201
+    invoice_id = response.json()["id"]
+    assert get_id_shard(invoice_id) == 2
+    assert await count_invoices(sharded_database, 2) == 1
+
+    response = await sharded_ac.get(API_PREFIX + f"/invoice/{invoice_id}")
+    assert response.status_code == 200
+    assert "Tea" in response.text
+    response = await sharded_ac.post(
+        API_PREFIX + "/invoice/create",
+        headers=headers,
+        json=sharded_invoice)
+    assert await count_invoices(sharded_database, 2) == 2
+
+    id_mapping = await move_user_to_shard(sharded_database, "denis", 1)
+    assert get_id_shard(id_mapping[invoice_id]) == 1
+    assert await count_invoices(sharded_database, 2) == 0
+    assert await count_invoices(sharded_database, 1) == 2
+
+    # Cached ticket of the old id is dropped
+    response = await sharded_ac.get(API_PREFIX + f"/invoice/{invoice_id}")
+    assert response.status_code == 404
+
+    response = await sharded_ac.get(
+        API_PREFIX + "/invoice/retrieve", headers=headers)
+    invoices = response.json()["invoices"]
+    assert sorted(invoice["id"] for invoice in invoices) == sorted(
+        id_mapping.values())
+    assert invoices[0]["total"] == 9
+    assert invoices[0]["products"][0]["name"] == "Tea"
+
+    with pytest.raises(ValueError):
+        await move_user_to_shard(sharded_database, "denis", 3)
+
+
+async def test_move_user_with_archived_invoices(
+        sharded_ac: AsyncClient, sharded_database: DatabaseHelper
+    ):
+    headers = await register_user(sharded_ac, "Edith", "edith")
+    await move_user_to_shard(sharded_database, "edith", 2)
+    response = await sharded_ac.post(
+        API_PREFIX + "/invoice/create",
+        headers=headers,
+        json=sharded_invoice)
+    invoice_id = response.json()["id"]
+    owner_id = response.json()["created_by"]["id"]
+
+    async with sharded_database.shards[2].session_factory() as session:
+        assert await archive_user_month(
+            session, owner_id, date.today().replace(day=1)) == 1
+
+    id_mapping = await move_user_to_shard(sharded_database, "edith", 1)
+    assert get_id_shard(id_mapping[invoice_id]) == 1
+
+    # Archived ticket is found by its new id on the new shard
+    response = await sharded_ac.get(
+        API_PREFIX + f"/invoice/{id_mapping[invoice_id]}")
+    assert response.status_code == 200
+    assert "Tea" in response.text
+    response = await sharded_ac.get(API_PREFIX + f"/invoice/{invoice_id}")
+    assert response.status_code == 404
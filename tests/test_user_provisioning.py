@@ -0,0 +1,76 @@
+import bcrypt
+import pytest
+from fastapi import HTTPException
+from httpx import AsyncClient, Headers
+
+from app.config import API_PREFIX
+from app.internal.crud.user_provisioning import (
+    password_hashing_pool, read_users_rows
+)
+from app.internal.routes import auth
+from app.utils.password_hashing import PasswordHashingPool
+
+
+def test_read_users_rows():
+    rows = read_users_rows(
+        "﻿name,login,password\nDora,dora,abcdefgh\n".encode(),
+        is_csv=True)
+    assert rows == [dict(name="Dora", login="dora", password="abcdefgh")]
+
+    with pytest.raises(HTTPException):
+        read_users_rows(b'{"login": "dora"}', is_csv=False)
+
+
+async def test_password_hashing_pool():
+    pool = PasswordHashingPool(processes=2)
+    try:
+        hashed_passwords = await pool.hash_passwords(
+            ["first password", "second password", "third password"])
+    finally:
+        pool.shutdown()
+
+    assert bcrypt.checkpw(b"first password", hashed_passwords[0])
+    assert bcrypt.checkpw(b"third password", hashed_passwords[2])
+
+
+async def test_provision_users(
+        ac: AsyncClient, headers: Headers, monkeypatch: pytest.MonkeyPatch
+    ):
+    users_csv = "\n".join((
+        "name,login,password",
+        "Dora,Dora,password1",
+        "Albert Twin,albert,password2",
+        "Dora Twin,dora,password3",
+        "Eve,eve,short",
+        "Frank,frank,password4"))
+    provision_headers = {**headers, "Content-Type": "text/csv"}
+
+    response = await ac.post(
+        API_PREFIX + "/user/provision",
+        headers=provision_headers,
+        content=users_csv)
+    assert response.status_code == 403
+
+    monkeypatch.setattr(auth, "ADMIN_LOGINS", ["test"])
+    try:
+        response = await ac.post(
+            API_PREFIX + "/user/provision",
+            headers=provision_headers,
+            content=users_csv)
+    finally:
+        password_hashing_pool.shutdown()
+
+    assert response.status_code == 200
+    provisioned = response.json()
+    assert [user["login"] for user in provisioned["created"]] == [
+        "dora", "frank"]
+    assert [
+        (user["row"], user["login"]) for user in provisioned["rejected"]
+    ] == [(2, "albert"), (3, "dora"), (4, "eve")]
+    assert "exists" in provisioned["rejected"][0]["detail"]
+    assert "password" in provisioned["rejected"][2]["detail"]
+
+    response = await ac.post(
+        API_PREFIX + "/auth/jwt/login",
+        data={"username": "frank", "password": "password4"})
+    assert response.status_code == 200